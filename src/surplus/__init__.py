@@ -33,15 +33,33 @@ For more information, please refer to <http://unlicense.org/>
 # https://github.com/python/typing/issues/1333
 
 from .surplus import (  # noqa: F401, TID252
+    BATCH_CHUNK_SIZE,
     BUILD_BRANCH,
     BUILD_COMMIT,
     BUILD_DATETIME,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL_SECONDS,
     CONNECTION_MAX_RETRIES,
+    CONNECTION_MIN_DELAY_SECONDS,
     CONNECTION_WAIT_SECONDS,
     EMPTY_LATLONG,
+    HTTP_DEFAULT_ADDRESS,
+    HTTP_MAX_CLIENT_CONCURRENCY,
+    HTTP_MAX_CONCURRENCY,
+    LOCALITY_TTL_SECONDS,
+    MEMORY_CACHE_MAX_BYTES,
+    MEMORY_CACHE_MAX_ENTRIES,
+    OFFLINE_PACK_MAGIC,
+    OFFLINE_PACK_VERSION,
+    OFFLINE_REVERSER_DETAIL_KEYS,
+    OFFLINE_REVERSER_DETAIL_LEVEL,
+    REVERSER_CELL_CODE_LENGTHS,
     VERSION,
     VERSION_SUFFIX,
+    AddressRecord,
+    BatchOutputFormatEnum,
     Behaviour,
+    CassetteMissError,
     ConversionResultTypeEnum,
     EmptyQueryError,
     IncompletePlusCodeError,
@@ -56,13 +74,39 @@ from .surplus import (  # noqa: F401, TID252
     Result,
     ResultType,
     StringQuery,
+    SurplusAsyncGeocoderProtocol,
+    SurplusAsyncReverserProtocol,
+    SurplusCacheStats,
+    SurplusCallTiming,
+    SurplusCassetteRecorder,
+    SurplusCassetteReplayer,
+    SurplusDefaultAsyncGeocoding,
     SurplusDefaultGeocoding,
     SurplusError,
     SurplusGeocoderProtocol,
+    SurplusLocalityTable,
+    SurplusMemoryCache,
+    SurplusOfflineReverser,
+    SurplusPersistentCache,
     SurplusReverserProtocol,
+    SurplusSharedRateLimiter,
+    SurplusTimings,
     __version__,
+    build_offline_pack,
     cli,
+    decode_many,
+    default_cache_path,
+    default_rate_limiter_path,
+    default_socket_path,
+    default_user_agent,
+    encode_many,
     generate_fingerprinted_user_agent,
+    parse_queries,
     parse_query,
+    serve_http,
+    serve_socket,
     surplus,
+    surplus_async,
+    surplus_batch,
+    surplus_batch_parallel,
 )
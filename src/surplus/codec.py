@@ -0,0 +1,379 @@
+"""
+surplus.codec: table-driven Plus Code (Open Location Code) encoding and decoding
+-------------------------------------------------------------------------------
+by mark <mark@joshwel.co> and contributors
+
+This is free and unencumbered software released into the public domain.
+
+Anyone is free to copy, modify, publish, use, compile, sell, or
+distribute this software, either in source code form or as a compiled
+binary, for any purpose, commercial or non-commercial, and by any
+means.
+
+In jurisdictions that recognize copyright laws, the author or authors
+of this software dedicate any and all copyright interest in the
+software to the public domain. We make this dedication for the benefit
+of the public at large and to the detriment of our heirs and
+successors. We intend this dedication to be an overt act of
+relinquishment in perpetuity of all present and future rights to this
+software under copyright law.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR
+OTHER DEALINGS IN THE SOFTWARE.
+
+For more information, please refer to <http://unlicense.org/>
+"""
+
+# follows the open location code specification and reference implementation, see
+# https://github.com/google/open-location-code/blob/main/docs/specification.md
+
+from functools import lru_cache
+from math import floor
+from typing import Final, NamedTuple
+
+# constants
+
+ALPHABET: Final[str] = "23456789CFGHJMPQRVWX"
+SEPARATOR: Final[str] = "+"
+SEPARATOR_POSITION: Final[int] = 8
+PADDING: Final[str] = "0"
+PAIR_CODE_LENGTH: Final[int] = 10
+MAX_CODE_LENGTH: Final[int] = 15
+PAIR_PRECISION: Final[int] = 20**3
+FINAL_LAT_PRECISION: Final[int] = PAIR_PRECISION * 5 ** (MAX_CODE_LENGTH - PAIR_CODE_LENGTH)
+FINAL_LON_PRECISION: Final[int] = PAIR_PRECISION * 4 ** (MAX_CODE_LENGTH - PAIR_CODE_LENGTH)
+CODEC_CACHE_SIZE: Final[int] = 4096  # codes remembered by decode() and the validators
+
+# lookup tables
+
+# character -> digit value, for both cases
+_DIGIT_VALUES: Final[dict[str, int]] = {
+    **{character: value for value, character in enumerate(ALPHABET)},
+    **{character.lower(): value for value, character in enumerate(ALPHABET)},
+}
+_VALID_CHARACTERS: Final[frozenset[str]] = frozenset((*_DIGIT_VALUES, SEPARATOR, PADDING))
+
+# [latitude digit][longitude digit] -> character pair
+_PAIRS: Final[tuple[tuple[str, ...], ...]] = tuple(
+    tuple(latitude_digit + longitude_digit for longitude_digit in ALPHABET)
+    for latitude_digit in ALPHABET
+)
+
+# two-digit base-20 value -> its high and low digits
+_HIGH_DIGITS: Final[tuple[int, ...]] = tuple(value // 20 for value in range(20**2))
+_LOW_DIGITS: Final[tuple[int, ...]] = tuple(value % 20 for value in range(20**2))
+
+# encodable code length -> height in degrees of the code's area
+LAT_PRECISIONS: Final[dict[int, float]] = {
+    **{length: float(20 ** floor(length / -2 + 2)) for length in range(2, 11, 2)},
+    **{length: 20**-3 / 5 ** (length - 10) for length in range(11, MAX_CODE_LENGTH + 1)},
+}
+
+# digit position -> place value, for the pair and grid sections
+_PAIR_PLACE_VALUES: Final[tuple[int, ...]] = tuple(20 ** (4 - pair) for pair in range(5))
+_GRID_ROW_PLACE_VALUES: Final[tuple[int, ...]] = tuple(5 ** (4 - grid) for grid in range(5))
+_GRID_COL_PLACE_VALUES: Final[tuple[int, ...]] = tuple(4 ** (4 - grid) for grid in range(5))
+
+
+class PlusCodeArea(NamedTuple):
+    """
+    typing.NamedTuple representing the area of a decoded Plus Code
+
+    attributes
+        latitude: float
+            latitude of the area's centre
+        longitude: float
+            longitude of the area's centre
+        south: float
+            latitude of the area's south-west corner
+        west: float
+            longitude of the area's south-west corner
+        north: float
+            latitude of the area's north-east corner
+        east: float
+            longitude of the area's north-east corner
+        code_length: int
+            number of significant digits in the decoded code
+    """
+
+    latitude: float
+    longitude: float
+    south: float
+    west: float
+    north: float
+    east: float
+    code_length: int
+
+
+# functions
+
+
+def _finest_position(value: float) -> int:
+    """
+    (internal function) truncates a coordinate multiplied by its finest precision into an
+    integer position, rounding to 6 decimal places first like the reference implementation
+    to avoid floating point representation errors. round() is only needed, and only called,
+    when the value is within a millionth of the next integer
+    """
+
+    position = int(value)
+    if value - position < 0.99999:  # noqa: PLR2004
+        return position
+    return int(round(value, 6))
+
+
+@lru_cache(maxsize=CODEC_CACHE_SIZE)
+def is_valid(code: str) -> bool:
+    """
+    function that checks if a string is a valid full or short Plus Code
+
+    arguments
+        code: str
+
+    returns bool
+    """
+
+    separator = code.find(SEPARATOR)
+
+    if (
+        (len(code) == 1)
+        or (separator == -1)
+        or (separator > SEPARATOR_POSITION)
+        or (separator % 2 == 1)
+        or (code.count(SEPARATOR) > 1)
+    ):
+        return False
+
+    # padding is one even-length group, only in full codes, and ends the code
+    padding = code.find(PADDING)
+    if padding != -1:
+        padding_group = code[padding : code.rfind(PADDING) + 1]
+        if (
+            (separator < SEPARATOR_POSITION)
+            or (padding == 0)
+            or (len(padding_group) % 2 == 1)
+            or (padding_group.count(PADDING) != len(padding_group))
+            or (not code.endswith(SEPARATOR))
+        ):
+            return False
+
+    # a single character after the separator is not legal
+    if len(code) - separator - 1 == 1:
+        return False
+
+    return _VALID_CHARACTERS.issuperset(code)
+
+
+@lru_cache(maxsize=CODEC_CACHE_SIZE)
+def is_short(code: str) -> bool:
+    """
+    function that checks if a string is a valid short Plus Code, e.g., "8QMF+FX"
+
+    arguments
+        code: str
+
+    returns bool
+    """
+    return is_valid(code) and (0 <= code.find(SEPARATOR) < SEPARATOR_POSITION)
+
+
+@lru_cache(maxsize=CODEC_CACHE_SIZE)
+def is_full(code: str) -> bool:
+    """
+    function that checks if a string is a valid full-length Plus Code, e.g., "6PH58QMF+FX"
+
+    arguments
+        code: str
+
+    returns bool
+    """
+
+    if (not is_valid(code)) or is_short(code):
+        return False
+
+    # the first pair must not encode a latitude past 90 or a longitude past 180 degrees
+    first_latitude = _DIGIT_VALUES.get(code[0], 20) * 20
+    first_longitude = _DIGIT_VALUES.get(code[1], 20) * 20
+    return (first_latitude < 90 * 2) and (first_longitude < 180 * 2)
+
+
+def encode(latitude: float, longitude: float, code_length: int = PAIR_CODE_LENGTH) -> str:
+    """
+    function that encodes a coordinate into a Plus Code
+
+    arguments
+        latitude: float
+            latitude in degrees, clipped to -90 to 90
+        longitude: float
+            longitude in degrees, normalised to -180 to 180
+        code_length: int = 10
+            number of significant digits, 2-8 (even) or 10-15
+
+    returns str
+    """
+
+    if code_length not in LAT_PRECISIONS:
+        msg = f"invalid Plus Code length {code_length}, expected 2-8 (even) or 10-15"
+        raise ValueError(msg)
+
+    latitude = min(90.0, max(-90.0, latitude))
+    if latitude == 90:  # noqa: PLR2004
+        latitude -= LAT_PRECISIONS[code_length]
+
+    lat_value = _finest_position((latitude + 90) * FINAL_LAT_PRECISION)
+    lon_value = _finest_position(((longitude + 180) % 360) * FINAL_LON_PRECISION)
+
+    grid_code: str = ""
+    if code_length > PAIR_CODE_LENGTH:
+        grid_digits: list[str] = []
+        for _ in range(MAX_CODE_LENGTH - PAIR_CODE_LENGTH):
+            lat_value, row = divmod(lat_value, 5)
+            lon_value, column = divmod(lon_value, 4)
+            grid_digits.append(ALPHABET[row * 4 + column])
+        grid_code = "".join(reversed(grid_digits))
+
+    else:
+        lat_value //= 5 ** (MAX_CODE_LENGTH - PAIR_CODE_LENGTH)
+        lon_value //= 4 ** (MAX_CODE_LENGTH - PAIR_CODE_LENGTH)
+
+    # split the five base-20 digits of each value into one digit and two digit-pairs,
+    # then look up each latitude-longitude character pair
+    lat_first, lat_rest = divmod(lat_value, 20**4)
+    lat_middle, lat_last = divmod(lat_rest, 20**2)
+    lon_first, lon_rest = divmod(lon_value, 20**4)
+    lon_middle, lon_last = divmod(lon_rest, 20**2)
+    pair_code = (
+        _PAIRS[lat_first][lon_first]
+        + _PAIRS[_HIGH_DIGITS[lat_middle]][_HIGH_DIGITS[lon_middle]]
+        + _PAIRS[_LOW_DIGITS[lat_middle]][_LOW_DIGITS[lon_middle]]
+        + _PAIRS[_HIGH_DIGITS[lat_last]][_HIGH_DIGITS[lon_last]]
+        + _PAIRS[_LOW_DIGITS[lat_last]][_LOW_DIGITS[lon_last]]
+    )
+
+    if code_length >= SEPARATOR_POSITION:
+        return (
+            pair_code[:SEPARATOR_POSITION]
+            + SEPARATOR
+            + (pair_code[SEPARATOR_POSITION:] + grid_code)[: code_length - SEPARATOR_POSITION]
+        )
+
+    return pair_code[:code_length] + PADDING * (SEPARATOR_POSITION - code_length) + SEPARATOR
+
+
+@lru_cache(maxsize=CODEC_CACHE_SIZE)
+def decode(code: str) -> PlusCodeArea:
+    """
+    function that decodes a full-length Plus Code into its area
+
+    arguments
+        code: str
+            full-length Plus Code, e.g., "6PH58QMF+FX"
+
+    returns PlusCodeArea
+
+    raises ValueError if the code is not a valid full-length Plus Code
+    """
+
+    if not is_full(code):
+        msg = f"'{code}' is not a valid full-length Plus Code"
+        raise ValueError(msg)
+
+    # skips the separator and padding, the only other characters in a valid code
+    digits = [_DIGIT_VALUES[c] for c in code if c in _DIGIT_VALUES][:MAX_CODE_LENGTH]
+
+    lat_value = -90 * PAIR_PRECISION
+    lon_value = -180 * PAIR_PRECISION
+    place_value = _PAIR_PLACE_VALUES[0]
+    for pair, place_value in enumerate(_PAIR_PLACE_VALUES[: len(digits[:PAIR_CODE_LENGTH]) // 2]):
+        lat_value += digits[pair * 2] * place_value
+        lon_value += digits[pair * 2 + 1] * place_value
+
+    lat_precision = lon_precision = place_value / PAIR_PRECISION
+    grid_lat_value = grid_lon_value = 0
+
+    if len(digits) > PAIR_CODE_LENGTH:
+        row_place_value = column_place_value = 1
+        for grid, digit in enumerate(digits[PAIR_CODE_LENGTH:]):
+            row_place_value = _GRID_ROW_PLACE_VALUES[grid]
+            column_place_value = _GRID_COL_PLACE_VALUES[grid]
+            grid_lat_value += (digit // 4) * row_place_value
+            grid_lon_value += (digit % 4) * column_place_value
+
+        lat_precision = row_place_value / FINAL_LAT_PRECISION
+        lon_precision = column_place_value / FINAL_LON_PRECISION
+
+    south = lat_value / PAIR_PRECISION + grid_lat_value / FINAL_LAT_PRECISION
+    west = lon_value / PAIR_PRECISION + grid_lon_value / FINAL_LON_PRECISION
+    north = south + lat_precision
+    east = west + lon_precision
+    south, west, north, east = round(south, 14), round(west, 14), round(north, 14), round(east, 14)
+
+    return PlusCodeArea(
+        latitude=round(min((south + north) / 2, 90), 14),
+        longitude=round(min((west + east) / 2, 180), 14),
+        south=south,
+        west=west,
+        north=north,
+        east=east,
+        code_length=len(digits),
+    )
+
+
+def recover_nearest(code: str, latitude: float, longitude: float) -> str:
+    """
+    function that recovers the full-length Plus Code nearest to a reference location
+    from a short Plus Code, e.g., "8QMF+FX" near Singapore to "6PH58QMF+FX"
+
+    arguments
+        code: str
+            short Plus Code, full-length codes are returned in uppercase
+        latitude: float
+            reference latitude in degrees
+        longitude: float
+            reference longitude in degrees
+
+    returns str
+
+    raises ValueError if the code is not a valid short or full-length Plus Code
+    """
+
+    if is_full(code):
+        return code.upper()
+
+    if not is_short(code):
+        msg = f"'{code}' is not a valid short Plus Code"
+        raise ValueError(msg)
+
+    latitude = min(90.0, max(-90.0, latitude))
+    longitude = ((longitude + 180) % 360) - 180
+
+    # pad the short code with the reference location's leading digits
+    padding_length = SEPARATOR_POSITION - code.find(SEPARATOR)
+    resolution = 20 ** (2 - (padding_length / 2))
+    half_resolution = resolution / 2
+    area = decode(encode(latitude, longitude)[:padding_length] + code.upper())
+    centre_latitude, centre_longitude = area.latitude, area.longitude
+
+    # move a cell over if the padded code is more than half a cell from the reference
+    if (latitude + half_resolution < centre_latitude) and (
+        centre_latitude - resolution >= -90  # noqa: PLR2004
+    ):
+        centre_latitude -= resolution
+
+    elif (latitude - half_resolution > centre_latitude) and (
+        centre_latitude + resolution <= 90  # noqa: PLR2004
+    ):
+        centre_latitude += resolution
+
+    if longitude + half_resolution < centre_longitude:
+        centre_longitude -= resolution
+
+    elif longitude - half_resolution > centre_longitude:
+        centre_longitude += resolution
+
+    return encode(centre_latitude, centre_longitude, area.code_length)
@@ -29,42 +29,68 @@ OTHER DEALINGS IN THE SOFTWARE.
 For more information, please refer to <http://unlicense.org/>
 """
 
-from argparse import ArgumentParser
-from collections import OrderedDict
-from collections.abc import Callable, Sequence
-from copy import deepcopy
-from dataclasses import dataclass
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from collections.abc import (
+    Awaitable,
+    Callable,
+    Generator,
+    Hashable,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+)
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-from functools import lru_cache
+from functools import lru_cache, partial, wraps
 from hashlib import shake_256
+from io import BufferedIOBase, StringIO
+from itertools import islice
+from json import dumps as json_dumps
 from json import loads as json_loads
 from json.decoder import JSONDecodeError
-from platform import platform
-from socket import gethostname
+from math import ceil, cos, floor, isfinite, isnan, nan, radians
+from mmap import ACCESS_READ, mmap
+from os import cpu_count, getenv, getpid
+from pathlib import Path
+from re import Pattern
+from re import compile as re_compile
+from struct import Struct, calcsize
+from sys import argv, byteorder, executable, getsizeof, intern, stderr, stdin, stdout
 from sys import exit as sysexit
-from sys import stderr, stdin, stdout
+from threading import BoundedSemaphore, Lock, Thread
+from time import monotonic, perf_counter, sleep, time
 from typing import (
     TYPE_CHECKING,
     Any,
+    ClassVar,
     Final,
     Generic,
+    Literal,
     NamedTuple,
     Protocol,
+    Self,
     TextIO,
     TypeAlias,
     TypeVar,
 )
-from uuid import getnode
+from zlib import compress as zlib_compress
+from zlib import decompress as zlib_decompress
 
-from geopy.extra.rate_limiter import RateLimiter as _geopy_RateLimiter  # type: ignore
-from geopy.geocoders import Nominatim as _geopy_Nominatim  # type: ignore
-from pluscodes import PlusCode as _PlusCode  # type: ignore
-from pluscodes import encode as _encode  # type: ignore
-from pluscodes.openlocationcode import recoverNearest as _PlusCode_recoverNearest  # type: ignore
-from pluscodes.validator import Validator as _PlusCode_Validator  # type: ignore
+from . import codec as _codec
 
+# heavier modules are imported where they are used, keeping cli start-up fast for
+# conversions that do not need them. see src/tools/bench-coldstart.py
 if TYPE_CHECKING:
+    import socket
+    import sqlite3
+    from concurrent.futures import Executor, Future
+
     from geopy import Location as _geopy_Location  # type: ignore
 
 # constants
@@ -77,8 +103,28 @@ BUILD_COMMIT: Final[str] = "latest"
 BUILD_DATETIME: Final[datetime] = datetime.now(timezone(timedelta(hours=8)))  # using SGT
 CONNECTION_MAX_RETRIES: int = 9
 CONNECTION_WAIT_SECONDS: int = 10
+CONNECTION_MIN_DELAY_SECONDS: float = 1.0  # between requests from concurrent conversions
 LOCALITY_GEOCODER_LEVEL: int = 13  # adjusts geocoder zoom level when
                                    # geocoding lat long into an address
+CACHE_TTL_SECONDS: int = 60 * 60 * 24 * 30  # 30 days
+CACHE_MAX_ENTRIES: int = 100_000
+LOCALITY_TTL_SECONDS: int = 60 * 60 * 24 * 365  # localities rarely move
+MEMORY_CACHE_MAX_ENTRIES: int = 1024
+MEMORY_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+HTTP_DEFAULT_ADDRESS: tuple[str, int] = ("127.0.0.1", 8080)
+HTTP_MAX_CONCURRENCY: int = 8  # conversions at once across all clients of serve_http()
+HTTP_MAX_CLIENT_CONCURRENCY: int = 2  # conversions at once for one client of serve_http()
+BATCH_CHUNK_SIZE: int = 256  # queries sent to a batch worker process at once
+
+# quantised reversing: minimum zoom level -> length of the Plus Code cell that coordinates
+# are snapped to. 10 characters is a ~14m cell, 6 characters is a ~5.5km cell
+REVERSER_CELL_CODE_LENGTHS: dict[int, int] = {
+    17: 10,
+    15: 8,
+    LOCALITY_GEOCODER_LEVEL: 6,
+    8: 4,
+    0: 2,
+}
 
 # default shareable text line keys
 SHAREABLE_TEXT_LINE_0_KEYS: dict[str, tuple[str, ...]] = {
@@ -216,7 +262,7 @@ SHAREABLE_TEXT_LINE_6_KEYS.update(
         ),
     }
 )
-SHAREABLE_TEXT_LINE_SETTINGS.update({"IT": deepcopy(SHAREABLE_TEXT_LINE_SETTINGS)["default"]})
+SHAREABLE_TEXT_LINE_SETTINGS.update({"IT": dict(SHAREABLE_TEXT_LINE_SETTINGS["default"])})
 SHAREABLE_TEXT_LINE_SETTINGS["IT"][5] = (" ", False)
 
 # special per-country key arrangements for MY/Malaysia
@@ -233,7 +279,7 @@ SHAREABLE_TEXT_LINE_5_KEYS.update(
         ),
     },
 )
-SHAREABLE_TEXT_LINE_SETTINGS.update({"MY": deepcopy(SHAREABLE_TEXT_LINE_SETTINGS)["default"]})
+SHAREABLE_TEXT_LINE_SETTINGS.update({"MY": dict(SHAREABLE_TEXT_LINE_SETTINGS["default"])})
 SHAREABLE_TEXT_LINE_SETTINGS["MY"][4] = (" ", False)
 SHAREABLE_TEXT_LINE_SETTINGS["MY"][5] = (" ", True)
 
@@ -260,6 +306,9 @@ class LatlongParseError(SurplusError): ...
 class EmptyQueryError(SurplusError): ...
 
 
+class CassetteMissError(SurplusError): ...
+
+
 # data structures
 
 
@@ -293,6 +342,22 @@ class ConversionResultTypeEnum(Enum):
     SHAREABLE_TEXT = "sharetext"
 
 
+class BatchOutputFormatEnum(Enum):
+    """
+    enum representing how batch mode results should be written, one record per line
+
+    values
+        NDJSON: str = "ndjson"
+            {"query": ..., "result": ..., "error": ...} json objects
+        TSV: str = "tsv"
+            query, status ('ok' or 'error'), and result or error message, tab-separated.
+            backslashes, tabs and newlines in fields are backslash-escaped
+    """
+
+    NDJSON = "ndjson"
+    TSV = "tsv"
+
+
 ResultType = TypeVar("ResultType")
 
 
@@ -410,6 +475,98 @@ class Latlong(NamedTuple):
 EMPTY_LATLONG: Final[Latlong] = Latlong(latitude=0.0, longitude=0.0)
 
 
+class AddressRecord(Mapping[str, Any]):
+    """
+    compact read-only mapping of a location dictionary returned by a reverser function,
+    kept by the in-memory caches instead of the dictionary itself
+
+    records with the same keys share one key index, string values are interned so that
+    repeated names like countries, states and cities are stored once across records, and
+    the 'raw' geocoder response, if a dictionary, is kept as compressed json and only
+    decoded when accessed
+
+    arguments
+        location: Mapping[str, Any]
+            location dictionary to copy
+        keep_raw: bool = True
+            whether to keep the 'raw' geocoder response. the memory caches of the default
+            geocoding classes leave it out, so that cache hits do not need to decode it
+
+    methods
+        def to_dict(self) -> dict[str, Any]: ...
+
+    usage
+        record = AddressRecord(geocoding.reverser(latlong))
+        record["country"]
+        record.to_dict()
+    """
+
+    __slots__ = ("_indices", "_raw", "_values")
+
+    # key tuple -> key index shared by records with those keys
+    _key_indices: ClassVar[dict[tuple[str, ...], dict[str, int]]] = {}
+
+    def __init__(self, location: Mapping[str, Any], *, keep_raw: bool = True) -> None:
+        raw = location.get("raw")
+        compress_raw = keep_raw and isinstance(raw, dict)
+
+        keys = tuple(
+            intern(key) for key in location if (key != "raw") or (keep_raw and (not compress_raw))
+        )
+        if (indices := self._key_indices.get(keys)) is None:
+            indices = self._key_indices.setdefault(
+                keys, {key: index for index, key in enumerate(keys)}
+            )
+
+        self._indices: dict[str, int] = indices
+        self._values: tuple[Any, ...] = tuple(
+            intern(value) if isinstance(value, str) else value
+            for value in (location[key] for key in keys)
+        )
+        self._raw: bytes | None = (
+            zlib_compress(
+                json_dumps(raw, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            )
+            if compress_raw
+            else None
+        )
+
+    def __getitem__(self, key: str) -> Any:  # noqa: ANN401
+        if (key == "raw") and (self._raw is not None):
+            return json_loads(zlib_decompress(self._raw))
+        return self._values[self._indices[key]]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._indices
+        if self._raw is not None:
+            yield "raw"
+
+    def __len__(self) -> int:
+        return len(self._indices) + (self._raw is not None)
+
+    def __contains__(self, key: object) -> bool:
+        return (key in self._indices) or ((key == "raw") and (self._raw is not None))
+
+    def __sizeof__(self) -> int:
+        return (
+            object.__sizeof__(self)
+            + getsizeof(self._values)
+            + sum(getsizeof(value) for value in self._values)
+            + (getsizeof(self._raw) if (self._raw is not None) else 0)
+        )
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(zip(self._indices, self._values, strict=True))!r})"
+
+    def to_dict(self) -> dict[str, Any]:
+        """method that returns the location dictionary the record was made from"""
+
+        location = dict(zip(self._indices, self._values, strict=True))
+        if self._raw is not None:
+            location["raw"] = json_loads(zlib_decompress(self._raw))
+        return location
+
+
 class SurplusGeocoderProtocol(Protocol):
     """
     typing_extensions.Protocol class for documentation and static type checking of
@@ -470,6 +627,34 @@ class SurplusReverserProtocol(Protocol):
     def __call__(self, latlong: Latlong, level: int = 18) -> dict[str, Any]: ...
 
 
+class SurplusAsyncGeocoderProtocol(Protocol):
+    """
+    typing_extensions.Protocol class for documentation and static type checking of
+    asynchronous surplus geocoder functions, used by surplus_async()
+
+        async (place: str) -> Latlong
+
+    asynchronous counterpart of SurplusGeocoderProtocol, see its docstring for more
+    information
+    """
+
+    async def __call__(self, place: str) -> Latlong: ...
+
+
+class SurplusAsyncReverserProtocol(Protocol):
+    """
+    typing_extensions.Protocol class for documentation and static type checking of
+    asynchronous surplus reverser functions, used by surplus_async()
+
+        async (latlong: Latlong, level: int = 18) -> dict[str, Any]
+
+    asynchronous counterpart of SurplusReverserProtocol, see its docstring for more
+    information
+    """
+
+    async def __call__(self, latlong: Latlong, level: int = 18) -> dict[str, Any]: ...
+
+
 class PlusCodeQuery(NamedTuple):
     """
     typing.NamedTuple representing a full-length Plus Code (e.g., 6PH58QMF+FX)
@@ -496,15 +681,7 @@ class PlusCodeQuery(NamedTuple):
         returns Result[Latlong]
         """
 
-        latitude: float = 0.0
-        longitude: float = 0.0
-
-        try:
-            plus_code = _PlusCode(self.code)
-            latitude = plus_code.area.center().lat
-            longitude = plus_code.area.center().lon
-
-        except KeyError:
+        if _codec.is_short(self.code):
             return Result[Latlong](
                 EMPTY_LATLONG,
                 error=IncompletePlusCodeError(
@@ -513,10 +690,13 @@ class PlusCodeQuery(NamedTuple):
                 ),
             )
 
+        try:
+            area = _codec.decode(self.code)
+
         except Exception as exc:  # noqa: BLE001
             return Result[Latlong](EMPTY_LATLONG, error=exc)
 
-        return Result[Latlong](Latlong(latitude=latitude, longitude=longitude))
+        return Result[Latlong](Latlong(latitude=area.latitude, longitude=area.longitude))
 
     def __str__(self) -> str:
         """method that returns string representation of query"""
@@ -558,10 +738,10 @@ class LocalCodeQuery(NamedTuple):
         try:
             locality_location = geocoder(self.locality)
 
-            recovered_pluscode = _PlusCode_recoverNearest(
+            recovered_pluscode = _codec.recover_nearest(
                 code=self.code,
-                referenceLatitude=locality_location.latitude,
-                referenceLongitude=locality_location.longitude,
+                latitude=locality_location.latitude,
+                longitude=locality_location.longitude,
             )
 
             return Result[str](recovered_pluscode)
@@ -670,6 +850,72 @@ class StringQuery(NamedTuple):
 Query: TypeAlias = PlusCodeQuery | LocalCodeQuery | LatlongQuery | StringQuery
 
 
+class SurplusCallTiming(NamedTuple):
+    """
+    typing.NamedTuple representing one geocoding or reversing call made by a conversion,
+    see SurplusTimings
+
+    arguments
+        backend: Literal["geocoder", "reverser"]
+            which of the behaviour's functions was called
+        argument: str
+            place name geocoded, or latlong reversed
+        seconds: float
+            time spent in the call, including waiting on rate limiters and retries
+        cache: str | None
+            where the answer came from: "memory" or "persistent" for the geocoding caches,
+            "locality" for the locality table, "in-flight" for a concurrent identical call,
+            or "miss" for the geocoding service. None if the function does not say, e.g.,
+            a custom geocoder or reverser
+        retries: int
+            requests to the geocoding service retried after an error
+    """
+
+    backend: Literal["geocoder", "reverser"]
+    argument: str
+    seconds: float
+    cache: str | None
+    retries: int
+
+
+class SurplusTimings(NamedTuple):
+    """
+    typing.NamedTuple representing where the time went in one conversion, passed to
+    Behaviour.timings_hook. stage times are measured with time.perf_counter()
+
+    arguments
+        query: str
+            query as given to surplus()
+        parse_seconds: float
+            time spent parsing the query
+        geocode_seconds: float
+            time spent in geocoder calls, including locality lookups for local codes
+        reverse_seconds: float
+            time spent in reverser calls
+        generate_text_seconds: float
+            time spent generating shareable or locality text
+        total_seconds: float
+            time spent in the whole conversion
+        calls: tuple[SurplusCallTiming, ...]
+            every geocoding and reversing call made, in order
+    """
+
+    query: str
+    parse_seconds: float
+    geocode_seconds: float
+    reverse_seconds: float
+    generate_text_seconds: float
+    total_seconds: float
+    calls: tuple[SurplusCallTiming, ...]
+
+    def to_json(self) -> str:
+        """method that returns the timings as one line of json"""
+        return json_dumps(
+            self._asdict() | {"calls": [call._asdict() for call in self.calls]},
+            ensure_ascii=False,
+        )
+
+
 def generate_fingerprinted_user_agent() -> Result[str]:
     """
     function that attempts to return a unique user agent string.
@@ -681,6 +927,10 @@ def generate_fingerprinted_user_agent() -> Result[str]:
         valid results will have a value of 'surplus/<version> (<fingerprint hash>)',
         where <fingerprint hash> is a 12 character hexadecimal string
     """
+    from platform import platform  # noqa: PLC0415
+    from socket import gethostname  # noqa: PLC0415
+    from uuid import getnode  # noqa: PLC0415
+
     version: str = ".".join([str(v) for v in VERSION]) + VERSION_SUFFIX
 
     def _try(func: Callable) -> str:
@@ -706,1008 +956,5072 @@ def generate_fingerprinted_user_agent() -> Result[str]:
     return Result[str](f"surplus/{version} ({fingerprint})")
 
 
-default_fingerprint: Final[str] = generate_fingerprinted_user_agent().value
-
+def default_cache_path() -> Path:
+    """
+    function that returns the default path of the persistent geocoding cache,
+    `$XDG_CACHE_HOME/surplus/cache.sqlite3`, or `~/.cache/surplus/cache.sqlite3` if
+    XDG_CACHE_HOME is not set
 
-@dataclass
-class SurplusDefaultGeocoding:
+    returns Path
     """
-    dataclass providing the default geocoding functionality for surplus, via
-    OpenStreetMap Nominatim
+    cache_home = getenv("XDG_CACHE_HOME", "")
+    cache_directory = Path(cache_home) if (cache_home != "") else Path.home().joinpath(".cache")
+    return cache_directory.joinpath("surplus", "cache.sqlite3")
 
-    attributes
-        user_agent: str = default_fingerprint
-            pass in a custom user agent here, else it will be the default fingerprinted
-            user agent
 
-    usage
-        geocoding = SurplusDefaultGeocoding(behaviour.user_agent)
-        geocoding.update_geocoding_functions()
-        ...
-        Behaviour(
-            ...,
-            geocoder=geocoding.geocoder,
-            reverser=geocoding.reverser
-        )
+def default_rate_limiter_path() -> Path:
     """
+    function that returns the default path of the shared rate limiter state,
+    `ratelimit.sqlite3` next to the default persistent cache (see default_cache_path())
 
-    user_agent: str = default_fingerprint
-    _ratelimited_raw_geocoder: Callable = lambda _: None  # noqa: E731
-    _ratelimited_raw_reverser: Callable = lambda _: None  # noqa: E731
-    _first_update: bool = False
-
-    def update_geocoding_functions(self) -> None:
-        """
-        re-initialise the geocoding functions with the current user agent, also generate
-        a new user agent if not set properly
-        """
+    returns Path
+    """
+    return default_cache_path().with_name("ratelimit.sqlite3")
 
-        if not isinstance(self.user_agent, str):
-            self.user_agent: str = generate_fingerprinted_user_agent().value
 
-        nominatim = _geopy_Nominatim(user_agent=self.user_agent)
+def default_socket_path() -> Path:
+    """
+    function that returns the default path of the conversion daemon's unix socket,
+    `surplus.sock` next to the default persistent cache (see default_cache_path())
 
-        # this is
+    returns Path
+    """
+    return default_cache_path().with_name("surplus.sock")
 
-        self._ratelimited_raw_geocoder: Callable = lru_cache(
-            _geopy_RateLimiter(
-                nominatim.geocode,
-                max_retries=CONNECTION_MAX_RETRIES,
-                error_wait_seconds=CONNECTION_WAIT_SECONDS,
-            )
-        )
 
-        self._ratelimited_raw_reverser: Callable = lru_cache(
-            _geopy_RateLimiter(
-                nominatim.reverse,
-                max_retries=CONNECTION_MAX_RETRIES,
-                error_wait_seconds=CONNECTION_WAIT_SECONDS,
-            )
-        )
+@lru_cache(maxsize=1)
+def default_user_agent() -> str:
+    """
+    function that returns the default fingerprinted user agent string, see
+    generate_fingerprinted_user_agent()
 
-        self._first_update = True
+    generating the fingerprint can shell out to find a mac address, so it is cached in
+    `fingerprint.json` next to the default persistent cache (see default_cache_path()), and
+    only regenerated when the surplus version, python executable, operating system
+    (including the hostname) or mac address changes
 
-    def geocoder(self, place: str) -> Latlong:
-        """
-        default geocoder for surplus, uses OpenStreetMap Nominatim
+    returns str
+    """
 
-        see SurplusGeocoderProtocol for more information on surplus geocoder functions
-        """
+    from platform import uname  # noqa: PLC0415
+    from uuid import getnode  # noqa: PLC0415
 
-        if self._first_update is False:
-            self.update_geocoding_functions()
+    # getnode() falls back to a random multicast address if there is no mac address to use
+    node = getnode()
+    mac_address = "random" if ((node >> 40) & 1) else f"{node:012x}"
 
-        location: _geopy_Location | None = self._ratelimited_raw_geocoder(place)
+    path = default_cache_path().with_name("fingerprint.json")
+    inputs = shake_256(
+        "\0".join(
+            (
+                ".".join([str(v) for v in VERSION]) + VERSION_SUFFIX,
+                executable,
+                *uname()[:5],
+                mac_address,
+            )
+        ).encode()
+    ).hexdigest(16)
 
-        if location is None:
-            msg = f"No suitable location could be geolocated from '{place}'"
-            raise NoSuitableLocationError(msg)
+    try:
+        cached = json_loads(path.read_text(encoding="utf-8"))
+        if isinstance(cached, dict) and (cached.get("inputs") == inputs):
+            return str(cached["user_agent"])
 
-        bounding_box: tuple[float, float, float, float] | None = location.raw.get(
-            "boundingbox", None
-        )
+    except (OSError, ValueError, KeyError):
+        pass
 
-        if location.raw.get("boundingbox", None) is not None:
-            _bounding_box = [float(c) for c in location.raw.get("boundingbox", [])]
-            if len(_bounding_box) == 4:  # noqa: PLR2004
-                bounding_box = (
-                    _bounding_box[0],
-                    _bounding_box[1],
-                    _bounding_box[2],
-                    _bounding_box[3],
-                )
+    user_agent = generate_fingerprinted_user_agent().value
 
-        return Latlong(
-            latitude=location.latitude,
-            longitude=location.longitude,
-            bounding_box=bounding_box,
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_name(f"{path.name}.{getpid()}")
+        temporary_path.write_text(
+            json_dumps({"inputs": inputs, "user_agent": user_agent}), encoding="utf-8"
         )
+        temporary_path.replace(path)
 
-    def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]:
-        """
-        default reverser for surplus, uses OpenStreetMap Nominatim
-
-        arguments
-            latlong: Latlong
-            level: int = 0
-                level of detail for the returned address, 0-18 (country-building) inclusive
+    except OSError:
+        pass
 
-        see SurplusReverserProtocol for more information on surplus reverser functions
-        """
+    return user_agent
 
-        if self._first_update is False:
-            self.update_geocoding_functions()
 
-        location: _geopy_Location | None = self._ratelimited_raw_reverser(str(latlong), zoom=level)
+def __getattr__(name: str) -> Any:  # noqa: ANN401
+    """(internal function) lazily provides module attributes that are costly to compute"""
 
-        if location is None:
-            msg = f"could not reverse '{latlong!s}'"
-            raise NoSuitableLocationError(msg)
+    # default_fingerprint was generated on import before default_user_agent() existed
+    if name == "default_fingerprint":
+        return default_user_agent()
 
-        location_dict: dict[str, Any] = {}
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
 
-        for key in (address := location.raw.get("address", {})):
-            location_dict[key] = address.get(key, "")
 
-        location_dict["raw"] = location.raw
-        location_dict["latitude"] = location.latitude
-        location_dict["longitude"] = location.longitude
+def _sqlite_connect(path: Path) -> "sqlite3.Connection":
+    """(internal function) opens an sqlite database shared with other processes"""
 
-        return location_dict
+    import sqlite3  # noqa: PLC0415
 
+    path.parent.mkdir(parents=True, exist_ok=True)
 
-default_geocoding: Final[SurplusDefaultGeocoding] = SurplusDefaultGeocoding(default_fingerprint)
+    # autocommit mode, every statement is its own transaction unless one is explicitly
+    # begun; the timeout makes concurrent writers from other processes wait for the lock
+    # instead of failing
+    connection = sqlite3.connect(
+        path,
+        timeout=30,
+        isolation_level=None,
+        check_same_thread=False,
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
 
 
-class Behaviour(NamedTuple):
+class SurplusCacheStats(NamedTuple):
     """
-    typing.NamedTuple representing how surplus operations should behave
+    typing.NamedTuple representing the statistics of a SurplusMemoryCache
 
     arguments
-        query: str | list[str] = ""
-            original user-passed query string or a list of strings from splitting
-            user-passed query string by spaces
-        geocoder: SurplusGeocoderProtocol = default_geocoding.geocoder
-            name string to location function, see SurplusGeocoderProtocol docstring for
-            for more information
-        reverser: SurplusReverserProtocol = default_geocoding.reverser
-            latlong to address information dict function, see SurplusReverserProtocol
-            docstring for more information
-        stderr: TextIO = sys.stderr
-            TextIO-like object representing a writeable file. defaults to sys.stderr
-        stdout: TextIO = sys.stdout
-            TextIO-like object representing a writeable file. defaults to sys.stdout
-        debug: bool = False
-            whether to print debug information to stderr
-        version_header: bool = False
-            whether to print version information and exit
-        convert_to_type: ConversionResultTypeEnum = ConversionResultTypeEnum.SHAREABLE_TEXT
-            what type to convert query to
-        using_termux_location: bool = False
-            treats query as a termux-location output json string, and parses it accordingly
-        show_user_agent: bool = False
-            whether to print the fingerprinted user agent and exit
+        hits: int
+            lookups that found a valid entry
+        misses: int
+            lookups that found no entry, or an expired one
+        evictions: int
+            entries removed to stay within max_entries or max_bytes
+        expirations: int
+            entries removed for being older than ttl_seconds
+        entries: int
+            entries currently cached
+        bytes: int
+            approximate memory used by the entries currently cached
+        max_entries: int
+        max_bytes: int
     """
 
-    query: str | list[str] = ""
-    geocoder: SurplusGeocoderProtocol = default_geocoding.geocoder
-    reverser: SurplusReverserProtocol = default_geocoding.reverser
-    stderr: TextIO = stderr
-    stdout: TextIO = stdout
-    debug: bool = False
-    version_header: bool = False
-    convert_to_type: ConversionResultTypeEnum = ConversionResultTypeEnum.SHAREABLE_TEXT
-    using_termux_location: bool = False
-    show_user_agent: bool = False
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    entries: int
+    bytes: int
+    max_entries: int
+    max_bytes: int
 
 
-# functions
+def _approximate_size(value: object) -> int:
+    """(internal function) returns the approximate memory used by a value, in bytes"""
 
+    size = getsizeof(value)
 
-def parse_query(behaviour: Behaviour) -> Result[Query]:
+    if isinstance(value, dict):
+        size += sum(_approximate_size(key) + _approximate_size(item) for key, item in value.items())
+
+    elif isinstance(value, list | tuple):
+        size += sum(_approximate_size(item) for item in value)
+
+    return size
+
+
+@dataclass
+class SurplusMemoryCache:
     """
-    function that parses a query string into a query object
+    dataclass providing a thread-safe in-memory least-recently-used cache, bounded by entry
+    count and approximate memory use, with optional expiry and hit, miss and eviction
+    statistics
 
-    arguments
-        behaviour: Behaviour
+    attributes
+        max_entries: int = MEMORY_CACHE_MAX_ENTRIES
+            maximum number of entries. zero or less disables the limit
+        max_bytes: int = MEMORY_CACHE_MAX_BYTES
+            maximum approximate memory used by keys and values, in bytes. values larger
+            than this are not cached. zero or less disables the limit
+        ttl_seconds: float = 0
+            how long entries are valid for, in seconds. zero or less disables expiry
 
-    returns Result[Query]
+    methods
+        def get(self, key: Hashable) -> Any | None: ...
+        def set(self, key: Hashable, value: Any) -> None: ...
+        def stats(self) -> SurplusCacheStats: ...
+        def clear(self) -> None: ...
+
+    usage
+        geocoding = SurplusDefaultGeocoding(
+            behaviour.user_agent,
+            memory_cache=SurplusMemoryCache(max_entries=100_000, ttl_seconds=3600),
+        )
+        ...
+        print(geocoding.memory_cache.stats())
     """
 
-    def _match_plus_code(
-        behaviour: Behaviour,
-    ) -> Result[Query]:
+    max_entries: int = MEMORY_CACHE_MAX_ENTRIES
+    max_bytes: int = MEMORY_CACHE_MAX_BYTES
+    ttl_seconds: float = 0
+    _entries: OrderedDict[Hashable, tuple[Any, int, float]] = field(
+        default_factory=OrderedDict, repr=False
+    )
+    _bytes: int = field(default=0, repr=False)
+    _hits: int = field(default=0, repr=False)
+    _misses: int = field(default=0, repr=False)
+    _evictions: int = field(default=0, repr=False)
+    _expirations: int = field(default=0, repr=False)
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def _remove(self, key: Hashable) -> None:
+        """(internal method) removes an entry, the lock must be held"""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key: Hashable) -> Any | None:  # noqa: ANN401
         """
-        internal helper code reuse function
+        method that returns a cached value, or None if missing or expired
 
-        looks through each 'word' and attempts to match to a Plus Code
-        if found, remove from original query and strip of whitespace and commas
-        use resulting stripped query as locality
+        arguments
+            key: Hashable
         """
 
-        validator = _PlusCode_Validator()
-        portion_plus_code: str = ""
-        portion_locality: str = ""
-        original_query: str = ""
-        split_query: list[str] = []
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                self._misses += 1
+                return None
 
-        if isinstance(behaviour.query, list):
-            original_query = " ".join(behaviour.query)
-            split_query = behaviour.query
+            value, _, stored = entry
+            if (self.ttl_seconds > 0) and (stored < (monotonic() - self.ttl_seconds)):
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
 
-        else:
-            original_query = str(behaviour.query)
-            split_query = behaviour.query.split(" ")
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
 
-        for _word in split_query:
-            word = _word.strip(",").strip()
+    def set(self, key: Hashable, value: Any) -> None:  # noqa: ANN401
+        """
+        method that caches a value, replacing any existing entry and evicting the least
+        recently used entries to stay within the limits
 
-            if validator.is_valid(word):
-                portion_plus_code = word
+        arguments
+            key: Hashable
+            value: Any
+                value to cache, must not be None
+        """
 
-                if validator.is_full(word):
-                    return Result[Query](PlusCodeQuery(portion_plus_code))
+        size = _approximate_size(key) + _approximate_size(value)
 
-                break
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
 
-        # didn't find a plus code. :(
-        if portion_plus_code == "":
-            return Result[Query](
-                LatlongQuery(EMPTY_LATLONG),
-                error=PlusCodeNotFoundError("unable to find a Plus Code"),
-            )
+            if (self.max_bytes > 0) and (size > self.max_bytes):
+                return
 
-        # found a plus code!
-        portion_locality = original_query.replace(portion_plus_code, "")
-        portion_locality = portion_locality.strip().strip(",").strip()
+            self._entries[key] = (value, size, monotonic())
+            self._bytes += size
 
-        # did find plus code, but not full-length. :(
-        if (portion_locality == "") and (not validator.is_full(portion_plus_code)):
-            return Result[Query](
-                LatlongQuery(EMPTY_LATLONG),
-                error=IncompletePlusCodeError(
-                    "_match_plus_code: Plus Code is not full-length (e.g., 6PH58QMF+FX)"
-                ),
+            while ((self.max_entries > 0) and (len(self._entries) > self.max_entries)) or (
+                (self.max_bytes > 0) and (self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def stats(self) -> SurplusCacheStats:
+        """method that returns the cache's statistics"""
+
+        with self._lock:
+            return SurplusCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_entries=self.max_entries,
+                max_bytes=self.max_bytes,
             )
 
-        if behaviour.debug:
-            print(
-                f"debug: _match_plus_code: {portion_plus_code=}, {portion_locality=}",
-                file=behaviour.stderr,
-            )
+    def clear(self) -> None:
+        """method that removes every entry, keeping the statistics"""
 
-        return Result[Query](
-            LocalCodeQuery(
-                code=portion_plus_code,
-                locality=portion_locality,
-            )
-        )
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
 
-    # types to handle:
-    #
-    # plus codes
-    #   6PH58R3M+F8
-    # local codes
-    #   8RQQ+4Q Singapore                        (single-word-long locality suffix)
-    #   St Lucia, Queensland, Australia G227+XF  (multi-word-long locality prefix)
-    # latlong coords
-    #   1.3521,103.8198   (single-word-long with comma)
-    #   1.3521, 103.8198  (space-seperated with comma)
-    #   1.3521 103.8198   (space-seperated without comma)
-    # string queries
-    #   Ngee Ann Polytechnic, Singapore  (has a comma)
-    #   Toa Payoh North                  (no commas)
 
-    if behaviour.debug:
-        print(f"debug: parse_query: {behaviour.query=}", file=behaviour.stderr)
+@dataclass
+class SurplusPersistentCache:
+    """
+    dataclass providing a persistent on-disk cache for geocoding results, shared across
+    processes via an sqlite database in write-ahead logging mode
 
-    # check if empty
-    if behaviour.query in ([], ""):
-        return Result[Query](
-            LatlongQuery(EMPTY_LATLONG),
-            error=EmptyQueryError("empty query string passed"),
-        )
+    entries are json-serialisable values stored under a namespace and a key. entries older
+    than `ttl_seconds` are treated as missing, and the oldest entries are evicted first
+    when there are more than `max_entries` entries
 
-    # try to find a plus/local code
-    if mpc_result := _match_plus_code(behaviour=behaviour):
-        # found one!
-        return Result[Query](mpc_result.get())
+    errors from the underlying database are swallowed, as a failing cache should never
+    fail a conversion. on errors, .get() returns None and .set() does nothing
 
-    # is a plus/local code, but missing details
-    if isinstance(mpc_result.error, IncompletePlusCodeError):
-        return mpc_result  # propagate back up to caller
+    attributes
+        path: Path = default_cache_path()
+            path to the sqlite database, parent directories are created if needed
+        ttl_seconds: float = CACHE_TTL_SECONDS
+            how long entries are valid for, in seconds. zero or less disables expiry
+        max_entries: int = CACHE_MAX_ENTRIES
+            maximum number of entries across all namespaces. zero or less disables the limit
 
-    # handle query
-    original_query: str = ""
-    split_query: list[str] = []
+    methods
+        def get(self, namespace: str, key: str) -> Any | None: ...
+        def set(self, namespace: str, key: str, value: Any) -> None: ...
+        def prune(self) -> None: ...
+        def close(self) -> None: ...
 
-    if isinstance(behaviour.query, str):
-        original_query = behaviour.query
-        split_query = behaviour.query.split(" ")
+    usage
+        cache = SurplusPersistentCache()
+        geocoding = SurplusDefaultGeocoding(behaviour.user_agent, cache=cache)
+    """
 
-    else:
-        original_query = " ".join(behaviour.query)
-        split_query = behaviour.query
+    path: Path = field(default_factory=default_cache_path)
+    ttl_seconds: float = CACHE_TTL_SECONDS
+    max_entries: int = CACHE_MAX_ENTRIES
+    _connection: "sqlite3.Connection | None" = field(default=None, repr=False)
+    _lock: Lock = field(default_factory=Lock, repr=False)
+    _writes_since_prune: int = 0
+
+    # prune expired and excess entries every this many writes
+    _prune_interval: ClassVar[int] = 256
+
+    def _connect(self) -> "sqlite3.Connection":
+        """(internal method) lazily opens and initialises the database"""
+
+        if self._connection is not None:
+            return self._connection
+
+        connection = _sqlite_connect(self.path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, "
+            "key TEXT NOT NULL, "
+            "value TEXT NOT NULL, "
+            "created REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key)"
+            ") WITHOUT ROWID"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
 
-    if behaviour.debug:
-        print(
-            f"debug: parse_query: {split_query=}\n",
-            f"debug: parse_query: {original_query=}",
+        self._connection = connection
+        self._prune(connection)
+        return connection
+
+    def _prune(self, connection: "sqlite3.Connection") -> None:
+        """(internal method) removes expired entries, then the oldest excess entries"""
+
+        if self.ttl_seconds > 0:
+            connection.execute(
+                "DELETE FROM entries WHERE created < ?",
+                (time() - self.ttl_seconds,),
+            )
+
+        if self.max_entries > 0:
+            (count,) = connection.execute("SELECT COUNT(*) FROM entries").fetchone()
+            if count > self.max_entries:
+                connection.execute(
+                    "DELETE FROM entries WHERE (namespace, key) IN "
+                    "(SELECT namespace, key FROM entries ORDER BY created LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+        self._writes_since_prune = 0
+
+    def get(self, namespace: str, key: str) -> Any | None:  # noqa: ANN401
+        """
+        method that returns a cached value, or None if missing, expired or on error
+
+        arguments
+            namespace: str
+                what the entry is for, e.g., "geocoder" or "reverser"
+            key: str
+                normalised entry key
+        """
+
+        import sqlite3  # noqa: PLC0415
+
+        try:
+            with self._lock:
+                row = (
+                    self._connect()
+                    .execute(
+                        "SELECT value, created FROM entries WHERE namespace = ? AND key = ?",
+                        (namespace, key),
+                    )
+                    .fetchone()
+                )
+
+        except sqlite3.Error:
+            return None
+
+        if row is None:
+            return None
+
+        value, created = row
+        if (self.ttl_seconds > 0) and (created < (time() - self.ttl_seconds)):
+            return None
+
+        return json_loads(value)
+
+    def set(self, namespace: str, key: str, value: Any) -> None:  # noqa: ANN401
+        """
+        method that stores a json-serialisable value, replacing any existing entry
+
+        arguments
+            namespace: str
+                what the entry is for, e.g., "geocoder" or "reverser"
+            key: str
+                normalised entry key
+            value: Any
+                json-serialisable value
+        """
+
+        import sqlite3  # noqa: PLC0415
+
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO entries (namespace, key, value, created) "
+                    "VALUES (?, ?, ?, ?)",
+                    (namespace, key, json_dumps(value, ensure_ascii=False), time()),
+                )
+
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= self._prune_interval:
+                    self._prune(connection)
+
+        except sqlite3.Error:
+            return
+
+    def prune(self) -> None:
+        """method that removes expired entries and evicts the oldest excess entries"""
+
+        import sqlite3  # noqa: PLC0415
+
+        try:
+            with self._lock:
+                self._prune(self._connect())
+
+        except sqlite3.Error:
+            return
+
+    def close(self) -> None:
+        """method that closes the database connection, reopened on the next use"""
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+@dataclass
+class SurplusLocalityTable:
+    """
+    dataclass providing a table of locality names, e.g., "Singapore", to their centre and
+    bounding box, read before geocoding localities when recovering local codes and when
+    shortening Plus Codes into local codes
+
+    the same few localities are looked up for most local codes, so they are kept apart from
+    SurplusPersistentCache entries, where they would be evicted alongside every reversed
+    coordinate. entries are kept in memory, and in an sqlite database if a path is given.
+    like SurplusPersistentCache, database errors are swallowed
+
+    attributes
+        path: Path | None = None
+            path to an sqlite database shared across runs and processes, e.g., the
+            persistent cache's, where the table is stored as `localities`. entries are only
+            kept in memory if None
+        ttl_seconds: float = LOCALITY_TTL_SECONDS
+            how long entries are valid for, in seconds. zero or less disables expiry
+
+    methods
+        def get(self, locality: str) -> Latlong | None: ...
+        def set(self, locality: str, latlong: Latlong) -> None: ...
+        def close(self) -> None: ...
+
+    usage
+        Behaviour(
+            ...,
+            locality_table=SurplusLocalityTable(default_cache_path()),
+        )
+    """
+
+    path: Path | None = None
+    ttl_seconds: float = LOCALITY_TTL_SECONDS
+    _memory: dict[str, tuple[Latlong, float]] = field(default_factory=dict, repr=False)
+    _connection: "sqlite3.Connection | None" = field(default=None, repr=False)
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def _connect(self) -> "sqlite3.Connection":
+        """(internal method) lazily opens and initialises the database"""
+
+        if self._connection is not None:
+            return self._connection
+
+        if self.path is None:
+            msg = "locality table has no database path"
+            raise ValueError(msg)
+
+        connection = _sqlite_connect(self.path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS localities ("
+            "locality TEXT PRIMARY KEY, "
+            "latitude REAL NOT NULL, "
+            "longitude REAL NOT NULL, "
+            "south REAL, "
+            "north REAL, "
+            "west REAL, "
+            "east REAL, "
+            "fetched REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+
+        self._connection = connection
+        return connection
+
+    def _expired(self, fetched: float) -> bool:
+        """(internal method) returns whether an entry fetched at a time is expired"""
+        return (self.ttl_seconds > 0) and (fetched < (time() - self.ttl_seconds))
+
+    def get(self, locality: str) -> Latlong | None:
+        """
+        method that returns the centre and bounding box of a locality, or None if missing,
+        expired or on error
+
+        arguments
+            locality: str
+                locality name, normalised the same way as geocoder cache keys
+        """
+
+        import sqlite3  # noqa: PLC0415
+
+        key = _geocoder_cache_key(locality)
+
+        with self._lock:
+            if ((entry := self._memory.get(key)) is not None) and (not self._expired(entry[1])):
+                return entry[0]
+
+            if self.path is None:
+                return None
+
+            try:
+                row = (
+                    self._connect()
+                    .execute(
+                        "SELECT latitude, longitude, south, north, west, east, fetched "
+                        "FROM localities WHERE locality = ?",
+                        (key,),
+                    )
+                    .fetchone()
+                )
+
+            except sqlite3.Error:
+                return None
+
+            if row is None:
+                return None
+
+            *coordinates, fetched = row
+            latitude, longitude, *bounding_box = coordinates
+            latlong = Latlong(
+                latitude=latitude,
+                longitude=longitude,
+                bounding_box=(
+                    (bounding_box[0], bounding_box[1], bounding_box[2], bounding_box[3])
+                    if (None not in bounding_box)
+                    else None
+                ),
+            )
+
+            self._memory[key] = (latlong, fetched)
+            return None if self._expired(fetched) else latlong
+
+    def set(self, locality: str, latlong: Latlong) -> None:
+        """
+        method that stores the centre and bounding box of a locality, replacing any
+        existing entry
+
+        arguments
+            locality: str
+                locality name, normalised the same way as geocoder cache keys
+            latlong: Latlong
+                geocoded locality
+        """
+
+        import sqlite3  # noqa: PLC0415
+
+        key = _geocoder_cache_key(locality)
+        fetched = time()
+        bounding_box = latlong.bounding_box if (latlong.bounding_box is not None) else (None,) * 4
+
+        with self._lock:
+            self._memory[key] = (latlong, fetched)
+
+            if self.path is None:
+                return
+
+            try:
+                self._connect().execute(
+                    "INSERT OR REPLACE INTO localities "
+                    "(locality, latitude, longitude, south, north, west, east, fetched) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, latlong.latitude, latlong.longitude, *bounding_box, fetched),
+                )
+
+            except sqlite3.Error:
+                return
+
+    def close(self) -> None:
+        """method that closes the database connection, reopened on the next use"""
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+@dataclass
+class SurplusSharedRateLimiter:
+    """
+    dataclass providing a token-bucket rate limiter shared by every process on a host that
+    uses the same state file, so that concurrent surplus runs together stay within the
+    geocoding service's usage policy instead of bursting and being penalised
+
+    the bucket holds up to `burst` tokens and refills at `rate` tokens per second. every
+    request takes a token, and waits for the bucket to refill if it would be overdrawn.
+    the bucket state is kept in an sqlite database row, updated under an exclusive
+    transaction
+
+    attributes
+        path: Path = default_rate_limiter_path()
+            path to the sqlite database holding the bucket state
+        rate: float = 1 / CONNECTION_MIN_DELAY_SECONDS
+            requests per second
+        burst: float = 1.0
+            maximum number of requests that can be made at once after idling
+        name: str = "nominatim"
+            name of the bucket, buckets with different names are independent
+
+    methods
+        def reserve(self) -> float: ...
+        def acquire(self) -> None: ...
+        async def acquire_async(self) -> None: ...
+        def wrap(self, func: Callable[..., ResultType]) -> Callable[..., ResultType]: ...
+        def wrap_async(self, func: ...) -> ...: ...
+
+    usage
+        geocoding = SurplusDefaultGeocoding(
+            behaviour.user_agent,
+            rate_limiter=SurplusSharedRateLimiter(),
+        )
+    """
+
+    path: Path = field(default_factory=default_rate_limiter_path)
+    rate: float = 1 / CONNECTION_MIN_DELAY_SECONDS
+    burst: float = 1.0
+    name: str = "nominatim"
+    _connection: "sqlite3.Connection | None" = field(default=None, repr=False)
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def _connect(self) -> "sqlite3.Connection":
+        """(internal method) lazily opens and initialises the database"""
+
+        if self._connection is not None:
+            return self._connection
+
+        connection = _sqlite_connect(self.path)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "name TEXT PRIMARY KEY, "
+            "tokens REAL NOT NULL, "
+            "updated REAL NOT NULL"
+            ")"
+        )
+
+        self._connection = connection
+        return connection
+
+    def reserve(self) -> float:
+        """
+        method that takes a token from the shared bucket, returning how many seconds to wait
+        before making the request. if the bucket state cannot be read or written, a full
+        refill interval is returned to stay on the safe side
+
+        returns float
+        """
+
+        import sqlite3  # noqa: PLC0415
+
+        try:
+            with self._lock:
+                connection = self._connect()
+
+                # 'immediate' takes the database write lock up front, so the read and
+                # update below are atomic across processes
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    now = time()
+                    row = connection.execute(
+                        "SELECT tokens, updated FROM buckets WHERE name = ?",
+                        (self.name,),
+                    ).fetchone()
+
+                    tokens, updated = row if (row is not None) else (self.burst, now)
+
+                    # refill for the time passed (ignoring clocks going backwards), then
+                    # take a token. a negative balance is the time other reservations
+                    # are already waiting for
+                    tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate) - 1
+
+                    connection.execute(
+                        "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                        (self.name, tokens, now),
+                    )
+                    connection.execute("COMMIT")
+
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+
+        except sqlite3.Error:
+            return 1 / self.rate
+
+        return max(0.0, -tokens / self.rate)
+
+    def acquire(self) -> None:
+        """method that takes a token from the shared bucket, sleeping until it is available"""
+        if (wait := self.reserve()) > 0:
+            sleep(wait)
+
+    async def acquire_async(self) -> None:
+        """
+        method that takes a token from the shared bucket, asynchronously sleeping until it
+        is available
+        """
+        from asyncio import sleep as async_sleep  # noqa: PLC0415
+
+        if (wait := self.reserve()) > 0:
+            await async_sleep(wait)
+
+    def wrap(self, func: Callable[..., ResultType]) -> Callable[..., ResultType]:
+        """method that returns func, taking a token from the shared bucket before every call"""
+
+        @wraps(func)
+        def rate_limited(*args: Any, **kwargs: Any) -> ResultType:  # noqa: ANN401
+            self.acquire()
+            return func(*args, **kwargs)
+
+        return rate_limited
+
+    def wrap_async(
+        self,
+        func: Callable[..., Awaitable[ResultType]],
+    ) -> Callable[..., Awaitable[ResultType]]:
+        """
+        method that returns the asynchronous function func, taking a token from the shared
+        bucket before every call
+        """
+
+        @wraps(func)
+        async def rate_limited(*args: Any, **kwargs: Any) -> ResultType:  # noqa: ANN401
+            await self.acquire_async()
+            return await func(*args, **kwargs)
+
+        return rate_limited
+
+    def close(self) -> None:
+        """method that closes the database connection, reopened on the next use"""
+
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def _nominatim_location(nominatim_url: str) -> dict[str, str]:
+    """
+    (internal function) returns the scheme and domain arguments of geopy's Nominatim class
+    for a base url, or none for OpenStreetMap's Nominatim if the url is empty
+    """
+
+    if nominatim_url == "":
+        return {}
+
+    from urllib.parse import urlsplit  # noqa: PLC0415
+
+    url = urlsplit(nominatim_url)
+    if (url.scheme not in ("http", "https")) or (url.netloc == ""):
+        msg = f"invalid nominatim url '{nominatim_url}', expected http(s)://HOST[:PORT][/PATH]"
+        raise ValueError(msg)
+
+    return {"scheme": url.scheme, "domain": url.netloc + url.path.rstrip("/")}
+
+
+def _geocoder_cache_key(place: str) -> str:
+    """(internal function) normalises a place name for use as a cache key"""
+    return " ".join(place.casefold().split())
+
+
+def _quantise_latlong(latlong: Latlong, level: int) -> Latlong:
+    """
+    (internal function) snaps a coordinate to the centre of its Plus Code cell, sized by
+    the zoom level according to REVERSER_CELL_CODE_LENGTHS
+    """
+
+    code_length: int = REVERSER_CELL_CODE_LENGTHS.get(0, 2)
+    for minimum_level, length in sorted(REVERSER_CELL_CODE_LENGTHS.items(), reverse=True):
+        if level >= minimum_level:
+            code_length = length
+            break
+
+    area = _codec.decode(_codec.encode(latlong.latitude, latlong.longitude, code_length))
+    return Latlong(latitude=area.latitude, longitude=area.longitude)
+
+
+def _reverser_cache_key(latlong: Latlong, level: int) -> str:
+    """(internal function) normalises a coordinate and zoom level for use as a cache key"""
+    return f"{latlong.latitude:.7f},{latlong.longitude:.7f}@{level}"
+
+
+def _latlong_from_location(place: str, location: "_geopy_Location | None") -> Latlong:
+    """(internal function) turns a geopy geocoding result into a Latlong with a bounding box"""
+
+    if location is None:
+        msg = f"No suitable location could be geolocated from '{place}'"
+        raise NoSuitableLocationError(msg)
+
+    bounding_box: tuple[float, float, float, float] | None = location.raw.get(
+        "boundingbox", None
+    )
+
+    if location.raw.get("boundingbox", None) is not None:
+        _bounding_box = [float(c) for c in location.raw.get("boundingbox", [])]
+        if len(_bounding_box) == 4:  # noqa: PLR2004
+            bounding_box = (
+                _bounding_box[0],
+                _bounding_box[1],
+                _bounding_box[2],
+                _bounding_box[3],
+            )
+
+    return Latlong(
+        latitude=location.latitude,
+        longitude=location.longitude,
+        bounding_box=bounding_box,
+    )
+
+
+def _latlong_from_cached(cached: list[Any]) -> Latlong:
+    """(internal function) turns a persistently cached geocoding result into a Latlong"""
+    latitude, longitude, bounding_box = cached
+    return Latlong(
+        latitude=latitude,
+        longitude=longitude,
+        bounding_box=tuple(bounding_box) if (bounding_box is not None) else None,
+    )
+
+
+def _address_from_location(latlong: Latlong, location: "_geopy_Location | None") -> dict[str, Any]:
+    """(internal function) turns a geopy reversing result into a location dictionary"""
+
+    if location is None:
+        msg = f"could not reverse '{latlong!s}'"
+        raise NoSuitableLocationError(msg)
+
+    location_dict: dict[str, Any] = {}
+
+    for key in (address := location.raw.get("address", {})):
+        location_dict[key] = address.get(key, "")
+
+    location_dict["raw"] = location.raw
+    location_dict["latitude"] = location.latitude
+    location_dict["longitude"] = location.longitude
+
+    return location_dict
+
+
+def _address_at_level(location: Mapping[str, Any], level: int) -> dict[str, Any]:
+    """
+    (internal function) returns a copy of a street-level location dictionary as if it were
+    reversed at a lower zoom level, without OFFLINE_REVERSER_DETAIL_KEYS below
+    OFFLINE_REVERSER_DETAIL_LEVEL. the locality keys are kept, as a street-level address
+    names the same city, district and country that a lower zoom level would
+    """
+
+    if level >= OFFLINE_REVERSER_DETAIL_LEVEL:
+        return dict(location)
+
+    return {
+        key: value for key, value in location.items() if key not in OFFLINE_REVERSER_DETAIL_KEYS
+    }
+
+
+def _recall_street_level_address(
+    latlong: Latlong,
+    level: int,
+    memory_cache: SurplusMemoryCache,
+    cache: SurplusPersistentCache | None,
+    *,
+    quantise: bool = False,
+) -> dict[str, Any] | None:
+    """
+    (internal function) answers a lower zoom level reversing request from a cached
+    level 18 reversing result of the same coordinate (or cell, if quantising), returning
+    None if there is none
+    """
+
+    if level >= OFFLINE_REVERSER_DETAIL_LEVEL:
+        return None
+
+    cache_key = _reverser_cache_key(_quantise_latlong(latlong, 18) if quantise else latlong, 18)
+    if (detailed := memory_cache.get(("reverser", cache_key))) is not None:
+        _note_cache("memory")
+
+    elif (cache is not None) and ((detailed := cache.get("reverser", cache_key)) is not None):
+        _note_cache("persistent")
+
+    else:
+        return None
+
+    return _address_at_level(detailed, level)
+
+
+@dataclass
+class SurplusDefaultGeocoding:
+    """
+    dataclass providing the default geocoding functionality for surplus, via
+    OpenStreetMap Nominatim
+
+    concurrent calls with the same arguments, e.g., from threads converting nearby
+    coordinates, share one request and its result or exception
+
+    attributes
+        user_agent: str = ""
+            pass in a custom user agent here, else it will be the default fingerprinted
+            user agent, see default_user_agent()
+        cache: SurplusPersistentCache | None = None
+            persistent cache to read from before, and write to after, calling the geocoding
+            service. results are only cached in memory for the lifetime of the object if
+            None
+        quantise_reverser: bool = False
+            whether to snap coordinates to the centre of their Plus Code cell before
+            reversing, so that every coordinate within a cell shares one cached address.
+            cell sizes follow the zoom level, see REVERSER_CELL_CODE_LENGTHS
+        rate_limiter: SurplusSharedRateLimiter | None = None
+            rate limiter shared with other processes that every request (including
+            retries) waits on. requests are only retried on errors if None
+        memory_cache: SurplusMemoryCache = SurplusMemoryCache()
+            bounded in-memory cache of converted results, read before the persistent cache.
+            reversed addresses are kept without their 'raw' geocoder response, so addresses
+            answered from it have no 'raw' key. copies made with dataclasses.replace() share it
+        nominatim_url: str = ""
+            base url of a Nominatim-compatible service to use instead of OpenStreetMap's,
+            e.g., 'http://127.0.0.1:8088' for src/tools/nominatim-standin.py
+
+    methods
+        def update_geocoding_functions(self) -> None: ...
+        def geocoder(self, place: str) -> Latlong: ...
+        def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]: ...
+        def cache_stats(self) -> SurplusCacheStats: ...
+
+    usage
+        geocoding = SurplusDefaultGeocoding(behaviour.user_agent)
+        geocoding.update_geocoding_functions()
+        ...
+        Behaviour(
+            ...,
+            geocoder=geocoding.geocoder,
+            reverser=geocoding.reverser
+        )
+    """
+
+    user_agent: str = ""
+    cache: SurplusPersistentCache | None = None
+    quantise_reverser: bool = False
+    rate_limiter: SurplusSharedRateLimiter | None = None
+    memory_cache: SurplusMemoryCache = field(default_factory=SurplusMemoryCache)
+    nominatim_url: str = ""
+    _ratelimited_raw_geocoder: Callable = lambda _: None  # noqa: E731
+    _ratelimited_raw_reverser: Callable = lambda _: None  # noqa: E731
+    _first_update: bool = False
+    _pending: dict[tuple[Any, ...], "Future[Any]"] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _pending_lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    def update_geocoding_functions(self) -> None:
+        """
+        re-initialise the geocoding functions with the current user agent, also generate
+        a new user agent if not set properly
+        """
+
+        from geopy.extra.rate_limiter import RateLimiter as _geopy_RateLimiter  # type: ignore  # noqa: PLC0415
+        from geopy.geocoders import Nominatim as _geopy_Nominatim  # type: ignore  # noqa: PLC0415
+
+        if (not isinstance(self.user_agent, str)) or (self.user_agent == ""):
+            self.user_agent: str = default_user_agent()
+
+        nominatim = _geopy_Nominatim(
+            user_agent=self.user_agent,
+            **_nominatim_location(self.nominatim_url),
+        )
+        geocode: Callable = _count_attempts(nominatim.geocode)
+        reverse: Callable = _count_attempts(nominatim.reverse)
+
+        if self.rate_limiter is not None:
+            geocode = self.rate_limiter.wrap(geocode)
+            reverse = self.rate_limiter.wrap(reverse)
+
+        self._ratelimited_raw_geocoder: Callable = _geopy_RateLimiter(
+            geocode,
+            max_retries=CONNECTION_MAX_RETRIES,
+            error_wait_seconds=CONNECTION_WAIT_SECONDS,
+        )
+
+        self._ratelimited_raw_reverser: Callable = _geopy_RateLimiter(
+            reverse,
+            max_retries=CONNECTION_MAX_RETRIES,
+            error_wait_seconds=CONNECTION_WAIT_SECONDS,
+        )
+
+        self._first_update = True
+
+    def _call(
+        self,
+        func: Callable[..., Any],
+        *args: Any,  # noqa: ANN401
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Any:  # noqa: ANN401
+        """
+        (internal method) calls a rate-limited raw function, making concurrent callers with
+        the same arguments wait for the one request and share its result or exception
+        """
+
+        from concurrent.futures import Future  # noqa: PLC0415
+
+        key = (func, args, tuple(sorted(kwargs.items())))
+
+        with self._pending_lock:
+            pending = self._pending.get(key)
+            if leading := (pending is None):
+                pending = self._pending[key] = Future()
+
+        _note_cache("miss" if leading else "in-flight")
+
+        if leading:
+            try:
+                pending.set_result(func(*args, **kwargs))
+
+            except BaseException as exc:  # noqa: BLE001
+                pending.set_exception(exc)
+
+            finally:
+                with self._pending_lock:
+                    del self._pending[key]
+
+        return pending.result()
+
+    def geocoder(self, place: str) -> Latlong:
+        """
+        default geocoder for surplus, uses OpenStreetMap Nominatim
+
+        see SurplusGeocoderProtocol for more information on surplus geocoder functions
+        """
+
+        cache_key = _geocoder_cache_key(place)
+        if (remembered := self.memory_cache.get(("geocoder", cache_key))) is not None:
+            _note_cache("memory")
+            return remembered
+
+        if (self.cache is not None) and (
+            (cached := self.cache.get("geocoder", cache_key)) is not None
+        ):
+            _note_cache("persistent")
+            latlong = _latlong_from_cached(cached)
+            self.memory_cache.set(("geocoder", cache_key), latlong)
+            return latlong
+
+        if self._first_update is False:
+            self.update_geocoding_functions()
+
+        latlong = _latlong_from_location(place, self._call(self._ratelimited_raw_geocoder, place))
+
+        self.memory_cache.set(("geocoder", cache_key), latlong)
+        if self.cache is not None:
+            self.cache.set(
+                "geocoder",
+                cache_key,
+                [latlong.latitude, latlong.longitude, latlong.bounding_box],
+            )
+
+        return latlong
+
+    def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]:
+        """
+        default reverser for surplus, uses OpenStreetMap Nominatim
+
+        arguments
+            latlong: Latlong
+            level: int = 0
+                level of detail for the returned address, 0-18 (country-building) inclusive
+
+        see SurplusReverserProtocol for more information on surplus reverser functions
+        """
+
+        point = latlong
+        if self.quantise_reverser:
+            latlong = _quantise_latlong(latlong, level)
+
+        cache_key = _reverser_cache_key(latlong, level)
+        if (remembered := self.memory_cache.get(("reverser", cache_key))) is not None:
+            _note_cache("memory")
+            return remembered.to_dict()
+
+        if (self.cache is not None) and (
+            (cached := self.cache.get("reverser", cache_key)) is not None
+        ):
+            _note_cache("persistent")
+            self.memory_cache.set(("reverser", cache_key), AddressRecord(cached, keep_raw=False))
+            return dict(cached)
+
+        # lower zoom levels can be answered by a street-level result of the same point
+        if (
+            street_level := _recall_street_level_address(
+                point, level, self.memory_cache, self.cache, quantise=self.quantise_reverser
+            )
+        ) is not None:
+            self.memory_cache.set(
+                ("reverser", cache_key), AddressRecord(street_level, keep_raw=False)
+            )
+            return street_level
+
+        if self._first_update is False:
+            self.update_geocoding_functions()
+
+        location_dict = _address_from_location(
+            latlong, self._call(self._ratelimited_raw_reverser, str(latlong), zoom=level)
+        )
+
+        self.memory_cache.set(("reverser", cache_key), AddressRecord(location_dict, keep_raw=False))
+        if self.cache is not None:
+            self.cache.set("reverser", cache_key, location_dict)
+
+        return dict(location_dict)
+
+    def cache_stats(self) -> SurplusCacheStats:
+        """method that returns the statistics of the in-memory cache"""
+        return self.memory_cache.stats()
+
+
+default_geocoding: Final[SurplusDefaultGeocoding] = SurplusDefaultGeocoding()
+
+
+@dataclass
+class SurplusDefaultAsyncGeocoding:
+    """
+    dataclass providing the default asynchronous geocoding functionality for
+    surplus_async(), via OpenStreetMap Nominatim and geopy's aiohttp adapter.
+    requires aiohttp to be installed
+
+    all calls through one object share one rate limiter (at most one request every
+    CONNECTION_MIN_DELAY_SECONDS) and one in-memory cache, and concurrent calls with the
+    same arguments share one request
+
+    attributes
+        user_agent: str = ""
+            pass in a custom user agent here, else it will be the default fingerprinted
+            user agent, see default_user_agent()
+        cache: SurplusPersistentCache | None = None
+            persistent cache to read from before, and write to after, calling the geocoding
+            service. results are only cached in memory for the lifetime of the object if
+            None
+        quantise_reverser: bool = False
+            whether to snap coordinates to the centre of their Plus Code cell before
+            reversing, see SurplusDefaultGeocoding
+        rate_limiter: SurplusSharedRateLimiter | None = None
+            rate limiter shared with other processes that every request (including
+            retries) also waits on
+        memory_cache: SurplusMemoryCache = SurplusMemoryCache()
+            bounded in-memory cache of converted results, read before the persistent cache.
+            reversed addresses are kept without their 'raw' geocoder response, so addresses
+            answered from it have no 'raw' key. copies made with dataclasses.replace() share it
+        nominatim_url: str = ""
+            base url of a Nominatim-compatible service to use instead of OpenStreetMap's,
+            e.g., 'http://127.0.0.1:8088' for src/tools/nominatim-standin.py
+
+    methods
+        def update_geocoding_functions(self) -> None: ...
+        async def geocoder(self, place: str) -> Latlong: ...
+        async def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]: ...
+        def cache_stats(self) -> SurplusCacheStats: ...
+        async def aclose(self) -> None: ...
+
+    usage
+        async with SurplusDefaultAsyncGeocoding(behaviour.user_agent) as geocoding:
+            behaviour = Behaviour(
+                ...,
+                async_geocoder=geocoding.geocoder,
+                async_reverser=geocoding.reverser,
+            )
+            results = await asyncio.gather(*(surplus_async(q, behaviour) for q in queries))
+    """
+
+    user_agent: str = ""
+    cache: SurplusPersistentCache | None = None
+    quantise_reverser: bool = False
+    rate_limiter: SurplusSharedRateLimiter | None = None
+    memory_cache: SurplusMemoryCache = field(default_factory=SurplusMemoryCache)
+    nominatim_url: str = ""
+    _nominatim: Any = None
+    _ratelimited_raw_geocoder: Callable[..., Awaitable[Any]] | None = None
+    _ratelimited_raw_reverser: Callable[..., Awaitable[Any]] | None = None
+    _first_update: bool = False
+    _pending: dict[tuple[Any, ...], Any] = field(default_factory=dict, init=False, repr=False)
+
+    def update_geocoding_functions(self) -> None:
+        """
+        re-initialise the geocoding functions with the current user agent, also generate
+        a new user agent if not set properly
+        """
+
+        from geopy.adapters import AioHTTPAdapter as _geopy_AioHTTPAdapter  # type: ignore  # noqa: PLC0415
+        from geopy.extra.rate_limiter import AsyncRateLimiter as _geopy_AsyncRateLimiter  # type: ignore  # noqa: PLC0415
+        from geopy.geocoders import Nominatim as _geopy_Nominatim  # type: ignore  # noqa: PLC0415
+
+        if (not isinstance(self.user_agent, str)) or (self.user_agent == ""):
+            self.user_agent: str = default_user_agent()
+
+        self._nominatim = _geopy_Nominatim(
+            user_agent=self.user_agent,
+            adapter_factory=_geopy_AioHTTPAdapter,
+            **_nominatim_location(self.nominatim_url),
+        )
+
+        geocode: Callable[..., Awaitable[Any]] = _count_attempts(self._nominatim.geocode)
+        reverse: Callable[..., Awaitable[Any]] = _count_attempts(self._nominatim.reverse)
+
+        if self.rate_limiter is not None:
+            geocode = self.rate_limiter.wrap_async(geocode)
+            reverse = self.rate_limiter.wrap_async(reverse)
+
+        self._ratelimited_raw_geocoder = _geopy_AsyncRateLimiter(
+            geocode,
+            min_delay_seconds=CONNECTION_MIN_DELAY_SECONDS,
+            max_retries=CONNECTION_MAX_RETRIES,
+            error_wait_seconds=CONNECTION_WAIT_SECONDS,
+        )
+
+        self._ratelimited_raw_reverser = _geopy_AsyncRateLimiter(
+            reverse,
+            min_delay_seconds=CONNECTION_MIN_DELAY_SECONDS,
+            max_retries=CONNECTION_MAX_RETRIES,
+            error_wait_seconds=CONNECTION_WAIT_SECONDS,
+        )
+
+        self._first_update = True
+
+    async def _call(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        *args: Any,  # noqa: ANN401
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Any:  # noqa: ANN401
+        """
+        (internal method) awaits a rate-limited raw function, sharing the request with
+        concurrent callers
+        """
+
+        from asyncio import ensure_future, shield  # noqa: PLC0415
+
+        key = (func, args, tuple(sorted(kwargs.items())))
+
+        _note_cache("in-flight" if (key in self._pending) else "miss")
+
+        if (pending := self._pending.get(key)) is None:
+            pending = self._pending[key] = ensure_future(func(*args, **kwargs))
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        # shielded so that a cancelled caller does not cancel the request for the others
+        return await shield(pending)
+
+    async def geocoder(self, place: str) -> Latlong:
+        """
+        default asynchronous geocoder for surplus, uses OpenStreetMap Nominatim
+
+        see SurplusGeocoderProtocol for more information on surplus geocoder functions
+        """
+
+        cache_key = _geocoder_cache_key(place)
+        if (remembered := self.memory_cache.get(("geocoder", cache_key))) is not None:
+            _note_cache("memory")
+            return remembered
+
+        if (self.cache is not None) and (
+            (cached := self.cache.get("geocoder", cache_key)) is not None
+        ):
+            _note_cache("persistent")
+            latlong = _latlong_from_cached(cached)
+            self.memory_cache.set(("geocoder", cache_key), latlong)
+            return latlong
+
+        if (self._first_update is False) or (self._ratelimited_raw_geocoder is None):
+            self.update_geocoding_functions()
+            assert self._ratelimited_raw_geocoder is not None  # noqa: S101
+
+        latlong = _latlong_from_location(
+            place, await self._call(self._ratelimited_raw_geocoder, place)
+        )
+
+        self.memory_cache.set(("geocoder", cache_key), latlong)
+        if self.cache is not None:
+            self.cache.set(
+                "geocoder",
+                cache_key,
+                [latlong.latitude, latlong.longitude, latlong.bounding_box],
+            )
+
+        return latlong
+
+    async def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]:
+        """
+        default asynchronous reverser for surplus, uses OpenStreetMap Nominatim
+
+        arguments
+            latlong: Latlong
+            level: int = 18
+                level of detail for the returned address, 0-18 (country-building) inclusive
+
+        see SurplusReverserProtocol for more information on surplus reverser functions
+        """
+
+        point = latlong
+        if self.quantise_reverser:
+            latlong = _quantise_latlong(latlong, level)
+
+        cache_key = _reverser_cache_key(latlong, level)
+        if (remembered := self.memory_cache.get(("reverser", cache_key))) is not None:
+            _note_cache("memory")
+            return remembered.to_dict()
+
+        if (self.cache is not None) and (
+            (cached := self.cache.get("reverser", cache_key)) is not None
+        ):
+            _note_cache("persistent")
+            self.memory_cache.set(("reverser", cache_key), AddressRecord(cached, keep_raw=False))
+            return dict(cached)
+
+        # lower zoom levels can be answered by a street-level result of the same point
+        if (
+            street_level := _recall_street_level_address(
+                point, level, self.memory_cache, self.cache, quantise=self.quantise_reverser
+            )
+        ) is not None:
+            self.memory_cache.set(
+                ("reverser", cache_key), AddressRecord(street_level, keep_raw=False)
+            )
+            return street_level
+
+        if (self._first_update is False) or (self._ratelimited_raw_reverser is None):
+            self.update_geocoding_functions()
+            assert self._ratelimited_raw_reverser is not None  # noqa: S101
+
+        location_dict = _address_from_location(
+            latlong,
+            await self._call(self._ratelimited_raw_reverser, str(latlong), zoom=level),
+        )
+
+        self.memory_cache.set(("reverser", cache_key), AddressRecord(location_dict, keep_raw=False))
+        if self.cache is not None:
+            self.cache.set("reverser", cache_key, location_dict)
+
+        return dict(location_dict)
+
+    def cache_stats(self) -> SurplusCacheStats:
+        """method that returns the statistics of the in-memory cache"""
+        return self.memory_cache.stats()
+
+    async def aclose(self) -> None:
+        """method that closes the underlying http session, reopened on the next use"""
+
+        if self._nominatim is not None:
+            await self._nominatim.__aexit__(None, None, None)
+            self._nominatim = None
+            self._first_update = False
+
+    async def __aenter__(self) -> Self:
+        """method that returns the object itself for `async with` usage"""
+        return self
+
+    async def __aexit__(self, *_: object) -> None:
+        """method that closes the underlying http session, see aclose()"""
+        await self.aclose()
+
+
+default_async_geocoding: Final[SurplusDefaultAsyncGeocoding] = SurplusDefaultAsyncGeocoding()
+
+
+# offline data pack layout, all little-endian:
+#   header     magic, version, cell size in degrees, and the number of cells, records,
+#              key-value pairs and strings
+#   cells      sorted grid cell ids (q), first record index (I), record count (I)
+#   records    latitude and longitude in 1e-7 degrees (i, i), first pair index (I),
+#              pair count (I), grouped by cell
+#   pairs      key string index (I), value string index (I)
+#   strings    n+1 byte offsets (I) into a utf-8 blob, each string stored once
+# every column is a separate 8-byte-aligned array, so that it can be binary searched or
+# indexed in place through a memoryview of the memory-mapped file
+OFFLINE_PACK_MAGIC: Final[bytes] = b"SPLSPACK"
+OFFLINE_PACK_VERSION: Final[int] = 1
+_OFFLINE_PACK_HEADER: Final[Struct] = Struct("<8sIdIIII")
+_OFFLINE_PACK_COLUMNS: Final[tuple[tuple[Literal["q", "I", "i", "B"], str], ...]] = (
+    # (format, count attribute)
+    ("q", "cells"),  # cell ids
+    ("I", "cells"),  # cell first record
+    ("I", "cells"),  # cell record count
+    ("i", "records"),  # record latitude
+    ("i", "records"),  # record longitude
+    ("I", "records"),  # record first pair
+    ("I", "records"),  # record pair count
+    ("I", "pairs"),  # pair key
+    ("I", "pairs"),  # pair value
+    ("I", "string_offsets"),  # string offsets
+    ("B", "string_bytes"),  # string blob
+)
+
+# address keys that are only returned by the offline reverser at street-level zoom levels
+# (17 and above), mirroring how Nominatim drops finer detail at lower zoom levels. also
+# dropped when answering lower zoom levels from cached street-level results
+OFFLINE_REVERSER_DETAIL_KEYS: frozenset[str] = frozenset(
+    SHAREABLE_TEXT_LINE_0_KEYS["default"]
+    + SHAREABLE_TEXT_LINE_1_KEYS["default"]
+    + SHAREABLE_TEXT_LINE_2_KEYS["default"]
+    + SHAREABLE_TEXT_LINE_3_KEYS["default"]
+)
+OFFLINE_REVERSER_DETAIL_LEVEL: int = 17
+
+
+def _offline_pack_cell(latitude: float, longitude: float, cell_size: float) -> tuple[int, int]:
+    """(internal function) returns the (row, column) grid cell of a coordinate"""
+    return floor((latitude + 90) / cell_size), floor((longitude + 180) / cell_size)
+
+
+def build_offline_pack(
+    features: Iterable[dict[str, Any]],
+    path: Path,
+    cell_size: float = 0.01,
+) -> int:
+    """
+    function that builds an offline data pack for SurplusOfflineReverser
+
+    arguments
+        features: Iterable[dict[str, Any]]
+            location dictionaries like those returned by reverser functions, e.g., points of
+            interest, buildings, roads or administrative areas. each must have `latitude`
+            and `longitude` keys, other keys are stored as strings except for `raw` and
+            empty values. include an `ISO3166-2-*` key for per-country text generation
+        path: Path
+            where to write the data pack
+        cell_size: float = 0.01
+            grid cell size in degrees. lookups search outwards from the cell of the query,
+            so smaller cells suit denser data
+
+    returns int
+        number of features written
+    """
+
+    strings: dict[str, int] = {}
+    records: list[tuple[int, int, int, list[tuple[int, int]]]] = []
+    n_cols = ceil(360 / cell_size)
+
+    def intern(string: str) -> int:
+        if (index := strings.get(string)) is None:
+            index = strings[string] = len(strings)
+        return index
+
+    for feature in features:
+        latitude = float(feature["latitude"])
+        longitude = float(feature["longitude"])
+        row, col = _offline_pack_cell(latitude, longitude, cell_size)
+        pairs = [
+            (intern(str(key)), intern(str(value)))
+            for key, value in feature.items()
+            if (key not in ("latitude", "longitude", "raw")) and (str(value) != "")
+        ]
+        records.append((row * n_cols + col, round(latitude * 1e7), round(longitude * 1e7), pairs))
+
+    records.sort(key=lambda record: record[0])
+
+    columns: list[array] = [array(fmt) for fmt, _ in _OFFLINE_PACK_COLUMNS]
+    (
+        cell_ids,
+        cell_firsts,
+        cell_counts,
+        record_lats,
+        record_lons,
+        record_firsts,
+        record_counts,
+        pair_keys,
+        pair_values,
+        string_offsets,
+        string_bytes,
+    ) = columns
+
+    for index, (cell_id, latitude_e7, longitude_e7, pairs) in enumerate(records):
+        if (len(cell_ids) == 0) or (cell_ids[-1] != cell_id):
+            cell_ids.append(cell_id)
+            cell_firsts.append(index)
+            cell_counts.append(0)
+        cell_counts[-1] += 1
+
+        record_lats.append(latitude_e7)
+        record_lons.append(longitude_e7)
+        record_firsts.append(len(pair_keys))
+        record_counts.append(len(pairs))
+        for key, value in pairs:
+            pair_keys.append(key)
+            pair_values.append(value)
+
+    string_offsets.append(0)
+    for string in strings:  # dicts preserve insertion order, i.e., string index order
+        string_bytes.frombytes(string.encode("utf-8"))
+        string_offsets.append(len(string_bytes))
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as file:
+        file.write(
+            _OFFLINE_PACK_HEADER.pack(
+                OFFLINE_PACK_MAGIC,
+                OFFLINE_PACK_VERSION,
+                cell_size,
+                len(cell_ids),
+                len(records),
+                len(pair_keys),
+                len(strings),
+            )
+        )
+        for column in columns:
+            if byteorder != "little":
+                column.byteswap()
+            file.write(b"\0" * (-file.tell() % 8))
+            file.write(column.tobytes())
+
+    return len(records)
+
+
+@dataclass
+class SurplusOfflineReverser:
+    """
+    dataclass providing an offline reverser from a data pack built with
+    build_offline_pack(), for use without network connectivity
+
+    the data pack is memory-mapped and searched in place, so opening it does not read it
+    into memory. lookups return the nearest feature within `max_distance` degrees
+
+    attributes
+        path: Path
+            path to the data pack
+        max_distance: float = 0.05
+            maximum distance in degrees to search for a feature (about 5.5km)
+
+    methods
+        def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]: ...
+        def close(self) -> None: ...
+
+    usage
+        offline = SurplusOfflineReverser(Path("singapore.pack"))
+        Behaviour(
+            ...,
+            reverser=offline.reverser,
+        )
+    """
+
+    path: Path
+    max_distance: float = 0.05
+    _mmap: mmap | None = field(default=None, repr=False)
+    _columns: tuple[memoryview, ...] = field(default=(), repr=False)
+    _cell_size: float = 0.0
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def _open(self) -> tuple[memoryview, ...]:
+        """(internal method) lazily memory-maps the data pack and returns its columns"""
+
+        with self._lock:
+            if self._mmap is not None:
+                return self._columns
+
+            with self.path.open("rb") as file:
+                mapped = mmap(file.fileno(), 0, access=ACCESS_READ)
+
+            magic, version, cell_size, n_cells, n_records, n_pairs, n_strings = (
+                _OFFLINE_PACK_HEADER.unpack_from(mapped)
+            )
+            if (magic != OFFLINE_PACK_MAGIC) or (version != OFFLINE_PACK_VERSION):
+                mapped.close()
+                msg = f"'{self.path}' is not a version {OFFLINE_PACK_VERSION} surplus data pack"
+                raise ValueError(msg)
+
+            if byteorder != "little":
+                mapped.close()
+                msg = "surplus data packs can only be memory-mapped on little-endian systems"
+                raise NotImplementedError(msg)
+
+            counts = {
+                "cells": n_cells,
+                "records": n_records,
+                "pairs": n_pairs,
+                "string_offsets": n_strings + 1,
+            }
+            view = memoryview(mapped)
+            offset = _OFFLINE_PACK_HEADER.size
+            columns: list[memoryview] = []
+
+            for fmt, count_name in _OFFLINE_PACK_COLUMNS:
+                offset += -offset % 8
+                size = (
+                    (len(mapped) - offset)
+                    if (count_name == "string_bytes")
+                    else (counts[count_name] * calcsize(fmt))
+                )
+                columns.append(view[offset : offset + size].cast(fmt))
+                offset += size
+
+            self._mmap = mapped
+            self._columns = tuple(columns)
+            self._cell_size = cell_size
+            return self._columns
+
+    def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]:
+        """
+        offline reverser for surplus, returns the nearest feature in the data pack
+
+        arguments
+            latlong: Latlong
+            level: int = 18
+                level of detail for the returned address, 0-18 (country-building) inclusive.
+                below OFFLINE_REVERSER_DETAIL_LEVEL, OFFLINE_REVERSER_DETAIL_KEYS are omitted
+
+        see SurplusReverserProtocol for more information on surplus reverser functions
+        """
+
+        (
+            cell_ids,
+            cell_firsts,
+            cell_counts,
+            record_lats,
+            record_lons,
+            record_firsts,
+            record_counts,
+            pair_keys,
+            pair_values,
+            string_offsets,
+            string_bytes,
+        ) = self._open()
+
+        cell_size = self._cell_size
+        n_rows, n_cols = ceil(180 / cell_size), ceil(360 / cell_size)
+        row, col = _offline_pack_cell(latlong.latitude, latlong.longitude, cell_size)
+        latitude_e7, longitude_e7 = latlong.latitude * 1e7, latlong.longitude * 1e7
+        longitude_scale = cos(radians(latlong.latitude))
+
+        best_record: int = -1
+        best_distance: float = (self.max_distance * 1e7) ** 2
+
+        # search rings of cells outwards, stopping once no closer feature can exist
+        for ring in range(ceil(self.max_distance / cell_size) + 1):
+            ring_distance = max(0, ring - 1) * cell_size * 1e7 * longitude_scale
+            if (best_record != -1) and (ring_distance**2 >= best_distance):
+                break
+
+            for ring_row in range(row - ring, row + ring + 1):
+                if not (0 <= ring_row < n_rows):
+                    continue
+
+                on_edge = abs(ring_row - row) == ring
+                for ring_col in (
+                    range(col - ring, col + ring + 1) if on_edge else (col - ring, col + ring)
+                ):
+                    cell_id = ring_row * n_cols + (ring_col % n_cols)
+                    cell = bisect_left(cell_ids, cell_id)
+                    if (cell == len(cell_ids)) or (cell_ids[cell] != cell_id):
+                        continue
+
+                    first = cell_firsts[cell]
+                    for record in range(first, first + cell_counts[cell]):
+                        delta_lon = abs(record_lons[record] - longitude_e7)
+                        delta_lon = min(delta_lon, 3_600_000_000 - delta_lon) * longitude_scale
+                        distance = (record_lats[record] - latitude_e7) ** 2 + delta_lon**2
+                        if distance < best_distance:
+                            best_record, best_distance = record, distance
+
+        if best_record == -1:
+            msg = f"could not reverse '{latlong!s}' offline, no feature nearby"
+            raise NoSuitableLocationError(msg)
+
+        def string(index: int) -> str:
+            return str(
+                string_bytes[string_offsets[index] : string_offsets[index + 1]],
+                "utf-8",
+            )
+
+        location_dict: dict[str, Any] = {}
+        first = record_firsts[best_record]
+        for pair in range(first, first + record_counts[best_record]):
+            key = string(pair_keys[pair])
+            if (level < OFFLINE_REVERSER_DETAIL_LEVEL) and (key in OFFLINE_REVERSER_DETAIL_KEYS):
+                continue
+            location_dict[key] = string(pair_values[pair])
+
+        location_dict["latitude"] = record_lats[best_record] / 1e7
+        location_dict["longitude"] = record_lons[best_record] / 1e7
+
+        return location_dict
+
+    def close(self) -> None:
+        """method that unmaps the data pack, remapped on the next use"""
+
+        with self._lock:
+            if self._mmap is not None:
+                for column in self._columns:
+                    column.release()
+                self._columns = ()
+                self._mmap.close()
+                self._mmap = None
+
+
+# cassettes are newline-delimited json arrays, one per recorded request:
+#   ["g", place, [latitude, longitude, bounding box] | null, [error name, message] | null]
+#   ["r", [latitude, longitude, level], location dictionary | null, [error name, message] | null]
+# answers and errors are mutually exclusive. errors are surplus exception class names,
+# replayed as SurplusError if not one of its subclasses
+_CASSETTE_ERRORS: Final[dict[str, type[SurplusError]]] = {
+    error.__name__: error for error in SurplusError.__subclasses__()
+}
+
+
+def _read_cassette(path: Path) -> Iterator[list[Any]]:
+    """(internal function) yields the recorded requests of a cassette, skipping bad lines"""
+
+    with path.open(encoding="utf-8") as file:
+        for line in file:
+            try:
+                entry = json_loads(line)
+
+            except JSONDecodeError:
+                continue  # e.g., a line cut short by an interrupted recording
+
+            if isinstance(entry, list) and (len(entry) == 4) and (entry[0] in ("g", "r")):  # noqa: PLR2004
+                yield entry
+
+
+def _cassette_key(entry: list[Any]) -> str:
+    """(internal function) returns the geocoding cache key of a recorded request"""
+
+    if entry[0] == "g":
+        return _geocoder_cache_key(entry[1])
+
+    latitude, longitude, level = entry[1]
+    return _reverser_cache_key(Latlong(latitude=latitude, longitude=longitude), level)
+
+
+def _replay_cassette_entry(entry: list[Any]) -> Any:  # noqa: ANN401
+    """(internal function) returns a recorded answer, or raises a recorded error"""
+
+    if entry[3] is not None:
+        name, message = entry[3]
+        raise _CASSETTE_ERRORS.get(name, SurplusError)(message)
+
+    if entry[0] == "g":
+        return _latlong_from_cached(entry[2])
+
+    return entry[2].to_dict() if isinstance(entry[2], AddressRecord) else dict(entry[2])
+
+
+@dataclass
+class SurplusCassetteRecorder:
+    """
+    dataclass providing geocoding functions that pass requests through to other geocoding
+    functions, appending every new request and its answer to a cassette file that
+    SurplusCassetteReplayer can replay them from without the network
+
+    requests already in the cassette are not recorded again. requests that fail with a
+    SurplusError, e.g., NoSuitableLocationError, are recorded and replayed as failing
+    with it, other errors such as connection errors are not recorded
+
+    attributes
+        path: Path
+            cassette file to append to
+        source_geocoder: SurplusGeocoderProtocol = default_geocoding.geocoder
+            geocoder to record
+        source_reverser: SurplusReverserProtocol = default_geocoding.reverser
+            reverser to record
+        keep_raw: bool = False
+            whether to record the 'raw' key of location dictionaries, the full geocoding
+            service response, which is usually most of a cassette's size
+
+    methods
+        def geocoder(self, place: str) -> Latlong: ...
+        def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]: ...
+
+    usage
+        recorder = SurplusCassetteRecorder(Path("requests.cassette"))
+        Behaviour(
+            ...,
+            geocoder=recorder.geocoder,
+            reverser=recorder.reverser,
+        )
+    """
+
+    path: Path
+    source_geocoder: SurplusGeocoderProtocol = default_geocoding.geocoder
+    source_reverser: SurplusReverserProtocol = default_geocoding.reverser
+    keep_raw: bool = False
+    _recorded: set[str] | None = field(default=None, repr=False)
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def _record(self, entry: list[Any]) -> None:
+        """(internal method) appends a request to the cassette, unless already recorded"""
+
+        key = _cassette_key(entry)
+
+        with self._lock:
+            if self._recorded is None:
+                self._recorded = (
+                    {_cassette_key(recorded) for recorded in _read_cassette(self.path)}
+                    if self.path.exists()
+                    else set()
+                )
+
+            if key in self._recorded:
+                return
+
+            with self.path.open("a", encoding="utf-8") as file:
+                file.write(json_dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+            self._recorded.add(key)
+
+    def geocoder(self, place: str) -> Latlong:
+        """
+        geocoder that records the source geocoder's answers
+
+        see SurplusGeocoderProtocol for more information on surplus geocoder functions
+        """
+
+        try:
+            latlong = self.source_geocoder(place)
+
+        except SurplusError as exc:
+            self._record(["g", place, None, [type(exc).__name__, str(exc)]])
+            raise
+
+        self._record(
+            ["g", place, [latlong.latitude, latlong.longitude, latlong.bounding_box], None]
+        )
+        return latlong
+
+    def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]:
+        """
+        reverser that records the source reverser's answers
+
+        see SurplusReverserProtocol for more information on surplus reverser functions
+        """
+
+        request = [latlong.latitude, latlong.longitude, level]
+
+        try:
+            location = self.source_reverser(latlong, level=level)
+
+        except SurplusError as exc:
+            self._record(["r", request, None, [type(exc).__name__, str(exc)]])
+            raise
+
+        self._record(
+            [
+                "r",
+                request,
+                {key: value for key, value in location.items() if self.keep_raw or (key != "raw")},
+                None,
+            ]
+        )
+        return location
+
+
+@dataclass
+class SurplusCassetteReplayer:
+    """
+    dataclass providing geocoding functions that answer from a cassette recorded with
+    SurplusCassetteRecorder, without the network. requests are looked up by the same
+    normalised keys as SurplusPersistentCache uses, and requests missing from the
+    cassette fail with CassetteMissError. reversing requests below level 18 can also be
+    answered from a level 18 request of the same coordinate
+
+    attributes
+        path: Path
+            cassette file, read once when the replayer is created
+
+    methods
+        def geocoder(self, place: str) -> Latlong: ...
+        def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]: ...
+        def queries(self) -> list[str]: ...
+
+    usage
+        replayer = SurplusCassetteReplayer(Path("requests.cassette"))
+        Behaviour(
+            ...,
+            geocoder=replayer.geocoder,
+            reverser=replayer.reverser,
+        )
+    """
+
+    path: Path
+    _entries: dict[str, list[Any]] = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        """method that reads the cassette, keeping location dictionaries as AddressRecords"""
+
+        for entry in _read_cassette(self.path):
+            if (entry[0] == "r") and isinstance(entry[2], dict):
+                entry[2] = AddressRecord(entry[2])
+            self._entries[_cassette_key(entry)] = entry
+
+    def __len__(self) -> int:
+        """method that returns the number of requests in the cassette"""
+        return len(self._entries)
+
+    def geocoder(self, place: str) -> Latlong:
+        """
+        geocoder that answers from the cassette
+
+        see SurplusGeocoderProtocol for more information on surplus geocoder functions
+        """
+
+        if (entry := self._entries.get(_geocoder_cache_key(place))) is None:
+            msg = f"'{place}' was not geocoded in cassette '{self.path}'"
+            raise CassetteMissError(msg)
+
+        return _replay_cassette_entry(entry)
+
+    def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]:
+        """
+        reverser that answers from the cassette
+
+        see SurplusReverserProtocol for more information on surplus reverser functions
+        """
+
+        if (entry := self._entries.get(_reverser_cache_key(latlong, level))) is not None:
+            return _replay_cassette_entry(entry)
+
+        # lower zoom levels can be answered by a street-level result of the same point
+        if (
+            (level < OFFLINE_REVERSER_DETAIL_LEVEL)
+            and ((entry := self._entries.get(_reverser_cache_key(latlong, 18))) is not None)
+            and (entry[2] is not None)
+        ):
+            return _address_at_level(_replay_cassette_entry(entry), level)
+
+        msg = f"'{latlong}' was not reversed at level {level} in cassette '{self.path}'"
+        raise CassetteMissError(msg)
+
+    def queries(self) -> list[str]:
+        """
+        method that returns a query string for every place geocoded, and every coordinate
+        reversed at level 18, in the cassette, in recorded order, e.g., for benchmarking
+        """
+
+        return [
+            entry[1] if (entry[0] == "g") else str(Latlong(entry[1][0], entry[1][1]))
+            for entry in self._entries.values()
+            if (entry[0] == "g") or (entry[1][2] == 18)  # noqa: PLR2004
+        ]
+
+
+class Behaviour(NamedTuple):
+    """
+    typing.NamedTuple representing how surplus operations should behave
+
+    arguments
+        query: str | list[str] = ""
+            original user-passed query string or a list of strings from splitting
+            user-passed query string by spaces
+        geocoder: SurplusGeocoderProtocol = default_geocoding.geocoder
+            name string to location function, see SurplusGeocoderProtocol docstring for
+            for more information
+        reverser: SurplusReverserProtocol = default_geocoding.reverser
+            latlong to address information dict function, see SurplusReverserProtocol
+            docstring for more information
+        stderr: TextIO = sys.stderr
+            TextIO-like object representing a writeable file. defaults to sys.stderr
+        stdout: TextIO = sys.stdout
+            TextIO-like object representing a writeable file. defaults to sys.stdout
+        debug: bool = False
+            whether to print debug information to stderr
+        version_header: bool = False
+            whether to print version information and exit
+        convert_to_type: ConversionResultTypeEnum | frozenset[ConversionResultTypeEnum] = (
+            ConversionResultTypeEnum.SHAREABLE_TEXT
+        )
+            what type to convert query to. if a set of types, the query is resolved once
+            and reversed once per zoom level needed, and the result is a json object of
+            every type's value (e.g., 'pluscode') to its output, in enum order
+        using_termux_location: bool = False
+            treats query as a termux-location output json string, and parses it accordingly
+        show_user_agent: bool = False
+            whether to print the fingerprinted user agent and exit
+        async_geocoder: SurplusAsyncGeocoderProtocol = default_async_geocoding.geocoder
+            asynchronous name string to location function used by surplus_async(), see
+            SurplusAsyncGeocoderProtocol docstring for more information
+        async_reverser: SurplusAsyncReverserProtocol = default_async_geocoding.reverser
+            asynchronous latlong to address information dict function used by
+            surplus_async(), see SurplusAsyncReverserProtocol docstring for more information
+        locality_table: SurplusLocalityTable | None = None
+            table of locality centres and bounding boxes to read before geocoding localities
+            for local codes, and to store geocoded localities in
+        timings_hook: Callable[[SurplusTimings], None] | None = None
+            function called with the stage timings, cache use and retries of every
+            conversion run by surplus(), surplus_async(), surplus_batch() or cli(), see
+            SurplusTimings
+    """
+
+    query: str | list[str] = ""
+    geocoder: SurplusGeocoderProtocol = default_geocoding.geocoder
+    reverser: SurplusReverserProtocol = default_geocoding.reverser
+    stderr: TextIO = stderr
+    stdout: TextIO = stdout
+    debug: bool = False
+    version_header: bool = False
+    convert_to_type: ConversionResultTypeEnum | frozenset[ConversionResultTypeEnum] = (
+        ConversionResultTypeEnum.SHAREABLE_TEXT
+    )
+    using_termux_location: bool = False
+    show_user_agent: bool = False
+    async_geocoder: SurplusAsyncGeocoderProtocol = default_async_geocoding.geocoder
+    async_reverser: SurplusAsyncReverserProtocol = default_async_geocoding.reverser
+    locality_table: SurplusLocalityTable | None = None
+    timings_hook: Callable[[SurplusTimings], None] | None = None
+
+
+class _CliOptions(NamedTuple):
+    """
+    (internal use) command-line options of cli() for its modes and servers, returned by
+    handle_args() alongside the Behaviour used for conversions
+
+    arguments
+        batch: bool = False
+            whether to read queries line-by-line from stdin and write one result per line
+        batch_format: BatchOutputFormatEnum = BatchOutputFormatEnum.NDJSON
+            how batch mode results should be written, see BatchOutputFormatEnum
+        workers: int = 1
+            processes to convert batch mode queries in, 0 for one per cpu. see
+            surplus_batch_parallel()
+        batch_ordered: bool = True
+            whether batch mode results from worker processes are written in input order,
+            or as they are converted
+        csv: bool = False
+            whether to read a csv file from stdin and write it to stdout with Plus Code or
+            latlong columns appended, see encode_many() and decode_many()
+        csv_columns: tuple[str, ...] = ()
+            names of the csv columns to convert from, defaults to ('latitude', 'longitude')
+            when converting to Plus Codes and ('pluscode',) when converting to latlongs
+        serve: bool = False
+            whether to serve conversion requests on a unix socket until interrupted, see
+            serve_socket()
+        socket_path: Path | None = None
+            unix socket of a conversion daemon to convert through, falling back to
+            converting in-process if no daemon is serving on it. also where to serve if
+            serve is True, defaulting to default_socket_path() if None
+        serve_http: tuple[str, int] | None = None
+            host and port to serve a json conversion api over http on until interrupted, see
+            serve_http()
+        http_concurrency: int = HTTP_MAX_CONCURRENCY
+            conversions the http server runs at once across all clients
+        http_client_concurrency: int = HTTP_MAX_CLIENT_CONCURRENCY
+            conversions the http server runs at once for one client
+        cache_stats: bool = False
+            whether to write the in-memory geocoding cache statistics to stderr as one json
+            line when done, see SurplusDefaultGeocoding.cache_stats()
+    """
+
+    batch: bool = False
+    batch_format: BatchOutputFormatEnum = BatchOutputFormatEnum.NDJSON
+    workers: int = 1
+    batch_ordered: bool = True
+    csv: bool = False
+    csv_columns: tuple[str, ...] = ()
+    serve: bool = False
+    socket_path: Path | None = None
+    serve_http: tuple[str, int] | None = None
+    http_concurrency: int = HTTP_MAX_CONCURRENCY
+    http_client_concurrency: int = HTTP_MAX_CLIENT_CONCURRENCY
+    cache_stats: bool = False
+
+
+# functions
+
+
+# conversion timings: surplus() sets a recorder for the conversion it runs, that the
+# conversion runners, and the default geocoding classes, note what they did in. context
+# variables are per-thread and per-task, so concurrent conversions do not mix
+
+_timings_recorder: ContextVar["_TimingsRecorder | None"] = ContextVar(
+    "_timings_recorder", default=None
+)
+
+
+@dataclass
+class _TimingsRecorder:
+    """(internal use) collects the timings of one conversion, see SurplusTimings"""
+
+    stages: dict[str, float] = field(
+        default_factory=lambda: dict.fromkeys(("parse", "geocode", "reverse", "generate_text"), 0.0)
+    )
+    calls: list[SurplusCallTiming] = field(default_factory=list)
+
+    # noted by the default geocoding classes during the current call
+    cache: str | None = None
+    attempts: int = 0
+
+    def timings(self, query: str, total_seconds: float) -> SurplusTimings:
+        """method that returns the recorded timings"""
+        return SurplusTimings(
+            query=query,
+            parse_seconds=self.stages["parse"],
+            geocode_seconds=self.stages["geocode"],
+            reverse_seconds=self.stages["reverse"],
+            generate_text_seconds=self.stages["generate_text"],
+            total_seconds=total_seconds,
+            calls=tuple(self.calls),
+        )
+
+
+def _note_cache(source: str) -> None:
+    """(internal function) notes where the current geocoding call's answer came from"""
+    if (recorder := _timings_recorder.get()) is not None:
+        recorder.cache = source
+
+
+def _count_attempts(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    (internal function) wraps a raw geocoding service function to note each call as a
+    request attempt, works for both functions and coroutine functions
+    """
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+        if (recorder := _timings_recorder.get()) is not None:
+            recorder.attempts += 1
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def _timed_stage(stage: str) -> Iterator[None]:
+    """(internal function) adds the time spent in the block to a stage, if recording"""
+
+    if (recorder := _timings_recorder.get()) is None:
+        yield
+        return
+
+    start = perf_counter()
+    try:
+        yield
+
+    finally:
+        recorder.stages[stage] += perf_counter() - start
+
+
+@contextmanager
+def _recording_timings(query: object, behaviour: Behaviour) -> Iterator[None]:
+    """
+    (internal function) records the timings of the conversion run in the block and passes
+    them to behaviour.timings_hook, if set and not already recording
+    """
+
+    if (behaviour.timings_hook is None) or (_timings_recorder.get() is not None):
+        yield
+        return
+
+    recorder = _TimingsRecorder()
+    token = _timings_recorder.set(recorder)
+    start = perf_counter()
+    try:
+        yield
+
+    finally:
+        total_seconds = perf_counter() - start
+        _timings_recorder.reset(token)
+        behaviour.timings_hook(recorder.timings(str(query), total_seconds))
+
+
+def _write_timings(timings: SurplusTimings) -> None:
+    """(internal function) timings hook for --timings, writes one json line to stderr"""
+    stderr.write(timings.to_json() + "\n")
+
+
+# query classification: queries are split into words once, plus codes are only looked for
+# in queries with a separator, and coordinates are recognised by pattern before falling
+# back to float(), whose exceptions are comparatively expensive
+_DECIMAL_PATTERN: Final[Pattern[str]] = re_compile(r"(?a)[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_FLOAT_CANDIDATE_PATTERN: Final[Pattern[str]] = re_compile(r"(?i)\d|nan|inf")
+
+
+def _parse_float(text: str) -> float | None:
+    """(internal function) returns float(text), or None if text is not a float"""
+
+    if _DECIMAL_PATTERN.fullmatch(text) is not None:
+        return float(text)
+
+    # without a digit, 'nan' or 'inf', float() cannot succeed
+    if _FLOAT_CANDIDATE_PATTERN.search(text) is None:
+        return None
+
+    try:
+        return float(text)
+
+    except ValueError:
+        return None
+
+
+def _parse_query(
+    query: str | list[str],
+    *,
+    using_termux_location: bool = False,
+    debug: TextIO | None = None,
+) -> Result[Query]:
+    """
+    (internal function) classifies a query string, or a list of strings from splitting one
+    by spaces, into a query object. behind parse_query() and parse_queries(), writing
+    debug messages to debug if given
+    """
+
+    # types to handle:
+    #
+    # plus codes
+    #   6PH58R3M+F8
+    # local codes
+    #   8RQQ+4Q Singapore                        (single-word-long locality suffix)
+    #   St Lucia, Queensland, Australia G227+XF  (multi-word-long locality prefix)
+    # latlong coords
+    #   1.3521,103.8198   (single-word-long with comma)
+    #   1.3521, 103.8198  (space-seperated with comma)
+    #   1.3521 103.8198   (space-seperated without comma)
+    # string queries
+    #   Ngee Ann Polytechnic, Singapore  (has a comma)
+    #   Toa Payoh North                  (no commas)
+
+    if debug is not None:
+        print(f"debug: parse_query: {query=}", file=debug)
+
+    # check if empty
+    if query in ([], ""):
+        return Result[Query](
+            LatlongQuery(EMPTY_LATLONG),
+            error=EmptyQueryError("empty query string passed"),
+        )
+
+    original_query: str = ""
+    split_query: list[str] = []
+
+    if isinstance(query, str):
+        original_query = query
+        split_query = query.split(" ")
+
+    else:
+        original_query = " ".join(query)
+        split_query = query
+
+    # try to find a plus/local code, the first word that is a valid Plus Code. if found,
+    # the rest of the query stripped of whitespace and commas is the locality
+    if _codec.SEPARATOR in original_query:
+        for _word in split_query:
+            word = _word.strip(",").strip()
+
+            if not _codec.is_valid(word):
+                continue
+
+            if _codec.is_full(word):
+                return Result[Query](PlusCodeQuery(word))
+
+            portion_locality = original_query.replace(word, "").strip().strip(",").strip()
+
+            # did find plus code, but not full-length. :(
+            if portion_locality == "":
+                return Result[Query](
+                    LatlongQuery(EMPTY_LATLONG),
+                    error=IncompletePlusCodeError(
+                        "_match_plus_code: Plus Code is not full-length (e.g., 6PH58QMF+FX)"
+                    ),
+                )
+
+            if debug is not None:
+                print(
+                    f"debug: _match_plus_code: portion_plus_code={word!r}, {portion_locality=}",
+                    file=debug,
+                )
+
+            return Result[Query](LocalCodeQuery(code=word, locality=portion_locality))
+
+    if debug is not None:
+        print(
+            f"debug: parse_query: {split_query=}\n",
+            f"debug: parse_query: {original_query=}",
             sep="",
+            file=debug,
+        )
+
+    # check if termux-location json
+    if using_termux_location:
+        try:
+            termux_location_json = json_loads(original_query)
+            if not isinstance(termux_location_json, dict):
+                msg = "parsed termux-location json is not a dict"
+                raise TypeError(msg)  # noqa: TRY301
+
+            return Result[Query](
+                LatlongQuery(
+                    Latlong(
+                        latitude=termux_location_json["latitude"],
+                        longitude=termux_location_json["longitude"],
+                    )
+                )
+            )
+
+        except (JSONDecodeError, TypeError):
+            return Result[Query](
+                LatlongQuery(EMPTY_LATLONG),
+                error=ValueError("could not parse termux-location json"),
+            )
+
+        except KeyError:
+            return Result[Query](
+                LatlongQuery(EMPTY_LATLONG),
+                error=ValueError(
+                    "could not get 'latitude' or 'longitude' keys from termux-location json"
+                ),
+            )
+
+        except Exception as exc:  # noqa: BLE001
+            return Result[Query](
+                LatlongQuery(EMPTY_LATLONG),
+                error=exc,
+            )
+
+    # not a plus/local code/termux-location json,
+    # try to match for latlong or string query
+    match split_query:
+        case [single]:
+            # possibly a:
+            #   comma-seperated single-word-long latlong coord
+            #   (fallback) single word string query
+
+            if "," not in single:  # no comma, not a latlong coord
+                return Result[Query](StringQuery(original_query))
+
+            # has comma, possibly a latlong coord
+            comma_split_single: list[str] = single.split(",")
+
+            if len(comma_split_single) != 2:  # noqa: PLR2004
+                return Result[Query](StringQuery(original_query))
+
+            latitude = _parse_float(comma_split_single[0])
+            longitude = _parse_float(comma_split_single[1])
+
+            if (latitude is None) or (longitude is None):  # not a latlong coord, fallback
+                return Result[Query](StringQuery(single))
+
+            return Result[Query](LatlongQuery(Latlong(latitude=latitude, longitude=longitude)))
+
+        case [left_single, right_single]:
+            # possibly a:
+            #   space-seperated latlong coord
+            #   (fallback) space-seperated string query
+
+            latitude = _parse_float(left_single.strip(","))
+            longitude = _parse_float(right_single.strip(","))
+
+            if (latitude is None) or (longitude is None):  # not a latlong coord, fallback
+                return Result[Query](StringQuery(original_query))
+
+            return Result[Query](LatlongQuery(Latlong(latitude=latitude, longitude=longitude)))
+
+        case _:
+            # possibly a:
+            #   (fallback) space-seperated string query
+
+            return Result[Query](StringQuery(original_query))
+
+
+def parse_query(behaviour: Behaviour) -> Result[Query]:
+    """
+    function that parses a query string into a query object
+
+    arguments
+        behaviour: Behaviour
+
+    returns Result[Query]
+    """
+
+    return _parse_query(
+        behaviour.query,
+        using_termux_location=behaviour.using_termux_location,
+        debug=behaviour.stderr if behaviour.debug else None,
+    )
+
+
+def parse_queries(
+    queries: Iterable[str | list[str]],
+    behaviour: Behaviour | None = None,
+) -> Iterator[Result[Query]]:
+    """
+    function that parses many query strings into query objects, like parse_query() but
+    without a Behaviour per query
+
+    arguments
+        queries: Iterable[str | list[str]]
+            query strings, or lists of strings from splitting query strings by spaces
+        behaviour: Behaviour | None = None
+            surplus behaviour namedtuple, whose using_termux_location, debug and stderr
+            apply to every query. `behaviour.query` is ignored
+
+    returns Iterator[Result[Query]]
+        results in input order, parsed as they are consumed
+    """
+
+    using_termux_location: bool = False
+    debug: TextIO | None = None
+
+    if behaviour is not None:
+        using_termux_location = behaviour.using_termux_location
+        debug = behaviour.stderr if behaviour.debug else None
+
+    for query in queries:
+        yield _parse_query(query, using_termux_location=using_termux_location, debug=debug)
+
+
+def handle_args(arguments: list[str] | None = None) -> tuple[Behaviour, _CliOptions]:
+    """
+    internal function that handles command-line arguments
+
+    arguments
+        arguments: list[str] | None = None
+            command-line arguments to handle, defaults to sys.argv[1:] if None
+
+    returns tuple[Behaviour, _CliOptions]
+        program behaviour namedtuple, and the options of the cli() mode to run
+    """
+
+    from argparse import ArgumentParser  # noqa: PLC0415
+
+    parser = ArgumentParser(
+        prog="surplus",
+        description=__doc__[__doc__.find(":") + 2 : __doc__.find("\n", 1)],
+    )
+    parser.add_argument(
+        "query",
+        type=str,
+        help=(
+            "full-length Plus Code (6PH58QMF+FX), "
+            "shortened Plus Code/'local code' (8QMF+FX Singapore), "
+            "latlong (1.3336875, 103.7749375), "
+            "string query (e.g., 'Wisma Atria'), "
+            "or '-' to read from stdin"
+        ),
+        nargs="*",
+    )
+    parser.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        default=False,
+        help="prints lat, long and reverser response dict to stderr",
+    )
+    parser.add_argument(
+        "-v",
+        "--version",
+        action="store_true",
+        default=False,
+        help="prints version information to stderr and exits",
+    )
+    (
+        parser.add_argument(
+            "-c",
+            "--convert-to",
+            type=str,
+            metavar="{" + ",".join(str(v.value) for v in ConversionResultTypeEnum) + "}",
+            help=(
+                "converts query a specific output type, or several comma-separated types "
+                "at once as a json object, defaults to "
+                f"'{ConversionResultTypeEnum.SHAREABLE_TEXT.value}'"
+            ),
+            default=ConversionResultTypeEnum.SHAREABLE_TEXT.value,
+        ),
+    )
+    parser.add_argument(
+        "-u",
+        "--user-agent",
+        type=str,
+        help=(
+            "user agent string to use for geocoding service, "
+            "defaults to fingerprinted user agent string"
+        ),
+        default="",
+    )
+    parser.add_argument(
+        "--nominatim-url",
+        type=str,
+        default="",
+        metavar="URL",
+        help=(
+            "base url of a Nominatim-compatible service to geocode with, "
+            "defaults to OpenStreetMap's Nominatim"
+        ),
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        nargs="?",
+        const=default_cache_path(),
+        default=None,
+        metavar="PATH",
+        help=(
+            "persistently caches geocoding results and localities in an sqlite database shared "
+            f"across runs, defaults to '{default_cache_path()}' if no path is given"
+        ),
+    )
+    parser.add_argument(
+        "--shared-rate-limiter",
+        type=Path,
+        nargs="?",
+        const=default_rate_limiter_path(),
+        default=None,
+        metavar="PATH",
+        help=(
+            "shares one geocoding request budget with other surplus processes using the same "
+            f"state file, defaults to '{default_rate_limiter_path()}' if no path is given"
+        ),
+    )
+    parser.add_argument(
+        "--offline-pack",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="reverses coordinates offline using a surplus data pack instead of Nominatim",
+    )
+    parser.add_argument(
+        "--memory-cache-entries",
+        type=int,
+        default=MEMORY_CACHE_MAX_ENTRIES,
+        metavar="N",
+        help=(
+            "geocoding results to keep in memory, 0 for no limit, "
+            f"defaults to {MEMORY_CACHE_MAX_ENTRIES}"
+        ),
+    )
+    parser.add_argument(
+        "--memory-cache-bytes",
+        type=int,
+        default=MEMORY_CACHE_MAX_BYTES,
+        metavar="N",
+        help=(
+            "approximate memory for geocoding results kept in memory, 0 for no limit, "
+            f"defaults to {MEMORY_CACHE_MAX_BYTES}"
+        ),
+    )
+    parser.add_argument(
+        "--memory-cache-ttl",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="how long geocoding results are kept in memory for, defaults to 0 for forever",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        default=False,
+        help=(
+            "writes how long each conversion spent parsing, geocoding, reversing and "
+            "generating text, with cache use and retries, to stderr as one json line"
+        ),
+    )
+    parser.add_argument(
+        "--cache-stats",
+        action="store_true",
+        default=False,
+        help="writes in-memory geocoding cache statistics to stderr as json when done",
+    )
+    parser.add_argument(
+        "--record-cassette",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="appends every new geocoding request and its answer to a cassette file",
+    )
+    parser.add_argument(
+        "--replay-cassette",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="answers geocoding requests from a cassette file instead of Nominatim",
+    )
+    parser.add_argument(
+        "--quantise-reverser",
+        action="store_true",
+        default=False,
+        help=(
+            "snaps coordinates to their Plus Code cell before reversing, "
+            "so nearby coordinates share cached addresses"
+        ),
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        default=False,
+        help=(
+            "serves conversion requests on a unix socket until interrupted, keeping geocoding "
+            "caches warm for other surplus processes using --socket"
+        ),
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        nargs="?",
+        const=default_socket_path(),
+        default=None,
+        metavar="PATH",
+        help=(
+            "converts through a surplus daemon serving on this unix socket, with its geocoding "
+            "backend and this user agent, or converts in-process if none is running. also "
+            f"where --serve serves, defaults to '{default_socket_path()}' if no path is given"
+        ),
+    )
+    parser.add_argument(
+        "--serve-http",
+        type=str,
+        nargs="?",
+        const=":".join(str(part) for part in HTTP_DEFAULT_ADDRESS),
+        default=None,
+        metavar="HOST:PORT",
+        help=(
+            "serves a json conversion api over http until interrupted, defaults to "
+            f"'{':'.join(str(part) for part in HTTP_DEFAULT_ADDRESS)}' if no address is given. "
+            "uses the shared rate limiter, see --shared-rate-limiter"
+        ),
+    )
+    parser.add_argument(
+        "--http-concurrency",
+        type=int,
+        default=HTTP_MAX_CONCURRENCY,
+        metavar="N",
+        help=f"conversions the http server runs at once, defaults to {HTTP_MAX_CONCURRENCY}",
+    )
+    parser.add_argument(
+        "--http-client-concurrency",
+        type=int,
+        default=HTTP_MAX_CLIENT_CONCURRENCY,
+        metavar="N",
+        help=(
+            "conversions the http server runs at once for one client, "
+            f"defaults to {HTTP_MAX_CLIENT_CONCURRENCY}"
+        ),
+    )
+    parser.add_argument(
+        "--show-user-agent",
+        action="store_true",
+        default=False,
+        help="prints fingerprinted user agent string and exits",
+    )
+    parser.add_argument(
+        "-t",
+        "--using-termux-location",
+        action="store_true",
+        default=False,
+        help="treats input as a termux-location output json string, and parses it accordingly",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        action="store_true",
+        default=False,
+        help="reads one query per line from stdin and writes one result per line to stdout",
+    )
+    parser.add_argument(
+        "--batch-format",
+        type=str,
+        choices=[str(v.value) for v in BatchOutputFormatEnum],
+        help=(
+            "output format for batch mode results, defaults to "
+            f"'{_CliOptions().batch_format.value}'"
+        ),
+        default=_CliOptions().batch_format.value,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help=(
+            "converts batch mode queries in N processes, 0 for one per cpu, defaults to 1. "
+            "for offline packs, replayed cassettes or self-hosted Nominatim, as processes "
+            "share one request budget for the public Nominatim. cannot record cassettes"
+        ),
+        default=_CliOptions().workers,
+    )
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        default=False,
+        help="writes batch mode results from --workers as they are converted, not in order",
+    )
+
+    parser.add_argument(
+        "--csv",
+        action="store_true",
+        default=False,
+        help=(
+            "reads a csv file from stdin and writes it to stdout with a 'pluscode' column, or "
+            "'latitude' and 'longitude' columns, appended. only converts to "
+            f"'{ConversionResultTypeEnum.PLUS_CODE.value}' or "
+            f"'{ConversionResultTypeEnum.LATLONG.value}', without network access"
+        ),
+    )
+    parser.add_argument(
+        "--csv-columns",
+        type=str,
+        default="",
+        metavar="NAMES",
+        help=(
+            "comma-separated names of the csv columns to convert from, defaults to "
+            "'latitude,longitude' or 'pluscode' depending on the conversion"
+        ),
+    )
+
+    # initialisation
+    args = parser.parse_args(arguments)
+    query: str | list[str] = ""
+
+    if args.batch and args.csv:
+        parser.error("batch mode and csv mode cannot be used together")
+
+    if (args.batch or args.csv) and (args.query not in ([], ["-"])):
+        parser.error("batch and csv modes read from stdin, do not pass a query")
+
+    if (args.serve or (args.serve_http is not None)) and (
+        args.batch or args.csv or (args.query != [])
+    ):
+        parser.error("serving does not take a query, or batch or csv mode")
+
+    if args.serve and (args.serve_http is not None):
+        parser.error("serve on either a unix socket or http, not both")
+
+    try:
+        convert_to_type = _parse_conversion_types(args.convert_to)
+
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    if (args.http_concurrency < 1) or (args.http_client_concurrency < 1):
+        parser.error("http concurrency limits must be at least 1")
+
+    if (args.record_cassette is not None) and (args.replay_cassette is not None):
+        parser.error("record to or replay from a cassette, not both")
+
+    if (args.memory_cache_entries < 0) or (args.memory_cache_bytes < 0):
+        parser.error("memory cache limits cannot be negative")
+
+    # in client mode, the daemon converts with its own geocoding backend
+    if (args.socket is not None) and not (
+        args.serve or (args.serve_http is not None) or args.batch or args.csv
+    ):
+        backend_flags = [
+            flag
+            for flag, given in (
+                ("--cache", args.cache is not None),
+                ("--offline-pack", args.offline_pack is not None),
+                ("--record-cassette", args.record_cassette is not None),
+                ("--replay-cassette", args.replay_cassette is not None),
+                ("--nominatim-url", args.nominatim_url != ""),
+                ("--quantise-reverser", args.quantise_reverser),
+                ("--timings", args.timings),
+            )
+            if given
+        ]
+        if backend_flags:
+            parser.error(
+                f"{', '.join(backend_flags)} cannot be used with --socket, as the daemon "
+                "converts with its own geocoding backend. pass them to the daemon instead"
+            )
+
+    if args.workers < 0:
+        parser.error("worker count cannot be negative")
+
+    if ((args.workers != 1) or args.unordered) and (not args.batch):
+        parser.error("--workers and --unordered are only used in batch mode")
+
+    if (args.workers != 1) and args.cache_stats:
+        parser.error("--cache-stats cannot be used with --workers, as every worker has its own")
+
+    if (args.workers != 1) and (args.record_cassette is not None):
+        parser.error(
+            "--record-cassette cannot be used with --workers, as every worker would append to it"
+        )
+
+    try:
+        _nominatim_location(args.nominatim_url)
+
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    serve_http: tuple[str, int] | None = None
+    if args.serve_http is not None:
+        host, _, port = args.serve_http.rpartition(":")
+        if not port.isdigit():
+            parser.error(f"invalid http address '{args.serve_http}', expected HOST:PORT")
+
+        serve_http = (host.strip("[]") or HTTP_DEFAULT_ADDRESS[0], int(port))
+
+        # requests with their own user agents get their own geocoding objects, so keep
+        # every one of them within one request budget
+        if args.shared_rate_limiter is None:
+            args.shared_rate_limiter = default_rate_limiter_path()
+
+    # likewise for batch mode worker processes using the public Nominatim, each of which has
+    # its own geocoding objects
+    if (
+        (args.workers != 1)
+        and (args.nominatim_url == "")
+        and (args.replay_cassette is None)
+        and (args.shared_rate_limiter is None)
+    ):
+        args.shared_rate_limiter = default_rate_limiter_path()
+
+    # "-" stdin check, batch and csv modes read stdin lazily by themselves
+    query = (
+        "\n".join([line.strip() for line in stdin])
+        if (args.query == ["-"]) and (not args.batch) and (not args.csv)
+        else args.query
+    )
+
+    # setup structures and return
+    geocoding = SurplusDefaultGeocoding(
+        args.user_agent,
+        cache=SurplusPersistentCache(args.cache) if (args.cache is not None) else None,
+        quantise_reverser=args.quantise_reverser,
+        rate_limiter=(
+            SurplusSharedRateLimiter(args.shared_rate_limiter)
+            if (args.shared_rate_limiter is not None)
+            else None
+        ),
+        memory_cache=SurplusMemoryCache(
+            max_entries=args.memory_cache_entries,
+            max_bytes=args.memory_cache_bytes,
+            ttl_seconds=args.memory_cache_ttl,
+        ),
+        nominatim_url=args.nominatim_url,
+    )
+    geocoder: SurplusGeocoderProtocol = geocoding.geocoder
+    reverser: SurplusReverserProtocol = geocoding.reverser
+    if args.offline_pack is not None:
+        reverser = SurplusOfflineReverser(args.offline_pack).reverser
+
+    if args.replay_cassette is not None:
+        try:
+            replayer = SurplusCassetteReplayer(args.replay_cassette)
+
+        except OSError as exc:
+            parser.error(f"could not read cassette '{args.replay_cassette}': {exc}")
+
+        geocoder, reverser = replayer.geocoder, replayer.reverser
+
+    elif args.record_cassette is not None:
+        recorder = SurplusCassetteRecorder(args.record_cassette, geocoder, reverser)
+        geocoder, reverser = recorder.geocoder, recorder.reverser
+
+    return (
+        Behaviour(
+            query=query,
+            geocoder=geocoder,
+            reverser=reverser,
+            stderr=stderr,
+            stdout=stdout,
+            debug=args.debug,
+            version_header=args.version,
+            convert_to_type=convert_to_type,
+            using_termux_location=args.using_termux_location,
+            show_user_agent=args.show_user_agent,
+            locality_table=SurplusLocalityTable(args.cache) if (args.cache is not None) else None,
+            timings_hook=_write_timings if args.timings else None,
+        ),
+        _CliOptions(
+            batch=args.batch,
+            batch_format=BatchOutputFormatEnum(args.batch_format),
+            workers=args.workers,
+            batch_ordered=not args.unordered,
+            csv=args.csv,
+            csv_columns=tuple(
+                column.strip() for column in args.csv_columns.split(",") if column.strip() != ""
+            ),
+            serve=args.serve,
+            socket_path=args.socket,
+            serve_http=serve_http,
+            http_concurrency=args.http_concurrency,
+            http_client_concurrency=args.http_client_concurrency,
+            cache_stats=args.cache_stats,
+        ),
+    )
+
+
+def _cli_behaviour(arguments: list[str]) -> Behaviour:
+    """
+    (internal function) returns the behaviour handle_args() makes from command-line
+    arguments, for batch mode worker processes
+    """
+    return handle_args(arguments)[0]
+
+
+class _RenderingPlan(NamedTuple):
+    """
+    (internal use) shareable text key arrangement for a country, compiled from the
+    SHAREABLE_TEXT_* dictionaries by _rendering_plan()
+
+    attributes
+        country: str
+            uppercase iso 3166-2 country prefix, or "default"
+        special: bool
+            whether the country has any special key arrangements
+        lines: tuple[tuple[tuple[str, ...], str, bool], ...]
+            (keys, separator, whether to check for seen names) for each line
+        names: tuple[str, ...]
+            keys of names that later lines are checked against
+        global_keys: tuple[str, ...]
+            keys of general global information that later lines are checked against
+        locality: tuple[str, ...]
+            keys used for the locality portion of local codes
+    """
+
+    country: str
+    special: bool
+    lines: tuple[tuple[tuple[str, ...], str, bool], ...]
+    names: tuple[str, ...]
+    global_keys: tuple[str, ...]
+    locality: tuple[str, ...]
+
+
+@lru_cache(maxsize=256)
+def _rendering_plan(country: str) -> _RenderingPlan:
+    """
+    (internal function) compiles the SHAREABLE_TEXT_* dictionaries into a rendering plan
+    for an uppercase iso 3166-2 country prefix. plans are cached, so call
+    _rendering_plan.cache_clear() after modifying the dictionaries at runtime
+    """
+
+    line_keys = (
+        SHAREABLE_TEXT_LINE_0_KEYS,
+        SHAREABLE_TEXT_LINE_1_KEYS,
+        SHAREABLE_TEXT_LINE_2_KEYS,
+        SHAREABLE_TEXT_LINE_3_KEYS,
+        SHAREABLE_TEXT_LINE_4_KEYS,
+        SHAREABLE_TEXT_LINE_5_KEYS,
+        SHAREABLE_TEXT_LINE_6_KEYS,
+    )
+    tables: tuple[dict[str, Any], ...] = (
+        *line_keys,
+        SHAREABLE_TEXT_NAMES,
+        SHAREABLE_TEXT_LOCALITY,
+        SHAREABLE_TEXT_LINE_SETTINGS,
+    )
+
+    def _get(table: dict[str, Any]) -> Any:  # noqa: ANN401
+        return table.get(country, table[SHAREABLE_TEXT_DEFAULT])
+
+    settings: dict[int, tuple[str, bool]] = _get(SHAREABLE_TEXT_LINE_SETTINGS)
+    return _RenderingPlan(
+        country=country,
+        special=(country != SHAREABLE_TEXT_DEFAULT) and any(country in table for table in tables),
+        lines=tuple(
+            (tuple(_get(keys)), *settings[line_number])
+            for line_number, keys in enumerate(line_keys)
+        ),
+        names=tuple(_get(SHAREABLE_TEXT_NAMES)),
+        global_keys=tuple(_get(SHAREABLE_TEXT_LINE_6_KEYS)),
+        locality=tuple(_get(SHAREABLE_TEXT_LOCALITY)),
+    )
+
+
+class _TextLineTrace(NamedTuple):
+    """
+    (internal use) trace of rendering one line of text, see _TextTrace
+
+    attributes
+        line_number: int
+            line number
+        keys: tuple[str, ...]
+            location keys considered, in order
+        decisions: tuple[tuple[str, tuple[bool, ...], bool], ...]
+            (detail, filter checks, whether it was kept) for each unique non-empty detail
+        text: str
+            rendered line, without a trailing newline
+    """
+
+    line_number: int
+    keys: tuple[str, ...]
+    decisions: tuple[tuple[str, tuple[bool, ...], bool], ...]
+    text: str
+
+
+class _TextTrace(NamedTuple):
+    """
+    (internal use) structured trace of a _generate_text() call, for debug output
+
+    attributes
+        iso3166_2: str
+            iso 3166-2 code found in the location dict, if any
+        country: str
+            country prefix of the rendering plan used, or "default"
+        special: bool
+            whether the country overrides any default key arrangements
+        seen_names: tuple[str, ...]
+            names that details on lines checking for seen names were filtered against
+        lines: tuple[_TextLineTrace, ...]
+            traces of each rendered line
+
+    methods
+        def format(self) -> str: ...
+    """
+
+    iso3166_2: str
+    country: str
+    special: bool
+    seen_names: tuple[str, ...]
+    lines: tuple[_TextLineTrace, ...]
+
+    def format(self) -> str:
+        """method that returns the trace as human-readable debug lines"""
+
+        split_iso3166_2 = [part.upper() for part in self.iso3166_2.split("-")]
+        output: list[str] = [f"debug: _generate_text: {split_iso3166_2=}"]
+
+        if self.special:
+            output.append(
+                "debug: _generate_text: "
+                f"using special key arrangements for '{self.iso3166_2}' ({self.country})"
+            )
+
+        if self.seen_names:
+            output.append(f"debug: _generate_text: seen_names={list(self.seen_names)}")
+
+        for line in self.lines:
+            output.append(f"debug: _generate_text_line: {line.line_number}: keys={line.keys}")
+            output.extend(
+                "debug: _generate_text_line: "
+                f"{list(checks)!s:<20} -> {kept!s:<5}  "
+                f"{'--------' if kept else 'filtered'}  '{detail}'"
+                for detail, checks, kept in line.decisions
+            )
+
+        output.extend(f"{line.line_number}\t{line.text}" for line in self.lines)
+        return "\n".join(output)
+
+
+class _GeneratedText(NamedTuple):
+    """
+    (internal use) result of _generate_text()
+
+    attributes
+        text: str
+            generated text
+        trace: _TextTrace | None
+            structured trace of the generation, if it was requested
+    """
+
+    text: str
+    trace: "_TextTrace | None" = None
+
+
+def _generate_text(
+    location: Mapping[str, Any],
+    mode: TextGenerationEnum = TextGenerationEnum.SHAREABLE_TEXT,
+    trace: bool = False,  # noqa: FBT001, FBT002
+) -> _GeneratedText:
+    """
+    (internal function) generate shareable text from location dict
+
+    arguments
+        location: Mapping[str, Any]
+            dictionary from geocoding reverser function, or an AddressRecord
+        mode: GenerationModeEnum = GenerationModeEnum.SHAREABLE_TEXT
+                generation mode, defaults to shareable text generation
+        trace: bool = False
+            whether to also return a structured trace of the generation in the same pass,
+            used by surplus for debug output
+
+    returns _GeneratedText
+    """
+
+    # iso3166-2 handling: this allows surplus to have special key arrangements for a
+    #                     specific iso3166-2 code for edge cases
+    #                     (https://en.wikipedia.org/wiki/ISO_3166-2)
+
+    # get iso3166-2 before doing anything
+    iso3166_2: str = ""
+    for key in location:
+        if key.lower().startswith("iso3166"):
+            iso3166_2 = location.get(key, "")
+
+    plan = _rendering_plan(iso3166_2.split("-", 1)[0].upper() or SHAREABLE_TEXT_DEFAULT)
+    details: dict[str, str] = {}  # location key -> detail string, looked up once per key
+    seen_names: list[str] = []
+    general_global_info: set[str] = set()
+    line_traces: list[_TextLineTrace] = []
+
+    def _details(keys: tuple[str, ...]) -> list[str]:
+        """(internal function) returns the unique non-empty details for keys, in order"""
+        for key in keys:
+            if key not in details:
+                details[key] = str(location.get(key, ""))
+        return [detail for detail in dict.fromkeys(details[key] for key in keys) if detail != ""]
+
+    def _render_line(
+        line_number: int,
+        line_keys: tuple[str, ...],
+        separator: str = ", ",
+        check_seen: bool = False,  # noqa: FBT001, FBT002
+    ) -> str:
+        """
+        (internal function) renders a line of shareable text, skipping details that are
+        general global information or part of a seen name if check_seen is True
+        """
+
+        basket: list[str] = []
+        decisions: list[tuple[str, tuple[bool, ...], bool]] = []
+
+        for detail in _details(line_keys):
+            # filtering: everything here should be True if the element is to be kept
+            detail_check: tuple[bool, ...] = (
+                (
+                    detail not in general_global_info,
+                    not any(detail in name for name in seen_names),
+                )
+                if check_seen
+                else (True,)
+            )
+            filter_status = all(detail_check)
+
+            if trace:
+                decisions.append((detail, detail_check, filter_status))
+
+            if filter_status:
+                basket.append(detail)
+
+        line = separator.join(basket)
+
+        if trace:
+            line_traces.append(_TextLineTrace(line_number, line_keys, tuple(decisions), line))
+
+        return (line + "\n") if (line != "") else ""
+
+    # start generating text
+    match mode:
+        case TextGenerationEnum.SHAREABLE_TEXT:
+            seen_names.extend(_details(plan.names))
+            general_global_info.update(str(location.get(key, "")) for key in plan.global_keys)
+
+            # unique lines, in order
+            lines = dict.fromkeys(
+                _render_line(line_number, line_keys, separator, check_seen)
+                for line_number, (line_keys, separator, check_seen) in enumerate(plan.lines)
+            )
+            text = "".join(lines).rstrip()
+
+        case TextGenerationEnum.LOCALITY_TEXT:
+            text = _render_line(line_number=0, line_keys=plan.locality)
+
+        case _:
+            msg = f"unknown mode '{mode}' (expected a TextGenerationEnum)"
+            raise NotImplementedError(msg)
+
+    if not trace:
+        return _GeneratedText(text)
+
+    return _GeneratedText(
+        text,
+        trace=_TextTrace(
+            iso3166_2=iso3166_2,
+            country=plan.country,
+            special=plan.special,
+            seen_names=tuple(seen_names),
+            lines=tuple(line_traces),
+        ),
+    )
+
+
+class _GeocoderCall(NamedTuple):
+    """
+    (internal use) request from a conversion generator to geocode a place. localities of
+    local codes are read from and stored in behaviour.locality_table
+    """
+
+    place: str
+    locality: bool = False
+
+
+class _ReverserCall(NamedTuple):
+    """(internal use) request from a conversion generator to reverse a latlong"""
+
+    latlong: Latlong
+    level: int = 18
+
+
+# a conversion generator yields geocoding calls, is sent their results (or thrown their
+# exceptions), and returns its result. this lets surplus() and surplus_async() share one
+# implementation, differing only in how the calls are performed
+_Conversion: TypeAlias = Generator[_GeocoderCall | _ReverserCall, Any, ResultType]
+
+
+def _recall_locality(call: _GeocoderCall | _ReverserCall, behaviour: Behaviour) -> Latlong | None:
+    """(internal function) returns a locality geocoding call's answer from the locality table"""
+
+    if (
+        (not isinstance(call, _GeocoderCall))
+        or (not call.locality)
+        or (behaviour.locality_table is None)
+    ):
+        return None
+
+    latlong = behaviour.locality_table.get(call.place)
+    if latlong is not None:
+        _note_cache("locality")
+
+    if behaviour.debug and (latlong is not None):
+        print(f"debug: locality table: {call.place!r} -> {latlong!r}", file=behaviour.stderr)
+
+    return latlong
+
+
+def _remember_locality(
+    call: _GeocoderCall | _ReverserCall,
+    behaviour: Behaviour,
+    response: Any,  # noqa: ANN401
+) -> None:
+    """(internal function) stores a locality geocoding call's answer in the locality table"""
+
+    if (
+        isinstance(call, _GeocoderCall)
+        and call.locality
+        and (behaviour.locality_table is not None)
+        and isinstance(response, Latlong)
+    ):
+        behaviour.locality_table.set(call.place, response)
+
+
+@contextmanager
+def _timed_call(call: _GeocoderCall | _ReverserCall) -> Iterator[None]:
+    """(internal function) records the time spent on a geocoding call, if recording"""
+
+    if (recorder := _timings_recorder.get()) is None:
+        yield
+        return
+
+    recorder.cache, recorder.attempts = None, 0
+    start = perf_counter()
+    try:
+        yield
+
+    finally:
+        seconds = perf_counter() - start
+        if isinstance(call, _GeocoderCall):
+            recorder.stages["geocode"] += seconds
+            timing = SurplusCallTiming("geocoder", call.place, seconds, recorder.cache, 0)
+        else:
+            recorder.stages["reverse"] += seconds
+            timing = SurplusCallTiming("reverser", str(call.latlong), seconds, recorder.cache, 0)
+
+        recorder.calls.append(timing._replace(retries=max(recorder.attempts - 1, 0)))
+
+
+def _run_conversion(conversion: _Conversion[ResultType], behaviour: Behaviour) -> ResultType:
+    """(internal function) runs a conversion generator using the behaviour's functions"""
+
+    try:
+        call = next(conversion)
+        while True:
+            try:
+                with _timed_call(call):
+                    response: Any = _recall_locality(call, behaviour)
+                    if response is None:
+                        response = (
+                            behaviour.geocoder(call.place)
+                            if isinstance(call, _GeocoderCall)
+                            else behaviour.reverser(call.latlong, level=call.level)
+                        )
+                        _remember_locality(call, behaviour, response)
+
+            except Exception as exc:  # noqa: BLE001
+                call = conversion.throw(exc)
+
+            else:
+                call = conversion.send(response)
+
+    except StopIteration as stop:
+        return stop.value
+
+
+async def _run_conversion_async(
+    conversion: _Conversion[ResultType],
+    behaviour: Behaviour,
+) -> ResultType:
+    """(internal function) runs a conversion generator using the behaviour's async functions"""
+
+    try:
+        call = next(conversion)
+        while True:
+            try:
+                with _timed_call(call):
+                    response: Any = _recall_locality(call, behaviour)
+                    if response is None:
+                        response = (
+                            await behaviour.async_geocoder(call.place)
+                            if isinstance(call, _GeocoderCall)
+                            else await behaviour.async_reverser(call.latlong, level=call.level)
+                        )
+                        _remember_locality(call, behaviour, response)
+
+            except Exception as exc:  # noqa: BLE001
+                call = conversion.throw(exc)
+
+            else:
+                call = conversion.send(response)
+
+    except StopIteration as stop:
+        return stop.value
+
+
+def _resolve_latlong(query: Query) -> _Conversion[Result[Latlong]]:
+    """(internal function) conversion generator that resolves a query into a latlong"""
+
+    located: Latlong = EMPTY_LATLONG
+
+    if isinstance(query, StringQuery | LocalCodeQuery):
+        try:
+            located = yield (
+                _GeocoderCall(query.query)
+                if isinstance(query, StringQuery)
+                else _GeocoderCall(query.locality, locality=True)
+            )
+
+        except Exception as exc:  # noqa: BLE001
+            return Result[Latlong](EMPTY_LATLONG, error=exc)
+
+    def geocoder(place: str) -> Latlong:  # noqa: ARG001
+        return located
+
+    return query.to_lat_long_coord(geocoder=geocoder)
+
+
+def _parse_surplus_query(query: Query | str, behaviour: Behaviour) -> Result[Query]:
+    """(internal function) passes through query objects, or parses a query string"""
+
+    if isinstance(query, PlusCodeQuery | LocalCodeQuery | LatlongQuery | StringQuery):
+        return Result[Query](query)
+
+    with _timed_stage("parse"):
+        return _parse_query(str(query), debug=behaviour.stderr if behaviour.debug else None)
+
+
+def surplus(query: Query | str, behaviour: Behaviour) -> Result[str]:
+    """
+    query to shareable text conversion function
+
+    query: Query | str
+        query object to convert or string to attempt to query for then convert
+    behaviour: Behaviour
+        surplus behaviour namedtuple
+
+    returns Result[str]
+    """
+
+    with _recording_timings(query, behaviour):
+        query_result = _parse_surplus_query(query, behaviour)
+
+        if not query_result:
+            return Result[str]("", error=query_result.error)
+
+        return _run_conversion(_surplus(query_result.get(), behaviour), behaviour)
+
+
+async def surplus_async(query: Query | str, behaviour: Behaviour) -> Result[str]:
+    """
+    asynchronous query to shareable text conversion function, using the
+    behaviour.async_geocoder and behaviour.async_reverser functions
+
+    many conversions can be run concurrently, e.g., with asyncio.gather(). conversions
+    sharing a SurplusDefaultAsyncGeocoding object share its rate limiter and caches
+
+    query: Query | str
+        query object to convert or string to attempt to query for then convert
+    behaviour: Behaviour
+        surplus behaviour namedtuple
+
+    returns Result[str]
+    """
+
+    with _recording_timings(query, behaviour):
+        query_result = _parse_surplus_query(query, behaviour)
+
+        if not query_result:
+            return Result[str]("", error=query_result.error)
+
+        return await _run_conversion_async(_surplus(query_result.get(), behaviour), behaviour)
+
+
+def _parse_conversion_types(
+    value: object,
+) -> ConversionResultTypeEnum | frozenset[ConversionResultTypeEnum]:
+    """
+    (internal function) parses a conversion type value, several comma-separated ones, or a
+    list of them, for Behaviour.convert_to_type. raises ValueError if invalid
+    """
+
+    values = value.split(",") if isinstance(value, str) else value
+    if (
+        (not isinstance(values, list))
+        or (len(values) == 0)
+        or (not all(isinstance(part, str) for part in values))
+    ):
+        msg = f"'convert_to' is not a conversion type or a list of them, got {value!r}"
+        raise ValueError(msg)
+
+    try:
+        types = frozenset(ConversionResultTypeEnum(part.strip()) for part in values)
+
+    except ValueError:
+        expected = ", ".join(f"'{v.value}'" for v in ConversionResultTypeEnum)
+        msg = f"unknown conversion type in {value!r}, expected {expected}"
+        raise ValueError(msg) from None
+
+    return next(iter(types)) if (len(types) == 1) else types
+
+
+def _conversion_types_value(
+    convert_to_type: ConversionResultTypeEnum | frozenset[ConversionResultTypeEnum],
+) -> str | list[str]:
+    """(internal function) inverse of _parse_conversion_types(), for requests to daemons"""
+
+    if isinstance(convert_to_type, ConversionResultTypeEnum):
+        return convert_to_type.value
+
+    return [v.value for v in ConversionResultTypeEnum if v in convert_to_type]
+
+
+def _sharing_calls(
+    conversion: _Conversion[ResultType],
+    answers: dict[_GeocoderCall | _ReverserCall, tuple[bool, Any]],
+) -> _Conversion[ResultType]:
+    """
+    (internal function) conversion generator that runs a conversion, answering geocoding
+    calls made before with the same answers (or exceptions) instead of yielding them again.
+    reversing calls below level 18 are also answered by a level 18 answer for the same latlong
+    """
+
+    try:
+        call = next(conversion)
+        while True:
+            if (
+                isinstance(call, _ReverserCall)
+                and (call.level < OFFLINE_REVERSER_DETAIL_LEVEL)
+                and (call not in answers)
+                and ((street_level := answers.get(call._replace(level=18))) is not None)
+                and street_level[0]
+            ):
+                answers[call] = (True, _address_at_level(street_level[1], call.level))
+
+            if (answer := answers.get(call)) is None:
+                try:
+                    answer = (True, (yield call))
+
+                except Exception as exc:  # noqa: BLE001
+                    answer = (False, exc)
+
+                answers[call] = answer
+
+            answered, response = answer
+            call = conversion.send(response) if answered else conversion.throw(response)
+
+    except StopIteration as stop:
+        return stop.value
+
+
+def _surplus_many(
+    query: Query,
+    behaviour: Behaviour,
+    convert_to_types: frozenset[ConversionResultTypeEnum],
+) -> _Conversion[Result[str]]:
+    """
+    (internal function) conversion generator converting to several types, sharing the
+    geocoding calls between them. returns a json object of outputs, or the first error
+    """
+
+    answers: dict[_GeocoderCall | _ReverserCall, tuple[bool, Any]] = {}
+    outputs: dict[ConversionResultTypeEnum, str] = {}
+
+    # shareable text goes first, as its street-level reverse also answers the local code's
+    # locality reverse
+    for convert_to_type in sorted(
+        convert_to_types,
+        key=lambda t: (t is not ConversionResultTypeEnum.SHAREABLE_TEXT, t.value),
+    ):
+        result = yield from _sharing_calls(
+            _surplus(query, behaviour._replace(convert_to_type=convert_to_type)), answers
+        )
+        if not result:
+            return result
+
+        outputs[convert_to_type] = result.get()
+
+    return Result[str](
+        json_dumps(
+            {t.value: outputs[t] for t in ConversionResultTypeEnum if t in outputs},
+            ensure_ascii=False,
+        )
+    )
+
+
+def _surplus(query: Query, behaviour: Behaviour) -> _Conversion[Result[str]]:
+    """(internal function) conversion generator behind surplus() and surplus_async()"""
+
+    if not isinstance(behaviour.convert_to_type, ConversionResultTypeEnum):
+        return (yield from _surplus_many(query, behaviour, behaviour.convert_to_type))
+
+    # operate on query
+    match behaviour.convert_to_type:
+        case ConversionResultTypeEnum.SHAREABLE_TEXT:
+            # get latlong and handle result
+            latlong_result: Result[Latlong] = yield from _resolve_latlong(query)
+
+            if not latlong_result:
+                return Result[str]("", error=latlong_result.error)
+
+            if behaviour.debug:
+                print(f"debug: {latlong_result.get()=}", file=behaviour.stderr)
+
+            # reverse location and handle result
+            try:
+                location = yield _ReverserCall(latlong_result.get())
+
+            except Exception as exc:  # noqa: BLE001
+                return Result[str]("", error=exc)
+
+            if behaviour.debug:
+                print(f"debug: {location=}", file=behaviour.stderr)
+
+            # generate text
+            with _timed_stage("generate_text"):
+                generated = _generate_text(location=location, trace=behaviour.debug)
+
+            if generated.trace is not None:
+                print(generated.trace.format(), file=behaviour.stderr)
+
+            return Result[str](generated.text)
+
+        case ConversionResultTypeEnum.PLUS_CODE:
+            # if its already a plus code, just return it
+            if isinstance(query, PlusCodeQuery):
+                return Result[str](str(query))
+
+            # get latlong and handle result
+            latlong_query = yield from _resolve_latlong(query)
+
+            if not latlong_query:
+                return Result[str]("", error=latlong_query.error)
+
+            if behaviour.debug:
+                print(f"debug: {latlong_query.get()=}", file=behaviour.stderr)
+
+            # perform operation
+            try:
+                pluscode: str = _codec.encode(
+                    latitude=latlong_query.get().latitude, longitude=latlong_query.get().longitude
+                )
+
+            except Exception as exc:  # noqa: BLE001
+                return Result[str]("", error=exc)
+
+            return Result[str](pluscode)
+
+        case ConversionResultTypeEnum.LOCAL_CODE:
+            # if its already a local code, just return it
+            if isinstance(query, LocalCodeQuery):
+                return Result[str](str(query))
+
+            # get latlong and handle result
+            latlong_result = yield from _resolve_latlong(query)
+
+            if not latlong_result:
+                return Result[str]("", error=latlong_result.error)
+
+            if behaviour.debug:
+                print(f"debug: {latlong_result.get()=}", file=behaviour.stderr)
+
+            query_latlong = latlong_result.get()
+
+            # reverse location and handle result
+            try:
+                location = yield _ReverserCall(query_latlong, level=LOCALITY_GEOCODER_LEVEL)
+
+            except Exception as exc:  # noqa: BLE001
+                return Result[str]("", error=exc)
+
+            if behaviour.debug:
+                print(f"debug: {location=}", file=behaviour.stderr)
+
+            # generate locality portion of local code
+            with _timed_stage("generate_text"):
+                generated = _generate_text(
+                    location=location,
+                    mode=TextGenerationEnum.LOCALITY_TEXT,
+                    trace=behaviour.debug,
+                )
+
+            if generated.trace is not None:
+                print(generated.trace.format(), file=behaviour.stderr)
+
+            portion_locality: str = generated.text.strip()
+
+            # reverse locality portion
+            try:
+                locality_latlong: Latlong = yield _GeocoderCall(portion_locality, locality=True)
+
+                # check now if bounding_box is set and valid
+                if getattr(locality_latlong, "bounding_box", None) is None:
+                    msg = (
+                        "(shortening) geocoder-returned latlong has .bounding_box=None"
+                        f" - {locality_latlong.bounding_box}"
+                    )
+                    raise AttributeError(msg)  # noqa: TRY301
+
+                if len(locality_latlong.bounding_box) != 4:  # noqa: PLR2004
+                    msg = (
+                        "(shortening) geocoder-returned latlong has len(.bounding_box) != 4"
+                        f" - {locality_latlong.bounding_box}"
+                    )
+                    raise ValueError(msg)  # noqa: TRY301
+
+                if not all(isinstance(c, float) for c in locality_latlong.bounding_box):
+                    msg = (
+                        "(shortening) geocoder-returned latlong has non-float in .bounding_box"
+                        f" - {locality_latlong.bounding_box}"
+                    )
+                    raise TypeError(msg)  # noqa: TRY301
+
+            except Exception as exc:  # noqa: BLE001
+                return Result[str]("", error=exc)
+
+            plus_code = _codec.encode(
+                latitude=query_latlong.latitude,
+                longitude=query_latlong.longitude,
+            )
+
+            # https://github.com/google/open-location-code/wiki/Guidance-for-shortening-codes
+            check1 = (
+                # The center point of the feature is within 0.4 degrees latitude and 0.4
+                # degrees longitude
+                (
+                    (query_latlong.latitude - 0.4)
+                    <= locality_latlong.latitude
+                    <= (query_latlong.latitude + 0.4)
+                ),
+                (
+                    (query_latlong.longitude - 0.4)
+                    <= locality_latlong.longitude
+                    <= (query_latlong.longitude + 0.4)
+                ),
+                # The bounding box of the feature is less than 0.8 degrees high and wide.
+                abs(locality_latlong.bounding_box[0] - locality_latlong.bounding_box[1]) < 0.8,  # noqa: PLR2004
+                abs(locality_latlong.bounding_box[2] - locality_latlong.bounding_box[3]) < 0.8,  # noqa: PLR2004
+            )
+
+            check2 = (
+                # The center point of the feature is within 0.4 degrees latitude and 0.4
+                # degrees longitude"
+                (
+                    (query_latlong.latitude - 8)
+                    <= locality_latlong.latitude
+                    <= (query_latlong.latitude + 8)
+                ),
+                (
+                    (query_latlong.longitude - 8)
+                    <= locality_latlong.longitude
+                    <= (query_latlong.longitude + 8)
+                ),
+                # The bounding box of the feature is less than 0.8 degrees high and wide.
+                abs(locality_latlong.bounding_box[0] - locality_latlong.bounding_box[1]) < 16,  # noqa: PLR2004
+                abs(locality_latlong.bounding_box[2] - locality_latlong.bounding_box[3]) < 16,  # noqa: PLR2004
+            )
+
+            if all(check1):
+                return Result[str](f"{plus_code[4:]} {portion_locality}")
+
+            if all(check2):
+                return Result[str](f"{plus_code[2:]} {portion_locality}")
+
+            print(
+                "info: could not determine a suitable geographical feature to use as "
+                "locality for shortening. full plus code is returned.",
+                file=behaviour.stderr,
+            )
+            return Result[str](plus_code)
+
+        case ConversionResultTypeEnum.LATLONG:
+            # return the latlong if already given a latlong
+            if isinstance(query, LatlongQuery):
+                return Result[str](str(query))
+
+            # get latlong and handle result
+            latlong_result = yield from _resolve_latlong(query)
+
+            if not latlong_result:
+                return Result[str]("", error=latlong_result.error)
+
+            if behaviour.debug:
+                print(f"debug: {latlong_result.get()=}", file=behaviour.stderr)
+
+            # perform operation
+            return Result[str](str(latlong_result.get()))
+
+        case _:
+            return Result[str](
+                "", error=f"unknown conversion result type '{behaviour.convert_to_type}'"
+            )
+
+
+def surplus_batch(
+    queries: Iterable[str],
+    behaviour: Behaviour,
+) -> Iterator[tuple[str, Result[str]]]:
+    """
+    lazily converts an iterable of query strings, one result per query
+
+    queries: Iterable[str]
+        query strings, e.g., lines from a file or stdin. surrounding whitespace is stripped
+    behaviour: Behaviour
+        surplus behaviour namedtuple, used for every query. `behaviour.query` is ignored.
+        the same geocoder and reverser functions are used for all queries, so their caches
+        are shared
+
+    returns Iterator[tuple[str, Result[str]]]
+        (stripped query string, result) pairs in input order. queries are only read as
+        results are consumed
+    """
+
+    debug = behaviour.stderr if behaviour.debug else None
+
+    for line in queries:
+        query_string = line.strip()
+
+        with _recording_timings(query_string, behaviour):
+            with _timed_stage("parse"):
+                query = _parse_query(
+                    query_string,
+                    using_termux_location=behaviour.using_termux_location,
+                    debug=debug,
+                )
+
+            result = (
+                surplus(query=query.get(), behaviour=behaviour)
+                if query
+                else Result[str]("", error=query.error)
+            )
+
+        yield query_string, result
+
+
+# the behaviour of a batch mode worker process, created once by _init_batch_worker()
+_batch_worker_behaviour: Behaviour | None = None
+
+
+def _init_batch_worker(behaviour_factory: Callable[[], Behaviour]) -> None:
+    """(internal function) process pool initialiser for surplus_batch_parallel()"""
+    global _batch_worker_behaviour  # noqa: PLW0603
+    _batch_worker_behaviour = behaviour_factory()
+
+
+def _run_batch_chunk(lines: list[str]) -> list[tuple[str, Result[str]]]:
+    """(internal function) process pool task for surplus_batch_parallel()"""
+
+    if _batch_worker_behaviour is None:
+        msg = "batch worker was not initialised with a behaviour"
+        raise RuntimeError(msg)
+
+    return list(surplus_batch(lines, _batch_worker_behaviour))
+
+
+def surplus_batch_parallel(
+    queries: Iterable[str],
+    behaviour_factory: Callable[[], Behaviour],
+    workers: int | None = None,
+    *,
+    ordered: bool = True,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+) -> Iterator[tuple[str, Result[str]]]:
+    """
+    function that converts many query strings like surplus_batch(), spread across worker
+    processes, for when conversions are bound by cpu rather than by geocoding, such as
+    with an offline reverser, a cassette or a self-hosted Nominatim without a rate limit
+
+    arguments
+        queries: Iterable[str]
+            query strings, e.g., lines of a file or stdin
+        behaviour_factory: Callable[[], Behaviour]
+            picklable function, like a module-level function, called once in every worker
+            process to create its behaviour and with it its own geocoding objects. do not
+            record cassettes with it, as every worker would append to the same file
+        workers: int | None = None
+            number of worker processes, defaulting to one per cpu if None
+        ordered: bool = True
+            whether results are yielded in input order, or as their chunks are converted
+        chunk_size: int = BATCH_CHUNK_SIZE
+            queries sent to a worker at once
+
+    returns Iterator[tuple[str, Result[str]]]
+        (stripped query string, result) pairs. queries are read a few chunks per worker
+        ahead of the results consumed
+
+    usage
+        def offline_behaviour() -> Behaviour:
+            return Behaviour(reverser=SurplusOfflineReverser(Path("sg.pack")).reverser)
+
+        for query, result in surplus_batch_parallel(lines, offline_behaviour):
+            ...
+    """
+
+    from concurrent.futures import (  # noqa: PLC0415
+        FIRST_COMPLETED,
+        ProcessPoolExecutor,
+        wait,
+    )
+
+    workers = workers or cpu_count() or 1
+    lines = iter(queries)
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_batch_worker,
+        initargs=(behaviour_factory,),
+    ) as executor:
+        pending: deque[Future[list[tuple[str, Result[str]]]]] = deque()
+
+        def submit() -> None:
+            """(internal function) sends the next chunk of queries to a worker, if any"""
+            if chunk := list(islice(lines, chunk_size)):
+                pending.append(executor.submit(_run_batch_chunk, chunk))
+
+        try:
+            for _ in range(2 * workers):
+                submit()
+
+            while pending:
+                if ordered:
+                    finished = [pending.popleft()]
+
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    finished = [future for future in pending if future in done]
+                    for future in finished:
+                        pending.remove(future)
+
+                for future in finished:
+                    results = future.result()
+                    submit()
+                    yield from results
+
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _format_batch_record(
+    query: str,
+    result: Result[str],
+    batch_format: BatchOutputFormatEnum,
+    *,
+    json_result: bool = False,
+) -> str:
+    """
+    (internal function) formats a batch mode result as a single line, without a newline.
+    if json_result is True, ndjson records embed result values as json objects instead of
+    strings, for conversions to several types
+    """
+
+    match batch_format:
+        case BatchOutputFormatEnum.NDJSON:
+            return json_dumps(
+                {
+                    "query": query,
+                    "result": (
+                        (json_loads(result.value) if json_result else result.value)
+                        if result
+                        else None
+                    ),
+                    "error": None if result else result.cry(string=True),
+                },
+                ensure_ascii=False,
+            )
+
+        case BatchOutputFormatEnum.TSV:
+            return "\t".join(
+                field.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+                for field in (
+                    query,
+                    "ok" if result else "error",
+                    result.value if result else result.cry(string=True),
+                )
+            )
+
+        case _:
+            msg = f"unknown batch format '{batch_format}' (expected a BatchOutputFormatEnum)"
+            raise NotImplementedError(msg)
+
+
+# bulk plus code conversion
+
+_PLUS_CODE_CHUNK_SIZE: Final[int] = 65536  # rows converted at once when streaming csv
+
+
+def _import_numpy() -> Any | None:  # noqa: ANN401
+    """(internal function) returns the numpy module, or None if it is not installed"""
+    try:
+        import numpy  # type: ignore  # noqa: ICN001, PGH003, PLC0415
+
+    except ImportError:
+        return None
+
+    return numpy
+
+
+def _is_numpy_array(value: object) -> bool:
+    """(internal function) checks if a value is a numpy array without importing numpy"""
+    return type(value).__module__ == "numpy" and type(value).__name__ == "ndarray"
+
+
+def _encode_many_numpy(
+    np: Any,  # noqa: ANN401
+    latitudes: Any,  # noqa: ANN401
+    longitudes: Any,  # noqa: ANN401
+    code_length: int,
+) -> Any:  # noqa: ANN401
+    """(internal function) vectorised encode_many() implementation using numpy"""
+
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    valid = np.isfinite(latitudes) & np.isfinite(longitudes)
+
+    # clip latitudes, and nudge the north pole into the topmost cell
+    latitudes = np.clip(np.where(valid, latitudes, 0.0), -90, 90)
+    latitudes = np.where(
+        latitudes == 90,  # noqa: PLR2004
+        latitudes - _codec.LAT_PRECISIONS[code_length],
+        latitudes,
+    )
+    # normalise longitudes into [0, 360) degrees east of the antimeridian
+    shifted_longitudes = np.mod(np.where(valid, longitudes, 0.0) + 180, 360)
+
+    # integer grid positions at the finest precision, rounded like the reference library
+    lat_values = np.floor(np.round((latitudes + 90) * _codec.FINAL_LAT_PRECISION, 6))
+    lon_values = np.floor(np.round(shifted_longitudes * _codec.FINAL_LON_PRECISION, 6))
+    lat_values, lon_values = lat_values.astype(np.int64), lon_values.astype(np.int64)
+
+    alphabet = np.frombuffer(_codec.ALPHABET.encode("ascii"), dtype=np.uint8)
+    chars = np.full((len(lat_values), 16), ord("0"), dtype=np.uint8)
+    chars[:, 8] = ord("+")
+
+    # grid digits (characters 11-15), least significant first
+    if code_length > 10:  # noqa: PLR2004
+        for position in range(15, 10, -1):
+            chars[:, position] = alphabet[(lat_values % 5) * 4 + (lon_values % 4)]
+            lat_values //= 5
+            lon_values //= 4
+    else:
+        lat_values //= 5**5
+        lon_values //= 4**5
+
+    # pair digits (characters 1-10, around the separator), least significant first
+    for pair in range(4, -1, -1):
+        lat_position = pair * 2 + (1 if pair >= 4 else 0)  # noqa: PLR2004
+        chars[:, lat_position] = alphabet[lat_values % 20]
+        chars[:, lat_position + 1] = alphabet[lon_values % 20]
+        lat_values //= 20
+        lon_values //= 20
+
+    # padded codes keep their zeros and separator, longer codes are truncated
+    width = code_length + 1 if (code_length >= 8) else 9  # noqa: PLR2004
+    if code_length < 8:  # noqa: PLR2004
+        chars[:, code_length:8] = ord("0")
+
+    codes = np.ascontiguousarray(chars[:, :width]).view(f"S{width}").ravel()
+    return np.where(valid, codes.astype(f"U{width}"), "")
+
+
+def _decode_many_numpy(np: Any, codes: Any) -> tuple[Any, Any]:  # noqa: ANN401
+    """(internal function) vectorised decode_many() implementation using numpy"""
+
+    codes = np.char.upper(np.asarray(codes, dtype=np.str_))
+    n = len(codes)
+    if n == 0:
+        return np.empty(0), np.empty(0)
+
+    byte_codes = codes.astype("S")  # raises UnicodeEncodeError for non-ascii codes
+    width = max(16, byte_codes.dtype.itemsize)
+    chars = np.zeros((n, width), dtype=np.uint8)
+    chars[:, : byte_codes.dtype.itemsize] = byte_codes.view(np.uint8).reshape(n, -1)
+
+    # character -> digit value, 20 for padding, 21 for the separator, 22 for none
+    table = np.full(256, 255, dtype=np.uint8)
+    table[np.frombuffer(_codec.ALPHABET.encode("ascii"), dtype=np.uint8)] = np.arange(20)
+    table[ord("0")], table[ord("+")], table[0] = 20, 21, 22
+    values = table[chars]
+
+    before = values[:, :8]
+    after = values[:, 9:]
+    is_digit_before = before < 20  # noqa: PLR2004
+    is_digit_after = after < 20  # noqa: PLR2004
+
+    # digits before the separator, then optional (even) padding up to the separator
+    n_before = np.argmin(np.c_[is_digit_before, np.zeros(n, dtype=bool)], axis=1)
+    padded = n_before < 8  # noqa: PLR2004
+    padding_ok = np.all(
+        (before == 20) | (np.arange(8) < n_before[:, None]),  # noqa: PLR2004
+        axis=1,
+    )
+
+    # digits after the separator, then nothing
+    n_after = np.argmin(np.c_[is_digit_after, np.zeros(n, dtype=bool)], axis=1)
+    nothing_after = np.all(
+        (after == 22) | (np.arange(after.shape[1]) < n_after[:, None]),  # noqa: PLR2004
+        axis=1,
+    )
+
+    valid = (
+        (values[:, 8] == 21)  # noqa: PLR2004
+        & padding_ok
+        & nothing_after
+        & (n_before >= 2)  # noqa: PLR2004
+        & (n_before % 2 == 0)
+        & ~(padded & (n_after > 0))
+        & (n_after != 1)
+        & (before[:, 0] * 20 < 180)  # noqa: PLR2004
+        & (before[:, 1] * 20 < 360)  # noqa: PLR2004
+    )
+
+    digits_before = np.where(is_digit_before, before, 0)
+    digits = np.c_[digits_before, np.where(is_digit_after, after, 0)].astype(np.int64)
+    n_digits = np.minimum(np.where(padded, n_before, 8 + n_after), 15)
+
+    normal_lat = np.full(n, -90 * _codec.PAIR_PRECISION, dtype=np.int64)
+    normal_lon = np.full(n, -180 * _codec.PAIR_PRECISION, dtype=np.int64)
+    pair_place_value = np.zeros(n, dtype=np.int64)
+    for pair in range(5):
+        used = n_digits > pair * 2
+        place_value = 20 ** (4 - pair)
+        normal_lat += np.where(used, digits[:, pair * 2] * place_value, 0)
+        normal_lon += np.where(used, digits[:, pair * 2 + 1] * place_value, 0)
+        pair_place_value = np.where(used, place_value, pair_place_value)
+
+    grid_lat = np.zeros(n, dtype=np.int64)
+    grid_lon = np.zeros(n, dtype=np.int64)
+    row_place_value = np.zeros(n, dtype=np.int64)
+    col_place_value = np.zeros(n, dtype=np.int64)
+    for grid in range(5):
+        used = n_digits > 10 + grid
+        grid_lat += np.where(used, (digits[:, 10 + grid] // 4) * 5 ** (4 - grid), 0)
+        grid_lon += np.where(used, (digits[:, 10 + grid] % 4) * 4 ** (4 - grid), 0)
+        row_place_value = np.where(used, 5 ** (4 - grid), row_place_value)
+        col_place_value = np.where(used, 4 ** (4 - grid), col_place_value)
+
+    has_grid = n_digits > 10  # noqa: PLR2004
+    lat_precision = np.where(
+        has_grid,
+        row_place_value / _codec.FINAL_LAT_PRECISION,
+        pair_place_value / _codec.PAIR_PRECISION,
+    )
+    lon_precision = np.where(
+        has_grid,
+        col_place_value / _codec.FINAL_LON_PRECISION,
+        pair_place_value / _codec.PAIR_PRECISION,
+    )
+
+    south = normal_lat / _codec.PAIR_PRECISION + grid_lat / _codec.FINAL_LAT_PRECISION
+    west = normal_lon / _codec.PAIR_PRECISION + grid_lon / _codec.FINAL_LON_PRECISION
+    latitudes = np.round(
+        np.minimum((np.round(south, 14) + np.round(south + lat_precision, 14)) / 2, 90), 14
+    )
+    longitudes = np.round(
+        np.minimum((np.round(west, 14) + np.round(west + lon_precision, 14)) / 2, 180), 14
+    )
+
+    return np.where(valid, latitudes, np.nan), np.where(valid, longitudes, np.nan)
+
+
+def _check_code_length(code_length: int) -> None:
+    """(internal function) raises ValueError if a Plus Code length is not encodable"""
+    if code_length not in _codec.LAT_PRECISIONS:
+        msg = f"invalid Plus Code length {code_length}, expected 2-8 (even) or 10-15"
+        raise ValueError(msg)
+
+
+def encode_many(
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    code_length: int = 10,
+) -> Sequence[str]:
+    """
+    function that encodes many coordinates into Plus Codes at once, without any network
+    access. uses numpy if it is installed, else falls back to encoding one by one
+
+    arguments
+        latitudes: Sequence[float]
+            latitudes in degrees, e.g., a list or a numpy array
+        longitudes: Sequence[float]
+            longitudes in degrees, same length as latitudes
+        code_length: int = 10
+            Plus Code length, 2-8 (even) or 10-15
+
+    returns Sequence[str]
+        Plus Codes in input order, or empty strings for non-finite coordinates. a numpy
+        array if either input was a numpy array, else a list
+    """
+
+    _check_code_length(code_length)
+
+    if len(latitudes) != len(longitudes):
+        msg = f"got {len(latitudes)} latitudes but {len(longitudes)} longitudes"
+        raise ValueError(msg)
+
+    if (np := _import_numpy()) is not None:
+        codes = _encode_many_numpy(np, latitudes, longitudes, code_length)
+        if _is_numpy_array(latitudes) or _is_numpy_array(longitudes):
+            return codes
+        return codes.tolist()
+
+    return [
+        _codec.encode(latitude, longitude, code_length)
+        if isfinite(latitude) and isfinite(longitude)
+        else ""
+        for latitude, longitude in zip(map(float, latitudes), map(float, longitudes), strict=True)
+    ]
+
+
+def decode_many(codes: Sequence[str]) -> tuple[Sequence[float], Sequence[float]]:
+    """
+    function that decodes many full-length Plus Codes into the coordinates of their
+    centres at once, without any network access. uses numpy if it is installed, else
+    falls back to decoding one by one
+
+    arguments
+        codes: Sequence[str]
+            full-length Plus Codes, e.g., a list or a numpy array
+
+    returns tuple[Sequence[float], Sequence[float]]
+        latitudes and longitudes in input order, or NaN for codes that are not valid
+        full-length Plus Codes. numpy arrays if codes was a numpy array, else lists
+    """
+
+    if (np := _import_numpy()) is not None:
+        try:
+            latitudes, longitudes = _decode_many_numpy(np, codes)
+
+        except UnicodeEncodeError:
+            pass  # non-ascii codes are invalid, let the fallback handle them
+
+        else:
+            if _is_numpy_array(codes):
+                return latitudes, longitudes
+            return latitudes.tolist(), longitudes.tolist()
+
+    latitudes, longitudes = [], []
+
+    for code in map(str, codes):
+        if not _codec.is_full(code):
+            latitudes.append(nan)
+            longitudes.append(nan)
+            continue
+
+        area = _codec.decode(code)
+        latitudes.append(area.latitude)
+        longitudes.append(area.longitude)
+
+    return latitudes, longitudes
+
+
+def _convert_csv(
+    rows: Iterable[str],
+    output: TextIO,
+    behaviour: Behaviour,
+    columns: tuple[str, ...] = (),
+) -> int:
+    """
+    (internal function) streams a csv file with a header row, appending Plus Code or
+    latlong columns converted from the named columns, or the default columns for the
+    conversion type if none are named. returns an exit code int
+    """
+
+    from csv import reader as csv_reader  # noqa: PLC0415
+    from csv import writer as csv_writer  # noqa: PLC0415
+
+    reader = csv_reader(rows)
+    writer = csv_writer(output, lineterminator="\n")
+
+    match behaviour.convert_to_type:
+        case ConversionResultTypeEnum.PLUS_CODE:
+            input_columns = columns or ("latitude", "longitude")
+            output_columns: tuple[str, ...] = ("pluscode",)
+
+        case ConversionResultTypeEnum.LATLONG:
+            input_columns = columns or ("pluscode",)
+            output_columns = ("latitude", "longitude")
+
+        case _:
+            print(
+                "error: csv mode only converts to "
+                f"'{ConversionResultTypeEnum.PLUS_CODE.value}' or "
+                f"'{ConversionResultTypeEnum.LATLONG.value}'",
+                file=behaviour.stderr,
+            )
+            return -1
+
+    header = next(reader, None)
+    if header is None:
+        return 0
+
+    expected_columns = 2 if (output_columns == ("pluscode",)) else 1
+    if len(input_columns) != expected_columns:
+        print(
+            f"error: csv mode expects {expected_columns} input column name(s) for "
+            f"'{behaviour.convert_to_type.value}', got {len(input_columns)}",
             file=behaviour.stderr,
         )
+        return -1
 
-    # check if termux-location json
-    if behaviour.using_termux_location:
-        try:
-            termux_location_json = json_loads(original_query)
-            if not isinstance(termux_location_json, dict):
-                msg = "parsed termux-location json is not a dict"
-                raise TypeError(msg)  # noqa: TRY301
+    if missing := [column for column in input_columns if column not in header]:
+        print(f"error: csv header is missing column(s) {missing}", file=behaviour.stderr)
+        return -1
 
-            return Result[Query](
-                LatlongQuery(
-                    Latlong(
-                        latitude=termux_location_json["latitude"],
-                        longitude=termux_location_json["longitude"],
-                    )
+    input_indices = [header.index(column) for column in input_columns]
+    output_indices: list[int] = []
+    for column in output_columns:
+        if column not in header:
+            header.append(column)
+        output_indices.append(header.index(column))
+
+    writer.writerow(header)
+    exit_code: int = 0
+
+    def _float(row: list[str], index: int) -> float:
+        try:
+            return float(row[index])
+        except (IndexError, ValueError):
+            return nan
+
+    while chunk := list(islice(reader, _PLUS_CODE_CHUNK_SIZE)):
+        if len(input_indices) == 2:  # noqa: PLR2004
+            converted: list[Sequence[Any]] = [
+                encode_many(
+                    [_float(row, input_indices[0]) for row in chunk],
+                    [_float(row, input_indices[1]) for row in chunk],
+                )
+            ]
+        else:
+            converted = list(
+                decode_many(
+                    [
+                        row[input_indices[0]] if (len(row) > input_indices[0]) else ""
+                        for row in chunk
+                    ]
                 )
             )
 
-        except (JSONDecodeError, TypeError):
-            return Result[Query](
-                LatlongQuery(EMPTY_LATLONG),
-                error=ValueError("could not parse termux-location json"),
-            )
+        for row_index, row in enumerate(chunk):
+            row.extend([""] * (len(header) - len(row)))
+            for values, index in zip(converted, output_indices, strict=True):
+                value: str | float = values[row_index]
+                if (value == "") or (isinstance(value, float) and isnan(value)):
+                    exit_code = -2
+                    value = ""
+                row[index] = str(value)
 
-        except KeyError:
-            return Result[Query](
-                LatlongQuery(EMPTY_LATLONG),
-                error=ValueError(
-                    "could not get 'latitude' or 'longitude' keys from termux-location json"
-                ),
-            )
+        writer.writerows(chunk)
 
-        except Exception as exc:  # noqa: BLE001
-            return Result[Query](
-                LatlongQuery(EMPTY_LATLONG),
-                error=exc,
-            )
+    output.flush()
+    return exit_code
 
-        # unreachable
 
-    # not a plus/local code/termux-location json,
-    # try to match for latlong or string query
-    match split_query:
-        case [single]:
-            # possibly a:
-            #   comma-seperated single-word-long latlong coord
-            #   (fallback) single word string query
+# conversion daemon
 
-            if "," not in single:  # no comma, not a latlong coord
-                return Result[Query](StringQuery(original_query))
+_SOCKET_CONNECT_TIMEOUT_SECONDS: Final[float] = 1.0
+_SOCKET_MAX_REQUEST_BYTES: Final[int] = 1024 * 1024
+_SERVER_MAX_USER_AGENTS: Final[int] = 32
 
-            # has comma, possibly a latlong coord
-            comma_split_single: list[str] = single.split(",")
 
-            if len(comma_split_single) == 2:  # noqa: PLR2004
-                try:  # try to type cast query
-                    latitude = float(comma_split_single[0].strip(","))
-                    longitude = float(comma_split_single[-1].strip(","))
-
-                except ValueError:  # not a latlong coord, fallback
-                    return Result[Query](StringQuery(single))
-
-                else:  # are floats, so is a latlong coord
-                    return Result[Query](
-                        LatlongQuery(
-                            Latlong(
-                                latitude=latitude,
-                                longitude=longitude,
-                            )
-                        )
-                    )
+def _version_string() -> str:
+    """(internal function) returns the full surplus version string, e.g., 2024.0.0-beta"""
+    return ".".join([str(v) for v in VERSION]) + VERSION_SUFFIX
 
-            # not a latlong coord, fallback
-            return Result[Query](StringQuery(original_query))
 
-        case [left_single, right_single]:
-            # possibly a:
-            #   space-seperated latlong coord
-            #   (fallback) space-seperated string query
+def _request_behaviour(request: object, behaviour: Behaviour) -> Result[Behaviour]:
+    """
+    (internal function) validates a json conversion request, returning behaviour with the
+    query, conversion type and flags of the request
+    """
 
-            try:  # try to type cast query
-                latitude = float(left_single.strip(","))
-                longitude = float(right_single.strip(","))
+    if not isinstance(request, dict):
+        return Result[Behaviour](behaviour, error=ValueError("request is not a json object"))
 
-            except ValueError:  # not a latlong coord, fallback
-                return Result[Query](StringQuery(original_query))
+    query = request.get("query", "")
+    using_termux_location = request.get("using_termux_location") is True
 
-            else:  # are floats, so is a latlong coord
-                return Result[Query](LatlongQuery(Latlong(latitude=latitude, longitude=longitude)))
+    # termux-location output can be passed as is
+    if isinstance(query, dict):
+        query, using_termux_location = json_dumps(query), True
 
-        case _:
-            # possibly a:
-            #   (fallback) space-seperated string query
+    if not (
+        isinstance(query, str)
+        or (isinstance(query, list) and all(isinstance(part, str) for part in query))
+    ):
+        return Result[Behaviour](
+            behaviour, error=ValueError("'query' is not a string or a list of strings")
+        )
 
-            return Result[Query](StringQuery(original_query))
+    try:
+        convert_to_type = _parse_conversion_types(
+            request.get("convert_to", _conversion_types_value(behaviour.convert_to_type))
+        )
 
+    except ValueError as exc:
+        return Result[Behaviour](behaviour, error=exc)
+
+    return Result[Behaviour](
+        behaviour._replace(
+            query=query,
+            convert_to_type=convert_to_type,
+            using_termux_location=using_termux_location,
+            debug=request.get("debug") is True,
+        )
+    )
 
-def handle_args() -> Behaviour:
-    """
-    internal function that handles command-line arguments
 
-    returns Behaviour
-        program behaviour namedtuple
+def _convert_request(request: object, behaviour: Behaviour) -> tuple[int, dict[str, Any]]:
+    """
+    (internal function) runs a json conversion request with the geocoding functions of
+    behaviour, returning the command-line exit code and a json-serialisable response with
+    the result, error message, and anything written to stderr (e.g., debug output)
     """
 
-    parser = ArgumentParser(
-        prog="surplus",
-        description=__doc__[__doc__.find(":") + 2 : __doc__.find("\n", 1)],
-    )
-    parser.add_argument(
-        "query",
-        type=str,
-        help=(
-            "full-length Plus Code (6PH58QMF+FX), "
-            "shortened Plus Code/'local code' (8QMF+FX Singapore), "
-            "latlong (1.3336875, 103.7749375), "
-            "string query (e.g., 'Wisma Atria'), "
-            "or '-' to read from stdin"
-        ),
-        nargs="*",
-    )
-    parser.add_argument(
-        "-d",
-        "--debug",
-        action="store_true",
-        default=False,
-        help="prints lat, long and reverser response dict to stderr",
-    )
-    parser.add_argument(
-        "-v",
-        "--version",
-        action="store_true",
-        default=False,
-        help="prints version information to stderr and exits",
-    )
-    (
-        parser.add_argument(
-            "-c",
-            "--convert-to",
-            type=str,
-            choices=[str(v.value) for v in ConversionResultTypeEnum],
-            help=(
-                "converts query a specific output type, defaults to "
-                f"'{Behaviour([]).convert_to_type.value}'"
-            ),
-            default=Behaviour([]).convert_to_type.value,
-        ),
-    )
-    parser.add_argument(
-        "-u",
-        "--user-agent",
-        type=str,
-        help=(
-            "user agent string to use for geocoding service, "
-            "defaults to fingerprinted user agent string"
-        ),
-        default=default_fingerprint,
-    )
-    parser.add_argument(
-        "--show-user-agent",
-        action="store_true",
-        default=False,
-        help="prints fingerprinted user agent string and exits",
-    )
-    parser.add_argument(
-        "-t",
-        "--using-termux-location",
-        action="store_true",
-        default=False,
-        help="treats input as a termux-location output json string, and parses it accordingly",
-    )
+    captured = StringIO()
+    response: dict[str, Any] = {
+        "query": request.get("query") if isinstance(request, dict) else None,
+        "result": None,
+        "error": None,
+        "stderr": "",
+    }
 
-    # initialisation
-    args = parser.parse_args()
-    query: str | list[str] = ""
+    def _respond(exit_code: int, result: Result[Any]) -> tuple[int, dict[str, Any]]:
+        if result:
+            response["result"] = result.value
+
+        else:
+            response["error"] = result.cry(string=True)
+            if behaviour.debug and isinstance(result.error, BaseException):
+                from traceback import format_exception  # noqa: PLC0415
 
-    # "-" stdin check
-    query = "\n".join([line.strip() for line in stdin]) if (args.query == ["-"]) else args.query
+                captured.write("".join(format_exception(result.error)))
 
-    # setup structures and return
-    geocoding = SurplusDefaultGeocoding(args.user_agent)
-    return Behaviour(
-        query=query,
-        geocoder=geocoding.geocoder,
-        reverser=geocoding.reverser,
-        stderr=stderr,
-        stdout=stdout,
-        debug=args.debug,
-        version_header=args.version,
-        convert_to_type=ConversionResultTypeEnum(args.convert_to),
-        using_termux_location=args.using_termux_location,
-        show_user_agent=args.show_user_agent,
+        response["stderr"] = captured.getvalue()
+        return exit_code, response
+
+    request_behaviour = _request_behaviour(
+        request, behaviour._replace(stderr=captured, stdout=captured)
     )
+    if not request_behaviour:
+        return _respond(-1, request_behaviour)
+
+    behaviour = request_behaviour.get()
+    query = parse_query(behaviour=behaviour)
 
+    if behaviour.debug:
+        print(f"debug: cli: {query=}", file=behaviour.stderr)
 
-def _unique(container: Sequence[str]) -> list[str]:
-    """(internal function) returns a in-order unique list from list"""
-    unique: OrderedDict = OrderedDict()
-    for line in container:
-        unique.update({line: None})
-    return list(unique.keys())
+    if not query:
+        return _respond(-1, query)
 
+    text = surplus(query=query.get(), behaviour=behaviour)
+    return _respond(0 if text else -2, text)
 
-def _generate_text(
-    location: dict[str, Any],
-    behaviour: Behaviour,
-    mode: TextGenerationEnum = TextGenerationEnum.SHAREABLE_TEXT,
-    debug: bool = False,  # noqa: FBT001, FBT002
-) -> str:
+
+@dataclass
+class _UserAgentBehaviours:
     """
-    (internal function) generate shareable text from location dict
+    (internal use) behaviours of serve_socket() and serve_http() for the user agents
+    requests ask for, keeping the most recently used _SERVER_MAX_USER_AGENTS
+    """
+
+    behaviour: Behaviour
+    _user_agents: OrderedDict[str, Behaviour] = field(default_factory=OrderedDict, repr=False)
+    _lock: Lock = field(default_factory=Lock, repr=False)
+
+    def behaviour_for(self, user_agent: str) -> Result[Behaviour]:
+        """
+        method that returns the server behaviour with geocoding functions using a user
+        agent, or the server behaviour itself for an empty user agent. geocoding objects
+        for other user agents are copies of the server's SurplusDefaultGeocoding object,
+        sharing its persistent cache and rate limiter
+        """
+
+        if user_agent == "":
+            return Result[Behaviour](self.behaviour)
+
+        geocoding = getattr(self.behaviour.geocoder, "__self__", None)
+        if not isinstance(geocoding, SurplusDefaultGeocoding):
+            return Result[Behaviour](
+                self.behaviour,
+                error=ValueError("this server does not take user agents"),
+            )
+
+        with self._lock:
+            if (behaviour := self._user_agents.get(user_agent)) is not None:
+                self._user_agents.move_to_end(user_agent)
+                return Result[Behaviour](behaviour)
+
+            user_agent_geocoding = replace(geocoding, user_agent=user_agent, _first_update=False)
+            behaviour = self.behaviour._replace(
+                geocoder=user_agent_geocoding.geocoder,
+                reverser=(
+                    user_agent_geocoding.reverser
+                    if (self.behaviour.reverser == geocoding.reverser)
+                    else self.behaviour.reverser
+                ),
+            )
+
+            self._user_agents[user_agent] = behaviour
+            if len(self._user_agents) > _SERVER_MAX_USER_AGENTS:
+                self._user_agents.popitem(last=False)
+
+            return Result[Behaviour](behaviour)
+
+    def convert(self, request: object) -> tuple[int, dict[str, Any]]:
+        """
+        method that runs a json conversion request with the behaviour for its "user_agent",
+        returning the command-line exit code and a response, see _convert_request()
+        """
+
+        user_agent = request.get("user_agent", "") if isinstance(request, dict) else ""
+        behaviour = (
+            self.behaviour_for(user_agent)
+            if isinstance(user_agent, str)
+            else Result[Behaviour](self.behaviour, error=ValueError("'user_agent' is not a string"))
+        )
+
+        if not behaviour:
+            return -1, {
+                "query": request.get("query") if isinstance(request, dict) else None,
+                "result": None,
+                "error": behaviour.cry(string=True),
+                "stderr": "",
+            }
+
+        return _convert_request(request, behaviour.get())
+
+
+def _serve_connection(connection: "socket.socket", user_agents: _UserAgentBehaviours) -> None:
+    """(internal function) answers one conversion request from a unix socket connection"""
+
+    behaviour = user_agents.behaviour
+
+    with connection:
+        with connection.makefile("rb") as file:
+            line = file.readline(_SOCKET_MAX_REQUEST_BYTES)
+
+        if line == b"":  # connected and closed without a request, e.g., serve_socket()
+            return
+
+        try:
+            request = json_loads(line)
+
+        except ValueError:
+            request = None
+
+        # clients of another version convert in-process instead, see _convert_via_socket()
+        version = _version_string()
+        if isinstance(request, dict) and (request.get("version") != version):
+            response: dict[str, Any] = {"version": version}
+
+        else:
+            exit_code, response = user_agents.convert(request)
+            response.update({"version": version, "exit_code": exit_code})
+
+        if behaviour.debug:
+            print(
+                f"debug: serve_socket: {request=} -> {response.get('exit_code')}",
+                file=behaviour.stderr,
+            )
+
+        try:
+            connection.sendall(json_dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+
+        except OSError:  # client went away
+            return
+
+
+def serve_socket(path: Path, behaviour: Behaviour) -> None:
+    """
+    function that serves conversion requests on a unix socket until interrupted, sharing
+    the geocoding functions of behaviour, and so their caches and rate limiters, across
+    every request. connections are handled concurrently, one thread each
+
+    a request is one line of json, answered with one line of json before the connection is
+    closed. a request has a "query" string, list of strings or termux-location json object,
+    and optionally "convert_to" (a ConversionResultTypeEnum value), "using_termux_location"
+    and "debug" booleans, a "user_agent" for the geocoding service, and the "version" of the
+    client. a response has the "query", "result" (or null), "error" message (or null),
+    captured "stderr", command-line "exit_code", and daemon "version". if the client
+    version differs, the response only has the daemon version
 
     arguments
-        location: dict[str, Any]
-            dictionary from geocoding reverser function
+        path: Path
+            where to create the socket. a stale socket left by a daemon that is no longer
+            running is replaced
         behaviour: Behaviour
-            surplus behaviour
-        mode: GenerationModeEnum = GenerationModeEnum.SHAREABLE_TEXT
-                generation mode, defaults to shareable text generation
-        debug: bool = False
-            behaviour-seperate debug flag because this function is called twice by
-            surplus in debug mode, one for debug and one for non-debug output
+            surplus behaviour namedtuple, whose geocoding functions are used for every
+            request. requests with a user agent use copies of behaviour.geocoder's
+            SurplusDefaultGeocoding object, as with serve_http(). if behaviour.debug is True,
+            every request is logged to behaviour.stderr
+
+    raises FileExistsError if another daemon is serving on path, NotImplementedError if
+    unix sockets are not supported by the platform, or OSError if the socket cannot be
+    created
+    """
 
-    returns str
+    import socket  # noqa: PLC0415
+
+    if not hasattr(socket, "AF_UNIX"):
+        msg = "unix sockets are not supported on this platform"
+        raise NotImplementedError(msg)
+
+    if path.is_socket():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(path))
+
+            except OSError:  # stale
+                path.unlink(missing_ok=True)
+
+            else:
+                msg = f"a surplus daemon is already serving on '{path}'"
+                raise FileExistsError(msg)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(path))
+
+        try:
+            path.chmod(0o600)
+            server.listen()
+
+            if behaviour.debug:
+                print(f"debug: serve_socket: serving on '{path}'", file=behaviour.stderr)
+
+            user_agents = _UserAgentBehaviours(behaviour)
+            while True:
+                connection, _ = server.accept()
+                Thread(
+                    target=_serve_connection,
+                    args=(connection, user_agents),
+                    daemon=True,
+                ).start()
+
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def _convert_via_socket(path: Path, behaviour: Behaviour) -> dict[str, Any] | None:
+    """
+    (internal function) sends behaviour's query to a daemon serving on a unix socket,
+    returning its response, or None if no daemon of the same version answered
     """
 
-    def _generate_text_line(
-        line_number: int,
-        line_keys: Sequence[str],
-        separator: str = ", ",
-        filter_func: Callable[[str], list[bool]] = lambda _: [True],
-    ) -> str:
-        """
-        (internal function) generate a line of shareable text from a list of keys
+    import socket  # noqa: PLC0415
 
-        arguments
-            line_number: int
-                line number to prefix with
-            line_keys: Sequence[str]
-                list of keys to .get() from location dict
-            separator: str = ", "
-                separator to join elements with
-            filter_func: Callable[[str], list[bool]] = lambda e: True
-                function that takes in a string and returns a list of bools, used to
-                filter elements from line_keys. list will be passed to all(). if all
-                returns True, then the element is kept.
+    if not hasattr(socket, "AF_UNIX"):
+        return None
 
-        returns str
-        """
+    geocoding = getattr(behaviour.geocoder, "__self__", None)
+    request = {
+        "version": _version_string(),
+        "query": behaviour.query,
+        "convert_to": _conversion_types_value(behaviour.convert_to_type),
+        "using_termux_location": behaviour.using_termux_location,
+        "debug": behaviour.debug,
+        "user_agent": (
+            geocoding.user_agent if isinstance(geocoding, SurplusDefaultGeocoding) else ""
+        ),
+    }
 
-        line_prefix: str = f"{line_number}\t" if debug else ""
-        basket: list[str] = []
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(_SOCKET_CONNECT_TIMEOUT_SECONDS)
+            client.connect(str(path))
 
-        for detail in _unique([str(location.get(detail, "")) for detail in line_keys]):
-            if detail == "":
-                continue
+            # conversions can take as long as the geocoding service does
+            client.settimeout(None)
+            client.sendall(json_dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
 
-            # filtering: if all(filter_func(detail)) returns True,
-            #            then the element is kept/added to 'basket'
+            with client.makefile("rb") as file:
+                response = json_loads(file.readline())
 
-            if filter_status := all(detail_check := filter_func(detail)) is True:
-                if debug:
-                    print(
-                        "debug: _generate_text_line: "
-                        f"{detail_check!s:<20} -> {filter_status!s:<5}  "
-                        f"--------  '{detail}'",
-                        file=behaviour.stderr,
-                    )
+    except (OSError, ValueError):
+        return None
 
-                basket.append(detail)
+    if (
+        (not isinstance(response, dict))
+        or (response.get("version") != request["version"])
+        or (not isinstance(response.get("exit_code"), int))
+    ):
+        return None
 
-            else:  # filter function returned False, so element is filtered/skipped
-                if debug:
-                    print(
-                        "debug: _generate_text_line: "
-                        f"{detail_check!s:<20} -> {filter_status!s:<5}"
-                        f"  filtered  '{detail}'",
-                        file=behaviour.stderr,
-                    )
-                continue
+    return response
 
-        line = line_prefix + separator.join(basket)
-        return (line + "\n") if (line != "") else ""
 
-    C = TypeVar("C")
+# http server
 
-    def stget(split_iso3166_2: list[str], line_keys: dict[str, C]) -> tuple[bool, C]:
-        """
-        (internal function)
+_HTTP_MAX_BODY_BYTES: Final[int] = 16 * 1024 * 1024
+_HTTP_STATUS_FOR_EXIT_CODE: Final[dict[int, int]] = {0: 200, -1: 400, -2: 422}
 
-        arguments:
-            split_iso3166_2: list[str]
-                the dash-split iso 3166-2 country code
 
-            line_keys:
-                the shareable text line keys dict to use
+@dataclass
+class _HttpServerState:
+    """
+    (internal use) state shared by every serve_http() request: the concurrency limits, and
+    the behaviours for the user agents requests ask for
+    """
 
-        returns tuple[bool, C]
-            bool: whether the a special key arrangement was used
-            C: dict content
-        """
+    behaviour: Behaviour
+    max_concurrency: int
+    max_client_concurrency: int
+    _conversions: BoundedSemaphore = field(init=False, repr=False)
+    _clients: dict[str, BoundedSemaphore] = field(default_factory=dict, repr=False)
+    _user_agents: "_UserAgentBehaviours" = field(init=False, repr=False)
+    _lock: Lock = field(default_factory=Lock, repr=False)
 
-        country: str = "default"
-        if len(iso3166_2) >= 1:
-            country = split_iso3166_2[0]
+    def __post_init__(self) -> None:
+        """method that creates the overall conversion semaphore and user agent behaviours"""
+        self._conversions = BoundedSemaphore(self.max_concurrency)
+        self._user_agents = _UserAgentBehaviours(self.behaviour)
 
-        if country not in line_keys:
-            return False, line_keys["default"]
+    def client(self, address: str) -> BoundedSemaphore:
+        """method that returns the conversion semaphore of a client address"""
 
-        return True, line_keys[country]
+        with self._lock:
+            if (semaphore := self._clients.get(address)) is None:
+                semaphore = self._clients[address] = BoundedSemaphore(self.max_client_concurrency)
 
-    # iso3166-2 handling: this allows surplus to have special key arrangements for a
-    #                     specific iso3166-2 code for edge cases
-    #                     (https://en.wikipedia.org/wiki/ISO_3166-2)
+            return semaphore
 
-    # get iso3166-2 before doing anything
-    iso3166_2: str = ""
-    for key in location:
-        if key.lower().startswith("iso3166"):
-            iso3166_2 = location.get(key, "")
+    def convert(self, request: object) -> tuple[int, dict[str, Any]]:
+        """
+        method that runs a json conversion request (see serve_http()) once fewer than
+        max_concurrency conversions are running, returning an exit code and a response
+        """
 
-    split_iso3166_2 = [part.upper() for part in iso3166_2.split("-")]
+        with self._conversions:
+            return self._user_agents.convert(request)
 
-    if debug:
-        print(
-            f"debug: _generate_text: {split_iso3166_2=}",
-            file=behaviour.stderr,
-        )
 
-    n_used_special: int = 0  # number of special key arrangements used
+def _read_http_lines(file: BufferedIOBase, length: int) -> Iterator[bytes]:
+    """(internal function) lazily reads the non-blank lines of a request body"""
 
-    # skeleton code to allow for changing keys based on iso3166-2 code
-    used_special, st_line0_keys = stget(split_iso3166_2, SHAREABLE_TEXT_LINE_0_KEYS)
-    n_used_special += used_special
+    while length > 0:
+        line = file.readline(length)
+        if line == b"":
+            return
 
-    used_special, st_line1_keys = stget(split_iso3166_2, SHAREABLE_TEXT_LINE_1_KEYS)
-    n_used_special += used_special
+        length -= len(line)
+        if line.strip() != b"":
+            yield line
 
-    used_special, st_line2_keys = stget(split_iso3166_2, SHAREABLE_TEXT_LINE_2_KEYS)
-    n_used_special += used_special
 
-    used_special, st_line3_keys = stget(split_iso3166_2, SHAREABLE_TEXT_LINE_3_KEYS)
-    n_used_special += used_special
+def _map_ordered(
+    pool: "Executor",
+    func: Callable[[Any], ResultType],
+    items: Iterable[Any],
+    window: int,
+) -> Iterator[ResultType]:
+    """
+    (internal function) like Executor.map(), but only reads up to window items ahead of the
+    results being consumed, so that items can be streamed in
+    """
 
-    used_special, st_line4_keys = stget(split_iso3166_2, SHAREABLE_TEXT_LINE_4_KEYS)
-    n_used_special += used_special
+    pending: deque[Future[ResultType]] = deque()
 
-    used_special, st_line5_keys = stget(split_iso3166_2, SHAREABLE_TEXT_LINE_5_KEYS)
-    n_used_special += used_special
+    for item in items:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
 
-    used_special, st_line6_keys = stget(split_iso3166_2, SHAREABLE_TEXT_LINE_6_KEYS)
-    n_used_special += used_special
+    while pending:
+        yield pending.popleft().result()
 
-    used_special, st_names = stget(split_iso3166_2, SHAREABLE_TEXT_NAMES)
-    n_used_special += used_special
 
-    used_special, st_locality = stget(split_iso3166_2, SHAREABLE_TEXT_LOCALITY)
-    n_used_special += used_special
+def serve_http(
+    address: tuple[str, int],
+    behaviour: Behaviour,
+    max_concurrency: int = HTTP_MAX_CONCURRENCY,
+    max_client_concurrency: int = HTTP_MAX_CLIENT_CONCURRENCY,
+) -> None:
+    """
+    function that serves a json conversion api over http until interrupted, running
+    conversions concurrently with the geocoding functions of behaviour, and so sharing their
+    caches and rate limiters
+
+    endpoints
+        GET /convert?query=...
+        POST /convert
+            converts one request, given as url parameters or a json object body, answering
+            with a json object. the status is 200 on success, 400 if the request or query
+            is invalid, 422 if the conversion failed, or 429 if the client already has
+            max_client_concurrency conversions running
+        POST /convert/batch
+            converts a body of newline-delimited requests (or plain json query strings),
+            streaming back one newline-delimited json response per request, in order. url
+            parameters are defaults for every request. up to max_client_concurrency
+            requests of a batch are converted at once
+
+    requests have a "query" string, list of strings or termux-location json object, and
+    optionally "convert_to" (a ConversionResultTypeEnum value), "using_termux_location"
+    and "debug" booleans, and a "user_agent" for the geocoding service. responses have the
+    "query", "result" (or null), "error" message (or null), and captured "stderr"
 
-    used_special, st_line_settings = stget(split_iso3166_2, SHAREABLE_TEXT_LINE_SETTINGS)
-    n_used_special += used_special
+    arguments
+        address: tuple[str, int]
+            host and port to listen on
+        behaviour: Behaviour
+            surplus behaviour namedtuple, whose geocoding functions are used for every
+            request. requests with a user agent use copies of behaviour.geocoder's
+            SurplusDefaultGeocoding object sharing its persistent cache and rate limiter,
+            so give it a SurplusSharedRateLimiter to keep one request budget across user
+            agents. if behaviour.debug is True, every request is logged to behaviour.stderr
+        max_concurrency: int = HTTP_MAX_CONCURRENCY
+            conversions to run at once across all clients, others wait for their turn
+        max_client_concurrency: int = HTTP_MAX_CLIENT_CONCURRENCY
+            conversions to run at once for one client address
+
+    raises OSError if the address cannot be listened on
+    """
 
-    if n_used_special and debug:
-        print(
-            "debug: _generate_text: "
-            f"using special key arrangements for '{iso3166_2}' (Singapore)",
-            file=behaviour.stderr,
-        )
+    from concurrent.futures import ThreadPoolExecutor  # noqa: PLC0415
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # noqa: PLC0415
+    from urllib.parse import parse_qsl, urlsplit  # noqa: PLC0415
 
-    # start generating text
-    match mode:
-        case TextGenerationEnum.SHAREABLE_TEXT:
-            text: list[str] = []
+    state = _HttpServerState(behaviour, max_concurrency, max_client_concurrency)
 
-            seen_names: list[str] = [
-                detail
-                for detail in _unique(
-                    [str(location.get(location_key, "")) for location_key in st_names]
-                )
-                if detail != ""
-            ]
+    class _SurplusHTTPRequestHandler(BaseHTTPRequestHandler):
+        """(internal use) request handler for serve_http()"""
 
-            if debug:
-                print(f"debug: _generate_text: {seen_names=}", file=behaviour.stderr)
+        server_version = f"surplus/{_version_string()}"
 
-            general_global_info: list[str] = [
-                str(location.get(detail, "")) for detail in st_line6_keys
-            ]
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401
+            """method that logs requests to behaviour.stderr in debug mode"""
+            if behaviour.debug:
+                print(f"debug: serve_http: {format % args}", file=behaviour.stderr)
 
-            for (
-                line_number,
-                line_keys,
-            ) in enumerate(
-                [
-                    st_line0_keys,
-                    st_line1_keys,
-                    st_line2_keys,
-                    st_line3_keys,
-                    st_line4_keys,
-                    st_line5_keys,
-                    st_line6_keys,
-                ]
-            ):
-                line_separator, line_filter = st_line_settings[line_number]
+        def _parameters(self) -> dict[str, Any]:
+            """method that returns the url parameters as a partial request"""
 
-                # filter: everything here should be True if the element is to be kept
-                if line_filter is False:
-                    _filter = lambda _: [True]  # noqa: E731
-                else:
-                    _filter = lambda ak: [  # noqa: E731
-                        ak not in general_global_info,
-                        not any(ak in sn for sn in seen_names),
-                    ]
+            parameters: dict[str, Any] = dict(parse_qsl(urlsplit(self.path).query))
+            for flag in ("using_termux_location", "debug"):
+                if flag in parameters:
+                    parameters[flag] = parameters[flag].lower() in ("1", "true", "yes")
 
-                text.append(
-                    _generate_text_line(
-                        line_number=line_number,
-                        line_keys=line_keys,
-                        separator=line_separator,
-                        filter_func=_filter,
-                    )
-                )
+            return parameters
 
-            return "".join(_unique(text)).rstrip()
+        def _send_json(self, status: int, body: dict[str, Any]) -> None:
+            """method that sends a json response"""
 
-        case TextGenerationEnum.LOCALITY_TEXT:
-            return _generate_text_line(
-                line_number=0,
-                line_keys=st_locality,
-            )
+            data = json_dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
 
-        case _:
-            msg = f"unknown mode '{mode}' (expected a TextGenerationEnum)"
-            raise NotImplementedError(msg)
+        def _send_error(self, status: int, message: str) -> None:
+            """method that sends a json error response"""
+            self._send_json(status, {"query": None, "result": None, "error": message})
 
+        def _convert(self, request: object) -> None:
+            """method that converts one request for the client, or refuses if busy"""
 
-def surplus(query: Query | str, behaviour: Behaviour) -> Result[str]:
-    """
-    query to shareable text conversion function
+            client = state.client(self.client_address[0])
+            if not client.acquire(blocking=False):
+                self._send_error(429, "too many concurrent conversions from this client")
+                return
 
-    query: Query | str
-        query object to convert or string to attempt to query for then convert
-    behaviour: Behaviour
-        surplus behaviour namedtuple
+            try:
+                exit_code, response = state.convert(request)
 
-    returns Result[str]
-    """
+            finally:
+                client.release()
 
-    if not isinstance(query, PlusCodeQuery | LocalCodeQuery | LatlongQuery | StringQuery):
-        query_result = parse_query(
-            behaviour=Behaviour(
-                query=str(query),
-                geocoder=behaviour.geocoder,
-                reverser=behaviour.reverser,
-                stderr=behaviour.stderr,
-                stdout=behaviour.stdout,
-                debug=behaviour.debug,
-                version_header=behaviour.version_header,
-                convert_to_type=behaviour.convert_to_type,
-            )
-        )
+            self._send_json(_HTTP_STATUS_FOR_EXIT_CODE.get(exit_code, 500), response)
 
-        if not query_result:
-            return Result[str]("", error=query_result.error)
+        def _convert_batch(self, length: int) -> None:
+            """method that converts newline-delimited requests, streaming the responses"""
 
-        query = query_result.get()
+            client = state.client(self.client_address[0])
+            defaults = self._parameters()
 
-    # operate on query
-    text: str = ""
+            def _convert_line(line: bytes) -> dict[str, Any]:
+                try:
+                    request = json_loads(line)
 
-    match behaviour.convert_to_type:
-        case ConversionResultTypeEnum.SHAREABLE_TEXT:
-            # get latlong and handle result
-            latlong_result: Result[Latlong] = query.to_lat_long_coord(geocoder=behaviour.geocoder)
+                except ValueError:
+                    request = None
 
-            if not latlong_result:
-                return Result[str]("", error=latlong_result.error)
+                if isinstance(request, str):
+                    request = {"query": request}
 
-            if behaviour.debug:
-                print(f"debug: {latlong_result.get()=}", file=behaviour.stderr)
+                if isinstance(request, dict):
+                    request = defaults | request
 
-            # reverse location and handle result
+                with client:
+                    return state.convert(request)[1]
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+
+            pool = ThreadPoolExecutor(max_workers=max_client_concurrency)
             try:
-                location = behaviour.reverser(latlong_result.get())
+                for response in _map_ordered(
+                    pool,
+                    _convert_line,
+                    _read_http_lines(self.rfile, length),
+                    window=max_client_concurrency * 2,
+                ):
+                    self.wfile.write(json_dumps(response, ensure_ascii=False).encode("utf-8"))
+                    self.wfile.write(b"\n")
+                    self.wfile.flush()
 
-            except Exception as exc:  # noqa: BLE001
-                return Result[str]("", error=exc)
+            except OSError:  # client went away
+                return
 
-            if behaviour.debug:
-                print(f"debug: {location=}", file=behaviour.stderr)
+            finally:
+                pool.shutdown(cancel_futures=True)
 
-            # generate text
-            if behaviour.debug:
-                print(
-                    _generate_text(
-                        location=location,
-                        behaviour=behaviour,
-                        debug=behaviour.debug,
-                    ),
-                    file=behaviour.stderr,
-                )
+        def do_GET(self) -> None:
+            """method that handles GET /convert"""
 
-            text = _generate_text(
-                location=location,
-                behaviour=behaviour,
-            )
+            if urlsplit(self.path).path != "/convert":
+                self._send_error(404, f"no such endpoint '{urlsplit(self.path).path}'")
+                return
 
-            return Result[str](text)
+            self._convert(self._parameters())
 
-        case ConversionResultTypeEnum.PLUS_CODE:
-            # if its already a plus code, just return it
-            if isinstance(query, PlusCodeQuery):
-                return Result[str](str(query))
+        def do_POST(self) -> None:
+            """method that handles POST /convert and POST /convert/batch"""
 
-            # get latlong and handle result
-            latlong_query = query.to_lat_long_coord(geocoder=behaviour.geocoder)
+            path = urlsplit(self.path).path
+            if path not in ("/convert", "/convert/batch"):
+                self._send_error(404, f"no such endpoint '{path}'")
+                return
 
-            if not latlong_query:
-                return Result[str]("", error=latlong_query.error)
+            try:
+                length = int(self.headers.get("Content-Length", ""))
 
-            if behaviour.debug:
-                print(f"debug: {latlong_query.get()=}", file=behaviour.stderr)
+            except ValueError:
+                self._send_error(411, "request body needs a content length")
+                return
+
+            if not (0 <= length <= _HTTP_MAX_BODY_BYTES):
+                self._send_error(413, f"request body is over {_HTTP_MAX_BODY_BYTES} bytes")
+                return
+
+            if path == "/convert/batch":
+                self._convert_batch(length)
+                return
 
-            # perform operation
             try:
-                pluscode: str = _encode(
-                    lat=latlong_query.get().latitude, lon=latlong_query.get().longitude
-                )
+                request = json_loads(self.rfile.read(length))
 
-            except Exception as exc:  # noqa: BLE001
-                return Result[str]("", error=exc)
+            except ValueError:
+                request = None
 
-            return Result[str](pluscode)
+            self._convert((self._parameters() | request) if isinstance(request, dict) else request)
 
-        case ConversionResultTypeEnum.LOCAL_CODE:
-            # if its already a local code, just return it
-            if isinstance(query, LocalCodeQuery):
-                return Result[str](str(query))
+    with ThreadingHTTPServer(address, _SurplusHTTPRequestHandler) as server:
+        if behaviour.debug:
+            print(f"debug: serve_http: serving on {address}", file=behaviour.stderr)
 
-            # get latlong and handle result
-            latlong_result = query.to_lat_long_coord(geocoder=behaviour.geocoder)
+        server.serve_forever()
 
-            if not latlong_result:
-                return Result[str]("", error=latlong_result.error)
 
-            if behaviour.debug:
-                print(f"debug: {latlong_result.get()=}", file=behaviour.stderr)
+# command-line entry
 
-            query_latlong = latlong_result.get()
 
-            # reverse location and handle result
-            try:
-                location = behaviour.reverser(query_latlong, level=LOCALITY_GEOCODER_LEVEL)
+def _serve_cli(behaviour: Behaviour, options: _CliOptions) -> int:
+    """
+    (internal function) runs serve_socket() or serve_http() for cli(), returning an exit
+    code int
+    """
 
-            except Exception as exc:  # noqa: BLE001
-                return Result[str]("", error=exc)
+    from signal import SIGTERM, signal  # noqa: PLC0415
 
-            if behaviour.debug:
-                print(f"debug: {location=}", file=behaviour.stderr)
+    path = options.socket_path if (options.socket_path is not None) else default_socket_path()
 
-            # generate locality portion of local code
-            if behaviour.debug:
-                stdout.write(
-                    _generate_text(
-                        location=location,
-                        behaviour=behaviour,
-                        mode=TextGenerationEnum.LOCALITY_TEXT,
-                        debug=behaviour.debug,
-                    ).strip()
-                    + "\n"
-                )
+    # exit cleanly on termination, so that the socket is removed
+    signal(SIGTERM, lambda *_: sysexit(0))
 
-            portion_locality: str = _generate_text(
-                location=location,
-                behaviour=behaviour,
-                mode=TextGenerationEnum.LOCALITY_TEXT,
-            ).strip()
+    try:
+        if options.serve_http is not None:
+            serve_http(
+                options.serve_http,
+                behaviour,
+                max_concurrency=options.http_concurrency,
+                max_client_concurrency=options.http_client_concurrency,
+            )
 
-            # reverse locality portion
-            try:
-                locality_latlong: Latlong = behaviour.geocoder(portion_locality)
+        else:
+            serve_socket(path, behaviour)
 
-                # check now if bounding_box is set and valid
-                if getattr(locality_latlong, "bounding_box", None) is None:
-                    msg = (
-                        "(shortening) geocoder-returned latlong has .bounding_box=None"
-                        f" - {locality_latlong.bounding_box}"
-                    )
-                    raise AttributeError(msg)  # noqa: TRY301
+    except KeyboardInterrupt:
+        return 0
 
-                if len(locality_latlong.bounding_box) != 4:  # noqa: PLR2004
-                    msg = (
-                        "(shortening) geocoder-returned latlong has len(.bounding_box) != 4"
-                        f" - {locality_latlong.bounding_box}"
-                    )
-                    raise ValueError(msg)  # noqa: TRY301
+    except (OSError, NotImplementedError) as exc:
+        print(f"error: {Result[None](None, error=exc).cry(string=True)}", file=behaviour.stderr)
+        return -1
 
-                if not all(type(c) == float(c) for c in locality_latlong.bounding_box):
-                    msg = (
-                        "(shortening) geocoder-returned latlong has non-float in .bounding_box"
-                        f" - {locality_latlong.bounding_box}"
-                    )
-                    raise TypeError(msg)  # noqa: TRY301
+    return 0
 
-            except Exception as exc:  # noqa: BLE001
-                return Result[str]("", error=exc)
 
-            plus_code = _encode(
-                lat=query_latlong.latitude,
-                lon=query_latlong.longitude,
-            )
+def _run_cli(behaviour: Behaviour, options: _CliOptions) -> int:
+    """
+    (internal function) runs the conversion or mode cli() was asked for, returning an exit
+    code int
+    """
 
-            # https://github.com/google/open-location-code/wiki/Guidance-for-shortening-codes
-            check1 = (
-                # The center point of the feature is within 0.4 degrees latitude and 0.4
-                # degrees longitude
-                (
-                    (query_latlong.latitude - 0.4)
-                    <= locality_latlong.latitude
-                    <= (query_latlong.latitude + 0.4)
-                ),
-                (
-                    (query_latlong.longitude - 0.4)
-                    <= locality_latlong.longitude
-                    <= (query_latlong.longitude + 0.4)
-                ),
-                # The bounding box of the feature is less than 0.8 degrees high and wide.
-                abs(locality_latlong.bounding_box[0] - locality_latlong.bounding_box[1]) < 0.8,  # noqa: PLR2004
-                abs(locality_latlong.bounding_box[2] - locality_latlong.bounding_box[3]) < 0.8,  # noqa: PLR2004
+    # csv mode: converts columns of a csv file without network access
+    if options.csv:
+        return _convert_csv(stdin, behaviour.stdout, behaviour, options.csv_columns)
+
+    # batch mode: one query per line in, one record per line out
+    if options.batch:
+        exit_code: int = 0
+
+        results = (
+            surplus_batch(stdin, behaviour)
+            if options.workers == 1
+            else surplus_batch_parallel(
+                stdin,
+                partial(_cli_behaviour, argv[1:]),
+                options.workers or None,
+                ordered=options.batch_ordered,
             )
+        )
 
-            check2 = (
-                # The center point of the feature is within 0.4 degrees latitude and 0.4
-                # degrees longitude"
-                (
-                    (query_latlong.latitude - 8)
-                    <= locality_latlong.latitude
-                    <= (query_latlong.latitude + 8)
-                ),
-                (
-                    (query_latlong.longitude - 8)
-                    <= locality_latlong.longitude
-                    <= (query_latlong.longitude + 8)
-                ),
-                # The bounding box of the feature is less than 0.8 degrees high and wide.
-                abs(locality_latlong.bounding_box[0] - locality_latlong.bounding_box[1]) < 16,  # noqa: PLR2004
-                abs(locality_latlong.bounding_box[2] - locality_latlong.bounding_box[3]) < 16,  # noqa: PLR2004
+        for query_string, result in results:
+            if not result:
+                exit_code = -2
+
+            behaviour.stdout.write(
+                _format_batch_record(
+                    query_string,
+                    result,
+                    options.batch_format,
+                    json_result=not isinstance(behaviour.convert_to_type, ConversionResultTypeEnum),
+                )
+                + "\n"
             )
 
-            if check1:
-                return Result[str](f"{plus_code[4:]} {portion_locality}")
+        behaviour.stdout.flush()
+        return exit_code
 
-            if check2:
-                return Result[str](f"{plus_code[2:]} {portion_locality}")
+    # daemon mode: keeps geocoding state warm for other processes using --socket, or for
+    # http clients
+    if options.serve or (options.serve_http is not None):
+        return _serve_cli(behaviour, options)
+
+    # client mode: converts through a running daemon, or falls back to converting here
+    if options.socket_path is not None:
+        response = _convert_via_socket(options.socket_path, behaviour)
 
+        if response is not None:
+            behaviour.stderr.write(response["stderr"])
+
+            if response["error"] is not None:
+                print(f"error: {response['error']}", file=behaviour.stderr)
+            else:
+                print(response["result"], file=behaviour.stdout)
+
+            return response["exit_code"]
+
+        if behaviour.debug:
             print(
-                "info: could not determine a suitable geographical feature to use as "
-                "locality for shortening. full plus code is returned.",
+                f"debug: cli: no daemon serving on '{options.socket_path}', converting here",
                 file=behaviour.stderr,
             )
-            return Result[str](plus_code)
 
-        case ConversionResultTypeEnum.LATLONG:
-            # return the latlong if already given a latlong
-            if isinstance(query, LatlongQuery):
-                return Result[str](str(query))
+    query_string = (
+        " ".join(behaviour.query) if isinstance(behaviour.query, list) else behaviour.query
+    )
 
-            # get latlong and handle result
-            latlong_result = query.to_lat_long_coord(geocoder=behaviour.geocoder)
+    with _recording_timings(query_string, behaviour):
+        # parse query and handle result
+        with _timed_stage("parse"):
+            query = parse_query(behaviour=behaviour)
 
-            if not latlong_result:
-                return Result[str]("", error=latlong_result.error)
+        if behaviour.debug:
+            print(f"debug: cli: {query=}", file=behaviour.stderr)
 
-            if behaviour.debug:
-                print(f"debug: {latlong_result.get()=}", file=behaviour.stderr)
+        if not query:
+            print(f"error: {query.cry(string=not behaviour.debug)}", file=behaviour.stderr)
+            return -1
 
-            # perform operation
-            return Result[str](str(latlong_result.get()))
+        # run surplus
+        text = surplus(
+            query=query.get(),
+            behaviour=behaviour,
+        )
 
-        case _:
-            return Result[str](
-                "", error=f"unknown conversion result type '{behaviour.convert_to_type}'"
-            )
+    # handle and display surplus result
+    if not text:
+        print(f"error: {text.cry(string=not behaviour.debug)}", file=behaviour.stderr)
+        return -2
+
+    print(text.get(), file=behaviour.stdout)
+    return 0
 
 
-# command-line entry
+def _print_cache_stats(behaviour: Behaviour) -> None:
+    """
+    (internal function) writes the in-memory cache statistics of the behaviour's geocoding
+    object to stderr as one json line, if it has any
+    """
+
+    geocoding = getattr(behaviour.geocoder, "__self__", None)
+    if not isinstance(geocoding, SurplusDefaultGeocoding | SurplusDefaultAsyncGeocoding):
+        return
+
+    print(
+        json_dumps({"memory_cache": geocoding.cache_stats()._asdict()}),
+        file=behaviour.stderr,
+    )
 
 
 def cli() -> int:
     """command-line entry point, returns an exit code int"""
 
-    behaviour = handle_args()
+    behaviour, options = handle_args()
 
     # handle arguments and print version header
     print(
@@ -1729,34 +6043,17 @@ def cli() -> int:
 
     if behaviour.show_user_agent:
         print(
-            generate_fingerprinted_user_agent().get(),
+            default_user_agent(),
             file=behaviour.stdout,
         )
         sysexit(0)
 
-    # parse query and handle result
-    query = parse_query(behaviour=behaviour)
-
-    if behaviour.debug:
-        print(f"debug: cli: {query=}", file=behaviour.stderr)
-
-    if not query:
-        print(f"error: {query.cry(string=not behaviour.debug)}", file=behaviour.stderr)
-        return -1
-
-    # run surplus
-    text = surplus(
-        query=query.get(),
-        behaviour=behaviour,
-    )
-
-    # handle and display surplus result
-    if not text:
-        print(f"error: {text.cry(string=not behaviour.debug)}", file=behaviour.stderr)
-        return -2
+    try:
+        return _run_cli(behaviour, options)
 
-    print(text.get(), file=behaviour.stdout)
-    return 0
+    finally:
+        if options.cache_stats:
+            _print_cache_stats(behaviour)
 
 
 if __name__ == "__main__":
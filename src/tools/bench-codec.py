@@ -0,0 +1,150 @@
+"""
+script to benchmark surplus.codec against the pluscodes library it replaced, and to check
+that both agree on a random sample of coordinates and codes
+
+"before" timings replicate how surplus used pluscodes per query, "after" timings use
+surplus.codec with its caches cleared (cold) and with every code already cached (warm).
+needs pluscodes, which is installed in the default hatch environment
+
+usage: python src/tools/bench-codec.py [sample size]
+"""
+
+from math import isclose
+from pathlib import Path
+from random import Random
+from sys import argv, path
+from sys import exit as sysexit
+from timeit import timeit
+from typing import TYPE_CHECKING
+
+from pluscodes import PlusCode  # type: ignore
+from pluscodes import encode as pluscodes_encode  # type: ignore
+from pluscodes.openlocationcode import openlocationcode  # type: ignore
+from pluscodes.validator import Validator  # type: ignore
+
+path.insert(0, str(Path(__file__).parent.parent))
+
+from surplus import codec
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+CODE_LENGTHS: tuple[int, ...] = (2, 4, 6, 8, 10, 11, 12, 13, 14, 15)
+
+
+def _clear_caches() -> None:
+    for cached in (codec.decode, codec.is_valid, codec.is_short, codec.is_full):
+        cached.cache_clear()  # type: ignore[attr-defined]
+
+
+def check(size: int, random: Random) -> int:
+    """checks surplus.codec against pluscodes, returns the number of mismatches"""
+
+    mismatches: int = 0
+
+    def _mismatch(operation: str, value: object, expected: object, got: object) -> None:
+        nonlocal mismatches
+        mismatches += 1
+        print(f"mismatch: {operation}({value!r}): expected {expected!r}, got {got!r}")  # noqa: T201
+
+    for _ in range(size):
+        latitude, longitude = random.uniform(-90, 90), random.uniform(-180, 180)
+        code_length = random.choice(CODE_LENGTHS)
+
+        expected = pluscodes_encode(latitude, longitude, code_length)
+        code = codec.encode(latitude, longitude, code_length)
+        if code != expected:
+            _mismatch("encode", (latitude, longitude, code_length), expected, code)
+
+        for validator, oracle in (
+            (codec.is_valid, openlocationcode.isValid),
+            (codec.is_short, openlocationcode.isShort),
+            (codec.is_full, openlocationcode.isFull),
+        ):
+            if validator(code) != oracle(code):
+                _mismatch(validator.__name__, code, oracle(code), validator(code))
+
+        if codec.is_full(code):
+            centre = PlusCode(code).area.center()
+            area = codec.decode(code)
+            if not (isclose(area.latitude, centre.lat) and isclose(area.longitude, centre.lon)):
+                _mismatch("decode", code, (centre.lat, centre.lon), area[:2])
+
+        if code_length >= 10:  # noqa: PLR2004
+            short_code = code[random.choice((2, 4, 6)) :]
+            reference = latitude + random.uniform(-0.5, 0.5), longitude + random.uniform(-0.5, 0.5)
+            expected = openlocationcode.recoverNearest(short_code, *reference)
+            recovered = codec.recover_nearest(short_code, *reference)
+            if recovered != expected:
+                _mismatch("recover_nearest", (short_code, *reference), expected, recovered)
+
+    return mismatches
+
+
+def benchmark(size: int, random: Random) -> None:
+    """prints the per-code cost of encoding, decoding and validating, before and after"""
+
+    latlongs = [(random.uniform(-90, 90), random.uniform(-180, 180)) for _ in range(size)]
+    codes = [codec.encode(latitude, longitude) for latitude, longitude in latlongs]
+
+    def _before_encode() -> None:
+        for latitude, longitude in latlongs:
+            pluscodes_encode(lat=latitude, lon=longitude)
+
+    def _after_encode() -> None:
+        for latitude, longitude in latlongs:
+            codec.encode(latitude, longitude)
+
+    def _before_decode() -> None:
+        for code in codes:
+            plus_code = PlusCode(code)
+            _ = (plus_code.area.center().lat, plus_code.area.center().lon)
+
+    def _after_decode() -> None:
+        for code in codes:
+            area = codec.decode(code)
+            _ = (area.latitude, area.longitude)
+
+    def _before_validate() -> None:
+        for code in codes:
+            validator = Validator()
+            _ = validator.is_valid(code) and validator.is_full(code)
+
+    def _after_validate() -> None:
+        for code in codes:
+            _ = codec.is_valid(code) and codec.is_full(code)
+
+    rows: list[tuple[str, Callable[[], None], Callable[[], None]]] = [
+        ("encode", _before_encode, _after_encode),
+        ("decode", _before_decode, _after_decode),
+        ("validate", _before_validate, _after_validate),
+    ]
+
+    print(f"{'operation':<10}{'before':>12}{'after cold':>14}{'after warm':>14}")  # noqa: T201
+    for name, before, after in rows:
+        before_seconds = timeit(before, number=1)
+        _clear_caches()
+        cold_seconds = timeit(after, number=1)
+        warm_seconds = timeit(after, number=1)
+        print(  # noqa: T201
+            f"{name:<10}"
+            f"{before_seconds / size * 1e6:>10.2f}µs"
+            f"{cold_seconds / size * 1e6:>12.2f}µs"
+            f"{warm_seconds / size * 1e6:>12.2f}µs"
+        )
+
+
+def main() -> int:
+    size = int(argv[1]) if len(argv) > 1 else codec.CODEC_CACHE_SIZE
+
+    if (mismatches := check(size, Random(0))) != 0:  # noqa: S311
+        print(f"{mismatches} mismatch(es) against pluscodes")  # noqa: T201
+        return 1
+
+    print(f"surplus.codec agrees with pluscodes on {size} samples\n")  # noqa: T201
+    benchmark(size, Random(1))  # noqa: S311
+    return 0
+
+
+if __name__ == "__main__":
+    sysexit(main())
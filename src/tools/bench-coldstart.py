@@ -0,0 +1,132 @@
+"""
+script to benchmark how long surplus takes to start from a fresh interpreter, for a plain
+import and for cli() paths that do not need the network
+
+every case is run in a new python process several times, and the fastest wall time is
+reported next to the slowest modules from `python -X importtime`, so that an import made
+eager by accident shows up by name
+
+usage: python src/tools/bench-coldstart.py [runs] [--json]
+"""
+
+from json import dumps as json_dumps
+from os import environ
+from pathlib import Path
+from subprocess import run
+from sys import argv, executable
+from sys import exit as sysexit
+from time import perf_counter
+from typing import NamedTuple
+
+SOURCE_DIRECTORY: str = str(Path(__file__).parent.parent)
+TOP_MODULES: int = 5
+
+# cli() is run with sys.argv set to the case's arguments, as the `surplus` script would
+CLI_SNIPPET: str = (
+    "import sys; sys.argv = ['surplus', *sys.argv[1:]]; import surplus; surplus.cli()"
+)
+
+CASES: tuple[tuple[str, tuple[str, ...]], ...] = (
+    ("import surplus", ("-c", "import surplus")),
+    ("surplus --version", ("-c", CLI_SNIPPET, "--version")),
+    ("surplus --show-user-agent", ("-c", CLI_SNIPPET, "--show-user-agent")),
+    ("surplus -c pluscode 1.3,103.8", ("-c", CLI_SNIPPET, "-c", "pluscode", "1.3,103.8")),
+    ("surplus -c latlong 6PH57VP3+PR", ("-c", CLI_SNIPPET, "-c", "latlong", "6PH57VP3+PR")),
+)
+
+
+class CaseTiming(NamedTuple):
+    """timings for one case, in milliseconds"""
+
+    name: str
+    wall_ms: float
+    import_ms: float
+    top_modules: list[tuple[str, float]]
+
+
+def _run(arguments: tuple[str, ...], *, importtime: bool = False) -> tuple[float, str]:
+    """runs python with arguments, returning the wall time in seconds and stderr"""
+
+    environment = environ | {"PYTHONPATH": SOURCE_DIRECTORY}
+    flags = ("-X", "importtime") if importtime else ()
+
+    start = perf_counter()
+    process = run(  # noqa: S603
+        (executable, *flags, *arguments),
+        capture_output=True,
+        text=True,
+        env=environment,
+        check=False,
+    )
+    return perf_counter() - start, process.stderr
+
+
+def _parse_importtime(output: str) -> tuple[float, list[tuple[str, float]]]:
+    """
+    returns the cumulative import time of surplus and the slowest modules it pulls in,
+    excluding surplus itself
+    """
+
+    total: float = 0.0
+    modules: list[tuple[str, float]] = []
+
+    for line in output.splitlines():
+        if not line.startswith("import time:") or ("|" not in line):
+            continue
+
+        _, cumulative, name = line.removeprefix("import time:").split("|", maxsplit=2)
+        if not cumulative.strip().isdigit():  # header line
+            continue
+
+        name, milliseconds = name.strip(), int(cumulative) / 1000
+        if name == "surplus":
+            total = milliseconds
+        elif not name.startswith("surplus."):
+            modules.append((name, milliseconds))
+
+    modules.sort(key=lambda module: module[1], reverse=True)
+    return total, modules[:TOP_MODULES]
+
+
+def benchmark(runs: int) -> list[CaseTiming]:
+    """runs every case, returning the fastest of each"""
+
+    # warm up the bytecode cache so that the first case is not also timing compilation
+    _run(("-c", "import surplus"))
+
+    timings: list[CaseTiming] = []
+    for name, arguments in CASES:
+        wall = min(_run(arguments)[0] for _ in range(runs))
+        import_ms, top_modules = min(
+            (_parse_importtime(_run(arguments, importtime=True)[1]) for _ in range(runs)),
+            key=lambda result: result[0],
+        )
+        timings.append(CaseTiming(name, wall * 1000, import_ms, top_modules))
+
+    return timings
+
+
+def main() -> int:
+    runs = int(argv[1]) if (len(argv) > 1) and argv[1].isdigit() else 5
+    timings = benchmark(runs)
+
+    if "--json" in argv:
+        print(json_dumps([timing._asdict() for timing in timings], indent=2))  # noqa: T201
+        return 0
+
+    baseline = min(_run(("-c", "pass"))[0] for _ in range(runs)) * 1000
+    print(f"bare interpreter: {baseline:.1f}ms, best of {runs}\n")  # noqa: T201
+
+    for timing in timings:
+        print(  # noqa: T201
+            f"{timing.name}\n"
+            f"    wall {timing.wall_ms:.1f}ms, importing surplus {timing.import_ms:.1f}ms"
+        )
+        for module, milliseconds in timing.top_modules:
+            print(f"        {milliseconds:>7.1f}ms  {module}")  # noqa: T201
+
+    return 0
+
+
+if __name__ == "__main__":
+    sysexit(main())
@@ -0,0 +1,307 @@
+"""
+script to benchmark surplus conversions end to end, from query string to result, for every
+query form and conversion type
+
+geocoding and reversing are done by deterministic in-process stubs instead of Nominatim, so
+that the timings are of surplus itself: parse_query(), the conversion dispatch in surplus(),
+local code recovery and shortening, and _generate_text(). stubs can be given an artificial
+latency to see how the conversion types scale with a slow backend. queries in a cassette
+recorded with SurplusCassetteRecorder or `surplus --record-cassette` can also be replayed,
+for production-shaped addresses. results can be written as json and compared against an
+earlier run
+
+usage: python src/tools/bench-surplus.py [-n ITERATIONS] [--latency MILLISECONDS]
+                                         [--cassette PATH] [--json] [--compare BASELINE.json]
+"""
+
+from argparse import ArgumentParser
+from io import StringIO
+from json import dumps as json_dumps
+from json import loads as json_loads
+from pathlib import Path
+from platform import python_implementation, python_version
+from statistics import fmean, quantiles
+from sys import exit as sysexit
+from sys import path
+from time import perf_counter, sleep
+from typing import Any, NamedTuple
+
+path.insert(0, str(Path(__file__).parent.parent))
+
+from surplus import (
+    VERSION,
+    VERSION_SUFFIX,
+    Behaviour,
+    ConversionResultTypeEnum,
+    Latlong,
+    SurplusCassetteReplayer,
+    SurplusGeocoderProtocol,
+    SurplusReverserProtocol,
+    parse_query,
+    surplus,
+)
+
+# errors in cassette cases are usually requests that were not recorded, e.g., localities
+# for conversion types that the cassette was not recorded with
+CASSETTE_QUERY_FORM: str = "cassette"
+
+# query form -> (query strings cycled through, whether they are termux-location json)
+QUERIES: dict[str, tuple[tuple[str, ...], bool]] = {
+    "pluscode": (("6PH57VP3+PR", "8FHJVHM5+HC", "6PM34848+C2"), False),
+    "local code": (("8RQQ+GR Singapore", "VP3+PR Singapore"), False),
+    "latlong": (("1.3336875, 103.7749375", "41.9029, 12.4534", "3.1478, 101.6953"), False),
+    "string": (("Ngee Ann Polytechnic, Singapore", "Colosseo, Roma", "Petronas Towers"), False),
+    "termux json": (
+        (
+            (
+                '{"latitude": 1.3336875, "longitude": 103.7749375, "altitude": 12.0, '
+                '"accuracy": 3.9, "vertical_accuracy": 0.0, "bearing": 0.0, "speed": 0.0, '
+                '"elapsedMs": 14, "provider": "gps"}'
+            ),
+        ),
+        True,
+    ),
+}
+
+# addresses returned by the stub reverser, chosen by coordinate so results are stable
+ADDRESSES: tuple[dict[str, Any], ...] = (
+    {
+        "amenity": "Ngee Ann Polytechnic",
+        "house_number": "535",
+        "road": "Clementi Road",
+        "suburb": "Bukit Timah",
+        "city": "Singapore",
+        "county": "Northwest",
+        "ISO3166-2-lvl6": "SG-03",
+        "postcode": "599489",
+        "country": "Singapore",
+        "country_code": "sg",
+    },
+    {
+        "tourism": "Colosseo",
+        "road": "Piazza del Colosseo",
+        "suburb": "Municipio Roma I",
+        "city": "Roma",
+        "county": "Roma Capitale",
+        "ISO3166-2-lvl6": "IT-RM",
+        "state": "Lazio",
+        "ISO3166-2-lvl4": "IT-62",
+        "postcode": "00184",
+        "country": "Italia",
+        "country_code": "it",
+    },
+    {
+        "building": "Petronas Twin Towers",
+        "road": "Jalan Ampang",
+        "suburb": "Kampung Baru",
+        "city": "Kuala Lumpur",
+        "state": "Kuala Lumpur",
+        "ISO3166-2-lvl4": "MY-14",
+        "postcode": "50088",
+        "country": "Malaysia",
+        "country_code": "my",
+    },
+)
+
+
+class CaseResult(NamedTuple):
+    """latency and throughput of one query form and conversion type"""
+
+    query_form: str
+    convert_to: str
+    iterations: int
+    errors: int
+    throughput_per_second: float
+    mean_ms: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+class StubGeocoding(NamedTuple):
+    """deterministic geocoder and reverser, sleeping for latency seconds per call"""
+
+    latency: float
+
+    def geocoder(self, place: str) -> Latlong:
+        if self.latency > 0:
+            sleep(self.latency)
+
+        # a locality-sized bounding box around a point that depends only on the place
+        seed = sum(place.encode("utf-8")) % 1000
+        latitude, longitude = 1.3 + (seed / 1e5), 103.8 + (seed / 1e5)
+        return Latlong(
+            latitude=latitude,
+            longitude=longitude,
+            bounding_box=(latitude - 0.1, latitude + 0.1, longitude - 0.1, longitude + 0.1),
+        )
+
+    def reverser(self, latlong: Latlong, level: int = 18) -> dict[str, Any]:  # noqa: ARG002
+        if self.latency > 0:
+            sleep(self.latency)
+
+        address = ADDRESSES[int(abs(latlong.latitude) + abs(latlong.longitude)) % len(ADDRESSES)]
+        return address | {"latitude": latlong.latitude, "longitude": latlong.longitude}
+
+
+def _convert(query: str, behaviour: Behaviour) -> bool:
+    """converts a query string like cli() does, returning whether it succeeded"""
+
+    parsed = parse_query(behaviour._replace(query=query))
+    return bool(parsed) and bool(surplus(parsed.get(), behaviour))
+
+
+def _run_case(  # noqa: PLR0913
+    query_form: str,
+    queries: tuple[str, ...] | list[str],
+    convert_to: ConversionResultTypeEnum,
+    geocoder: SurplusGeocoderProtocol,
+    reverser: SurplusReverserProtocol,
+    iterations: int,
+    *,
+    termux: bool = False,
+) -> CaseResult:
+    """converts queries round-robin with one conversion type, returning their timings"""
+
+    behaviour = Behaviour(
+        geocoder=geocoder,
+        reverser=reverser,
+        stderr=StringIO(),
+        stdout=StringIO(),
+        convert_to_type=convert_to,
+        using_termux_location=termux,
+    )
+
+    # warm up the codec and rendering plan caches, as a long-lived process would
+    for query in queries:
+        _convert(query, behaviour)
+
+    errors = 0
+    latencies: list[float] = []
+    start = perf_counter()
+
+    for index in range(iterations):
+        query_start = perf_counter()
+        if not _convert(queries[index % len(queries)], behaviour):
+            errors += 1
+        latencies.append(perf_counter() - query_start)
+
+    elapsed = perf_counter() - start
+    percentiles = quantiles(latencies, n=100, method="inclusive")
+    return CaseResult(
+        query_form=query_form,
+        convert_to=convert_to.value,
+        iterations=iterations,
+        errors=errors,
+        throughput_per_second=iterations / elapsed,
+        mean_ms=fmean(latencies) * 1000,
+        p50_ms=percentiles[49] * 1000,
+        p90_ms=percentiles[89] * 1000,
+        p99_ms=percentiles[98] * 1000,
+        max_ms=max(latencies) * 1000,
+    )
+
+
+def benchmark(iterations: int, latency: float, cassette: Path | None = None) -> list[CaseResult]:
+    """
+    runs every query form against every conversion type, and if given a cassette, every
+    query in it replayed against every conversion type
+    """
+
+    stub = StubGeocoding(latency)
+    results: list[CaseResult] = [
+        _run_case(
+            query_form, queries, convert_to, stub.geocoder, stub.reverser, iterations, termux=termux
+        )
+        for query_form, (queries, termux) in QUERIES.items()
+        for convert_to in ConversionResultTypeEnum
+    ]
+
+    if cassette is not None:
+        replayer = SurplusCassetteReplayer(cassette)
+        results.extend(
+            _run_case(
+                CASSETTE_QUERY_FORM,
+                replayer.queries(),
+                convert_to,
+                replayer.geocoder,
+                replayer.reverser,
+                iterations,
+            )
+            for convert_to in ConversionResultTypeEnum
+        )
+
+    return results
+
+
+def compare(results: list[CaseResult], baseline: dict[str, Any]) -> None:
+    """prints the change in median latency and throughput against an earlier json run"""
+
+    earlier = {(case["query_form"], case["convert_to"]): case for case in baseline["cases"]}
+
+    print(f"{'query form':<14}{'convert to':<16}{'p50':>12}{'throughput':>14}")  # noqa: T201
+    for result in results:
+        if (case := earlier.get((result.query_form, result.convert_to))) is None:
+            continue
+
+        print(  # noqa: T201
+            f"{result.query_form:<14}{result.convert_to:<16}"
+            f"{(result.p50_ms / case['p50_ms'] - 1) * 100:>+11.1f}%"
+            f"{(result.throughput_per_second / case['throughput_per_second'] - 1) * 100:>+13.1f}%"
+        )
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0, metavar="MILLISECONDS")
+    parser.add_argument("--json", action="store_true", default=False)
+    parser.add_argument("--compare", type=Path, default=None, metavar="BASELINE.json")
+    parser.add_argument("--cassette", type=Path, default=None, metavar="PATH")
+    args = parser.parse_args()
+
+    results = benchmark(args.iterations, args.latency / 1000, args.cassette)
+
+    if args.json:
+        print(  # noqa: T201
+            json_dumps(
+                {
+                    "surplus": f"{'.'.join(str(v) for v in VERSION)}{VERSION_SUFFIX}",
+                    "python": f"{python_implementation()} {python_version()}",
+                    "iterations": args.iterations,
+                    "latency_ms": args.latency,
+                    "cases": [result._asdict() for result in results],
+                },
+                indent=2,
+            )
+        )
+
+    elif args.compare is not None:
+        compare(results, json_loads(args.compare.read_text(encoding="utf-8")))
+
+    else:
+        print(  # noqa: T201
+            f"{'query form':<14}{'convert to':<16}{'per second':>12}"
+            f"{'p50':>10}{'p90':>10}{'p99':>10}{'errors':>8}"
+        )
+        for result in results:
+            print(  # noqa: T201
+                f"{result.query_form:<14}{result.convert_to:<16}"
+                f"{result.throughput_per_second:>12.0f}"
+                f"{result.p50_ms:>8.3f}ms{result.p90_ms:>8.3f}ms{result.p99_ms:>8.3f}ms"
+                f"{result.errors:>8}"
+            )
+
+    return (
+        1
+        if any(
+            (result.errors != 0) and (result.query_form != CASSETTE_QUERY_FORM)
+            for result in results
+        )
+        else 0
+    )
+
+
+if __name__ == "__main__":
+    sysexit(main())
@@ -0,0 +1,38 @@
+"""
+script to build a surplus offline data pack from newline-delimited json
+
+each line is a location dictionary like those returned by reverser functions, with at least
+`latitude` and `longitude` keys, e.g., a saved SurplusDefaultGeocoding.reverser() result
+or a flattened OpenStreetMap extract
+
+usage: python src/tools/build-offline-pack.py <features.ndjson> <output.pack> [cell size]
+"""
+
+from json import loads
+from pathlib import Path
+from sys import argv, path
+from sys import exit as sysexit
+
+path.insert(0, str(Path(__file__).parent.parent))
+
+from surplus import build_offline_pack
+
+
+def main() -> int:
+    if len(argv) not in (3, 4):
+        print(__doc__.strip().splitlines()[-1])  # noqa: T201
+        return 1
+
+    with Path(argv[1]).open(encoding="utf-8") as features:
+        count = build_offline_pack(
+            (loads(line) for line in features if line.strip() != ""),
+            Path(argv[2]),
+            *([float(argv[3])] if len(argv) == 4 else []),  # noqa: PLR2004
+        )
+
+    print(f"{argv[1]}\t->\t{argv[2]} ({count} features)")  # noqa: T201
+    return 0
+
+
+if __name__ == "__main__":
+    sysexit(main())
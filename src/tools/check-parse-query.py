@@ -0,0 +1,394 @@
+"""
+script to check that parse_query() and parse_queries() classify queries the same as the
+word-by-word classifier they replaced, and to time both
+
+the reference classifier below is the earlier parse_query() without its debug messages.
+it is run against handwritten queries covering every query form and edge case, and
+queries generated from a seeded mix of Plus Codes, numbers, words, commas and spaces, as
+query strings and as lists of strings from the command line, with and without
+--using-termux-location. any difference in query objects or errors is printed
+
+usage: python src/tools/check-parse-query.py [-n GENERATED] [--seed N] [--verbose]
+"""
+
+from argparse import ArgumentParser
+from json import JSONDecodeError
+from json import loads as json_loads
+from pathlib import Path
+from random import Random
+from sys import exit as sysexit
+from sys import path
+from time import perf_counter
+
+path.insert(0, str(Path(__file__).parent.parent))
+
+from surplus import (
+    EMPTY_LATLONG,
+    Behaviour,
+    EmptyQueryError,
+    IncompletePlusCodeError,
+    Latlong,
+    LatlongQuery,
+    LocalCodeQuery,
+    PlusCodeNotFoundError,
+    PlusCodeQuery,
+    Query,
+    Result,
+    StringQuery,
+    codec,
+    parse_queries,
+    parse_query,
+)
+
+CORPUS: tuple[str, ...] = (
+    # plus codes
+    "6PH57VP3+PR",
+    "6ph57vp3+pr",
+    "6PH57VP3+PR6",
+    "6PH57VP3+PR,",
+    ",6PH57VP3+PR, ",
+    "6PH50000+",
+    "6PH5000+",
+    "CX000000+",
+    "XX000000+",
+    "22222222+22",
+    "6PH57VP3+P",
+    "6PH57VP3++PR",
+    "6PH57VP3PR",
+    "Singapore 6PH57VP3+PR",
+    "6PH57VP3+PR 8FHJVHM5+HC",
+    # local codes
+    "8RQQ+GR Singapore",
+    "VP3+PR Singapore",
+    "8RQQ+GR, Singapore",
+    "St Lucia, Queensland, Australia G227+XF",
+    "8RQQ+GR",
+    "8RQQ+GR,",
+    " 8RQQ+GR ",
+    "+GR Singapore",
+    "8RQQ+GR 8RQQ+GR Singapore",
+    "8RQQ+GR\tSingapore",
+    "Singapore8RQQ+GR Singapore",
+    "a+b c",
+    "+",
+    "C++ programming",
+    # latlong coords
+    "1.3336875,103.7749375",
+    "1.3336875, 103.7749375",
+    "1.3336875 103.7749375",
+    "1.3336875 ,103.7749375",
+    "1.3336875,, 103.7749375,",
+    "1.3336875,103.7749375,",
+    "-33.8688,151.2093",
+    "+1.3,-103.8",
+    "1,2",
+    "1., .5",
+    "1e3, 2E-3",
+    "1_000, 2",
+    " 1.3, 103.8",
+    "1.3,  103.8",
+    "1.3\t103.8",
+    "1.3, 103.8\n",
+    "nan, inf",
+    "NaN -Infinity",
+    "\u0661.\u0663, \u0661\u0660\u0663",  # arabic-indic digits, which float() accepts
+    "1.3 103.8 1",
+    "1.3,103.8,1",
+    "1.3",
+    "1.3,",
+    ",103.8",
+    ",",
+    ", ,",
+    "1.3 north, 103.8 east",
+    "0x1, 2",
+    "1e, 2",
+    "., .",
+    # string queries
+    "Ngee Ann Polytechnic, Singapore",
+    "Toa Payoh North",
+    "Wisma Atria",
+    "Colosseo",
+    "Colosseo,",
+    "Roma, Italia",
+    "infinity pool, Singapore",
+    "nano",
+    " ",
+    "  ",
+    "\t",
+    # termux-location json
+    '{"latitude": 1.3336875, "longitude": 103.7749375, "altitude": 12.0}',
+    '{"latitude": "1.3", "longitude": "103.8"}',
+    '{"latitude": 1.3}',
+    "[1.3, 103.8]",
+    "{not json",
+    "",
+)
+
+TOKENS: tuple[str, ...] = (
+    "6PH57VP3+PR",
+    "8RQQ+GR",
+    "VP3+PR",
+    "+GR",
+    "8RQQ+",
+    "6PH50000+",
+    "1.3336875",
+    "103.7749375",
+    "-33.8688",
+    "1e3",
+    ".5",
+    "1.",
+    "nan",
+    "inf",
+    "1_0",
+    "\u0661\u0662",
+    "Singapore",
+    "Ngee",
+    "Ann",
+    "Roma",
+    "C++",
+    ",",
+    "",
+    "\t",
+)
+SEPARATORS: tuple[str, ...] = (" ", ", ", ",", "  ", " ,")
+
+
+def reference_parse_query(
+    query: str | list[str],
+    *,
+    using_termux_location: bool = False,
+) -> Result[Query]:
+    """the earlier parse_query(), without debug messages"""
+
+    def _match_plus_code(query: str | list[str]) -> Result[Query]:
+        portion_plus_code: str = ""
+        portion_locality: str = ""
+        original_query: str = ""
+        split_query: list[str] = []
+
+        if isinstance(query, list):
+            original_query = " ".join(query)
+            split_query = query
+
+        else:
+            original_query = str(query)
+            split_query = query.split(" ")
+
+        for _word in split_query:
+            word = _word.strip(",").strip()
+
+            if codec.is_valid(word):
+                portion_plus_code = word
+
+                if codec.is_full(word):
+                    return Result[Query](PlusCodeQuery(portion_plus_code))
+
+                break
+
+        if portion_plus_code == "":
+            return Result[Query](
+                LatlongQuery(EMPTY_LATLONG),
+                error=PlusCodeNotFoundError("unable to find a Plus Code"),
+            )
+
+        portion_locality = original_query.replace(portion_plus_code, "")
+        portion_locality = portion_locality.strip().strip(",").strip()
+
+        if (portion_locality == "") and (not codec.is_full(portion_plus_code)):
+            return Result[Query](
+                LatlongQuery(EMPTY_LATLONG),
+                error=IncompletePlusCodeError(
+                    "_match_plus_code: Plus Code is not full-length (e.g., 6PH58QMF+FX)"
+                ),
+            )
+
+        return Result[Query](LocalCodeQuery(code=portion_plus_code, locality=portion_locality))
+
+    if query in ([], ""):
+        return Result[Query](
+            LatlongQuery(EMPTY_LATLONG),
+            error=EmptyQueryError("empty query string passed"),
+        )
+
+    if mpc_result := _match_plus_code(query):
+        return Result[Query](mpc_result.get())
+
+    if isinstance(mpc_result.error, IncompletePlusCodeError):
+        return mpc_result
+
+    original_query: str = ""
+    split_query: list[str] = []
+
+    if isinstance(query, str):
+        original_query = query
+        split_query = query.split(" ")
+
+    else:
+        original_query = " ".join(query)
+        split_query = query
+
+    if using_termux_location:
+        try:
+            termux_location_json = json_loads(original_query)
+            if not isinstance(termux_location_json, dict):
+                msg = "parsed termux-location json is not a dict"
+                raise TypeError(msg)  # noqa: TRY301
+
+            return Result[Query](
+                LatlongQuery(
+                    Latlong(
+                        latitude=termux_location_json["latitude"],
+                        longitude=termux_location_json["longitude"],
+                    )
+                )
+            )
+
+        except (JSONDecodeError, TypeError):
+            return Result[Query](
+                LatlongQuery(EMPTY_LATLONG),
+                error=ValueError("could not parse termux-location json"),
+            )
+
+        except KeyError:
+            return Result[Query](
+                LatlongQuery(EMPTY_LATLONG),
+                error=ValueError(
+                    "could not get 'latitude' or 'longitude' keys from termux-location json"
+                ),
+            )
+
+    match split_query:
+        case [single]:
+            if "," not in single:
+                return Result[Query](StringQuery(original_query))
+
+            comma_split_single: list[str] = single.split(",")
+
+            if len(comma_split_single) == 2:  # noqa: PLR2004
+                try:
+                    latitude = float(comma_split_single[0].strip(","))
+                    longitude = float(comma_split_single[-1].strip(","))
+
+                except ValueError:
+                    return Result[Query](StringQuery(single))
+
+                else:
+                    return Result[Query](
+                        LatlongQuery(Latlong(latitude=latitude, longitude=longitude))
+                    )
+
+            return Result[Query](StringQuery(original_query))
+
+        case [left_single, right_single]:
+            try:
+                latitude = float(left_single.strip(","))
+                longitude = float(right_single.strip(","))
+
+            except ValueError:
+                return Result[Query](StringQuery(original_query))
+
+            else:
+                return Result[Query](LatlongQuery(Latlong(latitude=latitude, longitude=longitude)))
+
+        case _:
+            return Result[Query](StringQuery(original_query))
+
+
+def generate(count: int, seed: int) -> list[str]:
+    """returns queries made of one to four random tokens and separators"""
+
+    random = Random(seed)  # noqa: S311
+    queries: list[str] = []
+
+    for _ in range(count):
+        words = [random.choice(TOKENS) for _ in range(random.randint(1, 4))]
+        query = words[0]
+        for word in words[1:]:
+            query += random.choice(SEPARATORS) + word
+        queries.append(query)
+
+    return queries
+
+
+def _outcome(result: Result[Query]) -> tuple[str, str, str]:
+    """returns a comparable form of a parse result: the query object and error, as strings"""
+
+    if result:
+        return repr(result.value), "", ""
+    return repr(result.value), type(result.error).__name__, str(result.error)
+
+
+def check(queries: list[str], *, verbose: bool = False) -> int:
+    """compares the classifiers on every query, returning the number of differences"""
+
+    differences = 0
+
+    for using_termux_location in (False, True):
+        behaviour = Behaviour(using_termux_location=using_termux_location)
+
+        # query strings, as in batch mode, and lists of strings, as from the command line
+        all_forms: tuple[list[str | list[str]], ...] = (
+            list(queries),
+            [query.split() for query in queries],
+        )
+        for forms in all_forms:
+            bulk = list(parse_queries(forms, behaviour))
+
+            for query, parsed in zip(forms, bulk, strict=True):
+                expected = _outcome(
+                    reference_parse_query(query, using_termux_location=using_termux_location)
+                )
+                single = _outcome(parse_query(behaviour._replace(query=query)))
+
+                if expected == single == _outcome(parsed):
+                    continue
+
+                differences += 1
+                if verbose or (differences <= 20):  # noqa: PLR2004
+                    print(  # noqa: T201
+                        f"{query!r} (termux: {using_termux_location})\n"
+                        f"    reference     {expected}\n"
+                        f"    parse_query   {single}\n"
+                        f"    parse_queries {_outcome(parsed)}"
+                    )
+
+    return differences
+
+
+def timing(queries: list[str]) -> tuple[float, float]:
+    """returns the mean microseconds per query of the reference and parse_queries()"""
+
+    start = perf_counter()
+    for query in queries:
+        reference_parse_query(query)
+    reference = perf_counter() - start
+
+    start = perf_counter()
+    for _ in parse_queries(queries):
+        pass
+    current = perf_counter() - start
+
+    return reference / len(queries) * 1e6, current / len(queries) * 1e6
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--generated", type=int, default=20000, metavar="GENERATED")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", default=False)
+    args = parser.parse_args()
+
+    queries = [*CORPUS, *generate(args.generated, args.seed)]
+    differences = check(queries, verbose=args.verbose)
+
+    reference_us, current_us = timing(queries)
+    print(  # noqa: T201
+        f"{len(queries)} queries, {differences} differences\n"
+        f"reference {reference_us:.2f}us per query, parse_queries() {current_us:.2f}us per query"
+    )
+
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":
+    sysexit(main())
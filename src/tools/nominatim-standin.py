@@ -0,0 +1,360 @@
+"""
+script to serve a local stand-in for OpenStreetMap Nominatim, answering `/search` and
+`/reverse` from fixture locations with configurable latency, rate limiting and errors, so
+that surplus' retry and backoff behaviour can be load-tested reproducibly without the network
+
+fixtures are newline-delimited json location dictionaries, the same as those taken by
+src/tools/build-offline-pack.py: saved SurplusDefaultGeocoding.reverser() results (whose
+'raw' key is served as is), or flat address dictionaries with `latitude` and `longitude`
+keys. a few built-in locations are served if no fixtures are given
+
+point surplus at it with `surplus --nominatim-url http://127.0.0.1:8088 ...`, or
+SurplusDefaultGeocoding(nominatim_url="http://127.0.0.1:8088"). avoid --cache while doing
+so, as stand-in answers would be cached alongside real ones
+
+usage: python src/tools/nominatim-standin.py [--host HOST] [--port PORT] [--fixtures PATH]
+                                             [--latency MILLISECONDS]
+                                             [--latency-distribution {fixed,uniform,exponential}]
+                                             [--rate-limit-rate P] [--error-rate P]
+                                             [--max-rps N] [--seed N] [--verbose]
+"""
+
+from argparse import ArgumentParser
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps as json_dumps
+from json import loads as json_loads
+from math import cos, radians
+from pathlib import Path
+from random import Random
+from signal import SIGTERM, signal
+from sys import exit as sysexit
+from sys import path, stderr
+from threading import Lock
+from time import monotonic, sleep
+from typing import Any, NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+path.insert(0, str(Path(__file__).parent.parent))
+
+from surplus import OFFLINE_REVERSER_DETAIL_KEYS, OFFLINE_REVERSER_DETAIL_LEVEL
+
+DEFAULT_PORT: int = 8088
+SERVER_ERRORS: tuple[int, ...] = (500, 502, 503, 504)
+
+DEFAULT_FIXTURES: tuple[dict[str, Any], ...] = (
+    {
+        "latitude": 1.3336875,
+        "longitude": 103.7749375,
+        "amenity": "Ngee Ann Polytechnic",
+        "house_number": "535",
+        "road": "Clementi Road",
+        "suburb": "Bukit Timah",
+        "city": "Singapore",
+        "county": "Northwest",
+        "ISO3166-2-lvl6": "SG-03",
+        "postcode": "599489",
+        "country": "Singapore",
+        "country_code": "sg",
+    },
+    {
+        "latitude": 41.8902,
+        "longitude": 12.4922,
+        "tourism": "Colosseo",
+        "road": "Piazza del Colosseo",
+        "suburb": "Municipio Roma I",
+        "city": "Roma",
+        "county": "Roma Capitale",
+        "ISO3166-2-lvl6": "IT-RM",
+        "state": "Lazio",
+        "ISO3166-2-lvl4": "IT-62",
+        "postcode": "00184",
+        "country": "Italia",
+        "country_code": "it",
+    },
+    {
+        "latitude": 3.1578,
+        "longitude": 101.7117,
+        "building": "Petronas Twin Towers",
+        "road": "Jalan Ampang",
+        "suburb": "Kampung Baru",
+        "city": "Kuala Lumpur",
+        "state": "Kuala Lumpur",
+        "ISO3166-2-lvl4": "MY-14",
+        "postcode": "50088",
+        "country": "Malaysia",
+        "country_code": "my",
+    },
+)
+
+
+class Fixture(NamedTuple):
+    """a location served by the stand-in, with its Nominatim record and searchable words"""
+
+    latitude: float
+    longitude: float
+    record: dict[str, Any]
+    words: frozenset[str]
+
+
+class Faults(NamedTuple):
+    """how the stand-in misbehaves, see the command-line options"""
+
+    latency: float
+    latency_distribution: str
+    rate_limit_rate: float
+    error_rate: float
+    max_rps: float
+
+
+def _words(text: str) -> frozenset[str]:
+    """returns the casefolded words of a string"""
+    return frozenset("".join(c if c.isalnum() else " " for c in text.casefold()).split())
+
+
+def to_fixture(index: int, location: dict[str, Any]) -> Fixture:
+    """turns a location dictionary into a fixture with a Nominatim-like record"""
+
+    latitude, longitude = float(location["latitude"]), float(location["longitude"])
+
+    if isinstance(raw := location.get("raw"), dict):
+        record = raw
+
+    else:
+        address = {
+            key: str(value)
+            for key, value in location.items()
+            if key not in ("latitude", "longitude", "raw")
+        }
+        record = {
+            "place_id": index,
+            "licence": "surplus nominatim stand-in, fixture data",
+            "lat": str(latitude),
+            "lon": str(longitude),
+            "display_name": ", ".join(
+                value
+                for key, value in address.items()
+                if (key != "country_code") and (not key.startswith("ISO3166"))
+            ),
+            "address": address,
+            "boundingbox": [
+                str(latitude - 0.001),
+                str(latitude + 0.001),
+                str(longitude - 0.001),
+                str(longitude + 0.001),
+            ],
+        }
+
+    words = _words(
+        " ".join(
+            [str(record.get("display_name", "")), *map(str, record.get("address", {}).values())]
+        )
+    )
+    return Fixture(latitude, longitude, record, words)
+
+
+class StandIn:
+    """fixture lookups and fault injection shared by every request"""
+
+    def __init__(self, fixtures: list[Fixture], faults: Faults, seed: int) -> None:
+        self.fixtures = fixtures
+        self.faults = faults
+        self.statuses: Counter[int] = Counter()
+        self._random = Random(seed)  # noqa: S311
+        self._recent: deque[float] = deque()
+        self._lock = Lock()
+
+    def latency(self) -> float:
+        """returns how long to wait before answering a request, in seconds"""
+
+        with self._lock:
+            match self.faults.latency_distribution:
+                case "uniform":
+                    return self._random.uniform(0, 2 * self.faults.latency)
+                case "exponential" if self.faults.latency > 0:
+                    return self._random.expovariate(1 / self.faults.latency)
+                case _:
+                    return self.faults.latency
+
+    def fault(self) -> int | None:
+        """returns an error status to answer a request with, or None to answer normally"""
+
+        with self._lock:
+            now = monotonic()
+            self._recent.append(now)
+            while self._recent[0] < (now - 1):
+                self._recent.popleft()
+
+            if (self.faults.max_rps > 0) and (len(self._recent) > self.faults.max_rps):
+                return 429
+
+            if self._random.random() < self.faults.rate_limit_rate:
+                return 429
+
+            if self._random.random() < self.faults.error_rate:
+                return self._random.choice(SERVER_ERRORS)
+
+            return None
+
+    def search(self, query: str) -> list[dict[str, Any]]:
+        """returns the records of fixtures whose names contain every word of a query"""
+
+        words = _words(query)
+        return [
+            fixture.record for fixture in self.fixtures if words and words.issubset(fixture.words)
+        ][:1]
+
+    def reverse(self, latitude: float, longitude: float, zoom: int) -> dict[str, Any]:
+        """returns the record of the nearest fixture, dropping finer detail at low zooms"""
+
+        if not self.fixtures:
+            return {"error": "Unable to geocode"}
+
+        scale = cos(radians(latitude))
+        nearest = min(
+            self.fixtures,
+            key=lambda fixture: (
+                (fixture.latitude - latitude) ** 2 + ((fixture.longitude - longitude) * scale) ** 2
+            ),
+        )
+
+        if zoom >= OFFLINE_REVERSER_DETAIL_LEVEL:
+            return nearest.record
+
+        address = nearest.record.get("address", {})
+        return nearest.record | {
+            "address": {
+                key: value
+                for key, value in address.items()
+                if key not in OFFLINE_REVERSER_DETAIL_KEYS
+            }
+        }
+
+
+def serve(address: tuple[str, int], standin: StandIn, *, verbose: bool = False) -> None:
+    """serves the stand-in until interrupted"""
+
+    class _StandInRequestHandler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401
+            if verbose:
+                super().log_message(format, *args)
+
+        def _reply(self, status: int, body: object) -> None:
+            data = json_dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:  # noqa: PLR2004
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(data)
+
+            with standin._lock:  # noqa: SLF001
+                standin.statuses[status] += 1
+
+        def do_GET(self) -> None:
+            url = urlsplit(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+            sleep(standin.latency())
+
+            if url.path.rstrip("/") not in ("/search", "/reverse", "/status"):
+                self._reply(404, {"error": "not found"})
+                return
+
+            if (status := standin.fault()) is not None:
+                self._reply(status, {"error": f"injected {status}"})
+                return
+
+            try:
+                match url.path.rstrip("/"):
+                    case "/search":
+                        self._reply(200, standin.search(params.get("q", "")))
+                    case "/reverse":
+                        self._reply(
+                            200,
+                            standin.reverse(
+                                float(params["lat"]),
+                                float(params["lon"]),
+                                int(params.get("zoom", 18)),
+                            ),
+                        )
+                    case _:
+                        self._reply(200, "OK")
+
+            except (KeyError, ValueError) as exc:
+                self._reply(400, {"error": f"bad request: {exc}"})
+
+    with ThreadingHTTPServer(address, _StandInRequestHandler) as server:
+        host, port = server.server_address[:2]
+        print(  # noqa: T201
+            f"nominatim stand-in serving {len(standin.fixtures)} fixtures on "
+            f"http://{host!s}:{port}",
+            file=stderr,
+        )
+        server.serve_forever()
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--fixtures", type=Path, default=None, metavar="PATH")
+    parser.add_argument("--latency", type=float, default=0.0, metavar="MILLISECONDS")
+    parser.add_argument(
+        "--latency-distribution",
+        choices=("fixed", "uniform", "exponential"),
+        default="fixed",
+        help="uniform is between 0 and twice --latency, exponential has --latency as its mean",
+    )
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, metavar="P")
+    parser.add_argument("--error-rate", type=float, default=0.0, metavar="P")
+    parser.add_argument(
+        "--max-rps",
+        type=float,
+        default=0,
+        metavar="N",
+        help="answers 429 to requests beyond N per second, like Nominatim's usage policy",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", default=False)
+    args = parser.parse_args()
+
+    locations: list[dict[str, Any]] = list(DEFAULT_FIXTURES)
+    if args.fixtures is not None:
+        with args.fixtures.open(encoding="utf-8") as fixtures:
+            locations = [json_loads(line) for line in fixtures if line.strip() != ""]
+
+    standin = StandIn(
+        fixtures=[to_fixture(index, location) for index, location in enumerate(locations)],
+        faults=Faults(
+            latency=args.latency / 1000,
+            latency_distribution=args.latency_distribution,
+            rate_limit_rate=args.rate_limit_rate,
+            error_rate=args.error_rate,
+            max_rps=args.max_rps,
+        ),
+        seed=args.seed,
+    )
+
+    # exit cleanly on termination, so that the response summary is printed
+    signal(SIGTERM, lambda *_: sysexit(0))
+
+    try:
+        serve((args.host, args.port), standin, verbose=args.verbose)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        print(  # noqa: T201
+            "responses: "
+            + ", ".join(f"{status}: {count}" for status, count in sorted(standin.statuses.items())),
+            file=stderr,
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sysexit(main())